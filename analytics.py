@@ -0,0 +1,433 @@
+# analytics.py
+from collections import Counter, namedtuple
+from datetime import date
+from itertools import compress, repeat
+from operator import add, floordiv, itemgetter, mul
+
+from patient_loader import gc_paused
+
+# Patient attributes the key statistics are grouped by, insurance first.
+STATISTICS_DIMENSIONS = ('insurance', 'age', 'race', 'gender', 'ethnicity')
+DEMOGRAPHIC_DIMENSIONS = STATISTICS_DIMENSIONS[1:]
+PERIODS = ('month', 'year')
+
+AGE_BIN_WIDTH = 10
+AGE_BIN_LAST = 90
+
+# Column form of a hospital. patient_groups maps each dimension to one value
+# per patient row, optionally as codes into decoders[dimension]; visit_patients
+# gives the patient row of each visit and visit_days its day ordinal.
+# patient_alive, when set, masks out removed patient rows.
+StatisticsColumns = namedtuple('StatisticsColumns', [
+    'patient_groups', 'decoders', 'visit_patients', 'visit_days', 'patient_alive',
+])
+
+# patients maps dimension -> group -> number of patients. trends maps
+# dimension -> period ('month' or 'year') -> period label -> group -> TrendCount.
+KeyStatistics = namedtuple('KeyStatistics', ['total_patients', 'total_visits', 'patients', 'trends'])
+TrendCount = namedtuple('TrendCount', ['visits', 'patients'])
+
+_AGE_BINS = {}
+
+def age_bin(age):
+    """
+    Returns the label of the age bin a patient falls into, e.g. '30-39' or '90+'.
+
+    Args:
+        age (int): The age of the patient.
+    """
+    label = _AGE_BINS.get(age)
+    if label is None:
+        if age >= AGE_BIN_LAST:
+            label = f"{AGE_BIN_LAST}+"
+        else:
+            low = age - age % AGE_BIN_WIDTH
+            label = f"{low}-{low + AGE_BIN_WIDTH - 1}"
+        _AGE_BINS[age] = label
+    return label
+
+def _period_codes(visit_days):
+    # Map every distinct day once, then the whole column through a dict.
+    months = {}
+    for day in set(visit_days):
+        visit_date = date.fromordinal(day)
+        months[day] = visit_date.year * 12 + visit_date.month - 1
+    month_codes = list(map(months.__getitem__, visit_days))
+    return {
+        'month': (month_codes, lambda code: f"{code // 12:04d}-{code % 12 + 1:02d}"),
+        'year': (list(map(floordiv, month_codes, repeat(12))), lambda code: f"{code:04d}"),
+    }
+
+def _encode(values, decoder):
+    if decoder is not None:
+        return values, decoder
+    codes = {}
+    encoded = [codes.setdefault(value, len(codes)) for value in values]
+    return encoded, list(codes)
+
+def _combine(high, low, span):
+    # Packs two integer columns into one so group-bys count plain ints.
+    return list(map(add, map(mul, high, repeat(span)), low))
+
+def compute_key_statistics(columns):
+    """
+    Computes patient counts and temporal visit trends with column-wise group-bys.
+
+    Group and period codes are packed into single integer keys and counted
+    with Counter, so the per-row work runs in C instead of a Python loop per
+    patient. Distinct patients per period are found once and shared by every
+    dimension.
+
+    Args:
+        columns (StatisticsColumns): The hospital in column form.
+
+    Returns:
+        KeyStatistics: Patient counts per group and monthly and yearly
+            visit and distinct-patient counts per group.
+    """
+    with gc_paused():
+        visit_patients = columns.visit_patients
+        visit_days = columns.visit_days
+        alive = columns.patient_alive
+        if alive is not None:
+            visit_alive = bytes(map(alive.__getitem__, visit_patients))
+            visit_patients = list(compress(visit_patients, visit_alive))
+            visit_days = list(compress(visit_days, visit_alive))
+            total_patients = sum(alive)
+        else:
+            total_patients = len(columns.patient_groups[STATISTICS_DIMENSIONS[0]])
+
+        periods = _period_codes(visit_days)
+        patient_periods = {}
+        for period, (period_codes, _) in periods.items():
+            span = max(period_codes, default=0) + 1
+            distinct = set(_combine(visit_patients, period_codes, span))
+            patient_periods[period] = (span, [key // span for key in distinct], [key % span for key in distinct])
+
+        patients = {}
+        trends = {}
+        for dimension in STATISTICS_DIMENSIONS:
+            groups, decoder = _encode(columns.patient_groups[dimension], columns.decoders.get(dimension))
+            patient_counts = Counter(groups if alive is None else compress(groups, alive))
+            patients[dimension] = {decoder[code]: count for code, count in patient_counts.items()}
+            visit_groups = list(map(groups.__getitem__, visit_patients))
+            trends[dimension] = {}
+            for period, (period_codes, label) in periods.items():
+                span, pair_patients, pair_periods = patient_periods[period]
+                visit_counts = Counter(_combine(visit_groups, period_codes, span))
+                period_patients = Counter(_combine(map(groups.__getitem__, pair_patients), pair_periods, span))
+                trend = {}
+                for key in sorted(visit_counts, key=lambda key: key % span):
+                    group, period_code = divmod(key, span)
+                    trend.setdefault(label(period_code), {})[decoder[group]] = TrendCount(visit_counts[key], period_patients[key])
+                trends[dimension][period] = trend
+    return KeyStatistics(total_patients, len(visit_days), patients, trends)
+
+_VISIT_PERIODS = {}
+
+def _visit_periods(day):
+    # (month code, year) of a day ordinal, cached as there are few distinct days.
+    periods = _VISIT_PERIODS.get(day)
+    if periods is None:
+        visit_date = date.fromordinal(day)
+        periods = _VISIT_PERIODS[day] = (visit_date.year * 12 + visit_date.month - 1, visit_date.year)
+    return periods
+
+_PERIOD_LABELS = {
+    'month': lambda code: f"{code // 12:04d}-{code % 12 + 1:02d}",
+    'year': lambda code: f"{code:04d}",
+}
+
+# Packs a group combination and a month code or year into one integer key.
+_PERIOD_SPAN = 1 << 16
+
+def _increment(counter, key):
+    counter[key] = counter.get(key, 0) + 1
+
+def _decrement(counter, key, count=1):
+    # Drop emptied keys so projections never report zero counts.
+    remaining = counter[key] - count
+    if remaining:
+        counter[key] = remaining
+    else:
+        del counter[key]
+
+def _add_count(counter, key, count):
+    counter[key] = counter.get(key, 0) + count
+
+class StatisticsAggregates:
+    """
+    Key statistics kept up to date as patients and visits are added and removed.
+
+    Every distinct combination of a patient's groups gets a small integer id,
+    and visits and distinct patients are counted per (combination, month) and
+    (combination, year) under packed integer keys, so a visit costs one to
+    three dict updates. Per-dimension results are projected from these
+    counters when read. Whether a visit is a patient's first in its month or
+    year is decided from patient_months, the patient's visits per month code,
+    which add_visit fills from the patient's other visit days on its first
+    visit to that patient and keeps up to date afterwards, so adding a visit
+    never rescans the patient's earlier ones. generation grows with every
+    change, so a result computed from the counters can be checked for
+    staleness.
+    """
+    def __init__(self):
+        self.generation = 0
+        self.total_patients = 0
+        self.total_visits = 0
+        self.combinations = {}
+        self.combination_groups = []
+        self.combination_patients = {}
+        self.month_visits = {}
+        self.month_patients = {}
+        self.year_patients = {}
+        self.patient_months = {}
+
+    def _combination(self, groups):
+        combination = self.combinations.get(groups)
+        if combination is None:
+            combination = self.combinations[groups] = len(self.combination_groups)
+            self.combination_groups.append(groups)
+        return combination
+
+    def add_patient(self, groups):
+        """
+        Counts a new patient without visits.
+
+        Args:
+            groups (tuple): The patient's group in each of STATISTICS_DIMENSIONS.
+        """
+        self.generation += 1
+        self.total_patients += 1
+        _increment(self.combination_patients, self._combination(groups))
+
+    def add_visit(self, groups, visit_day, patient, other_visit_days=()):
+        """
+        Counts a new visit of a patient already counted by add_patient.
+
+        Args:
+            groups (tuple): The patient's group in each of STATISTICS_DIMENSIONS.
+            visit_day (int): The day ordinal of the new visit.
+            patient (str): The patient's ID.
+            other_visit_days (iterable): Day ordinals of the patient's earlier
+                visits, only read on the first visit added to the patient.
+        """
+        self.generation += 1
+        self.total_visits += 1
+        month, year = _visit_periods(visit_day)
+        months = self.patient_months.get(patient)
+        if months is None:
+            months = self.patient_months[patient] = {}
+            for day in other_visit_days:
+                _increment(months, _visit_periods(day)[0])
+        new_month = month not in months
+        new_year = new_month and not any(code in months for code in range(year * 12, year * 12 + 12))
+        _increment(months, month)
+        base = self._combination(groups) * _PERIOD_SPAN
+        _increment(self.month_visits, base + month)
+        if new_month:
+            _increment(self.month_patients, base + month)
+        if new_year:
+            _increment(self.year_patients, base + year)
+
+    def remove_patient(self, groups, visit_days, patient=None):
+        """
+        Forgets a patient and all of their visits.
+
+        Args:
+            groups (tuple): The patient's group in each of STATISTICS_DIMENSIONS.
+            visit_days (iterable): Day ordinals of all of the patient's visits.
+            patient (str): The patient's ID, as given to add_visit.
+        """
+        self.patient_months.pop(patient, None)
+        combination = self.combinations[groups]
+        base = combination * _PERIOD_SPAN
+        visit_periods = [_visit_periods(day) for day in visit_days]
+        self.generation += 1
+        self.total_patients -= 1
+        self.total_visits -= len(visit_periods)
+        _decrement(self.combination_patients, combination)
+        for month, _ in visit_periods:
+            _decrement(self.month_visits, base + month)
+        for month in {month for month, _ in visit_periods}:
+            _decrement(self.month_patients, base + month)
+        for year in {year for _, year in visit_periods}:
+            _decrement(self.year_patients, base + year)
+
+    def add_patients(self, patients):
+        """
+        Counts a batch of new patients with all of their visits.
+
+        Each patient's distinct months and years come from one pass over its
+        own visit days, and no visits per month are kept for it until
+        add_visit first adds to it.
+
+        Args:
+            patients (list): (groups, visit_days) of every patient, as given
+                to add_patient and to add_visit for each of its visits.
+        """
+        combination_patients = self.combination_patients
+        month_visits = self.month_visits
+        month_patients = self.month_patients
+        year_patients = self.year_patients
+        self.generation += 1
+        for groups, visit_days in patients:
+            combination = self._combination(groups)
+            base = combination * _PERIOD_SPAN
+            _increment(combination_patients, combination)
+            months = set()
+            years = set()
+            for day in visit_days:
+                month, year = _visit_periods(day)
+                _increment(month_visits, base + month)
+                months.add(month)
+                years.add(year)
+            for month in months:
+                _increment(month_patients, base + month)
+            for year in years:
+                _increment(year_patients, base + year)
+            self.total_visits += len(visit_days)
+        self.total_patients += len(patients)
+
+    def remove_patients(self, patients):
+        """
+        Forgets a batch of patients and all of their visits.
+
+        Args:
+            patients (list): (groups, visit_days, patient) of every patient, as given to remove_patient.
+        """
+        for groups, visit_days, patient in patients:
+            self.remove_patient(groups, visit_days, patient)
+
+    def counter_keys(self, groups, visit_days):
+        """
+        Returns the counter keys a patient is counted under, for publishing only the counts that changed.
+
+        Args:
+            groups (tuple): The patient's group in each of STATISTICS_DIMENSIONS.
+            visit_days (iterable): Day ordinals of the patient's visits.
+
+        Returns:
+            tuple: The combination_patients key, the month_visits and
+                month_patients keys, and the year_patients keys.
+        """
+        combination = self._combination(groups)
+        base = combination * _PERIOD_SPAN
+        month_keys = set()
+        year_keys = set()
+        for day in visit_days:
+            month, year = _visit_periods(day)
+            month_keys.add(base + month)
+            year_keys.add(base + year)
+        return combination, month_keys, year_keys
+
+    def to_key_statistics(self):
+        """
+        Projects the counters into the structure returned by compute_key_statistics.
+
+        The cost depends on the number of distinct group combinations and
+        periods, not on the number of patients or visits.
+
+        Returns:
+            KeyStatistics: The current statistics, without rescanning any records.
+        """
+        return project_key_statistics(self)
+
+def project_key_statistics(aggregates):
+    """
+    Projects the counters of a StatisticsAggregates, or of a published version of one, into KeyStatistics.
+
+    Args:
+        aggregates: An object with the totals, combination_groups and counter
+            mappings of StatisticsAggregates.
+    """
+    combination_groups = aggregates.combination_groups
+    patients = {dimension: {} for dimension in STATISTICS_DIMENSIONS}
+    for combination, count in aggregates.combination_patients.items():
+        for dimension, group in zip(STATISTICS_DIMENSIONS, combination_groups[combination]):
+            _add_count(patients[dimension], group, count)
+
+    visits = {dimension: {'month': {}, 'year': {}} for dimension in STATISTICS_DIMENSIONS}
+    period_patients = {dimension: {'month': {}, 'year': {}} for dimension in STATISTICS_DIMENSIONS}
+    for key, count in aggregates.month_visits.items():
+        combination, month = divmod(key, _PERIOD_SPAN)
+        for dimension, group in zip(STATISTICS_DIMENSIONS, combination_groups[combination]):
+            _add_count(visits[dimension]['month'], (group, month), count)
+            _add_count(visits[dimension]['year'], (group, month // 12), count)
+    for period, counter in (('month', aggregates.month_patients), ('year', aggregates.year_patients)):
+        for key, count in counter.items():
+            combination, code = divmod(key, _PERIOD_SPAN)
+            for dimension, group in zip(STATISTICS_DIMENSIONS, combination_groups[combination]):
+                _add_count(period_patients[dimension][period], (group, code), count)
+
+    trends = {}
+    for dimension in STATISTICS_DIMENSIONS:
+        trends[dimension] = {}
+        for period in PERIODS:
+            label = _PERIOD_LABELS[period]
+            counts = visits[dimension][period]
+            trend = {}
+            for group, code in sorted(counts, key=itemgetter(1)):
+                trend.setdefault(label(code), {})[group] = TrendCount(
+                    counts[group, code], period_patients[dimension][period][group, code])
+            trends[dimension][period] = trend
+    return KeyStatistics(aggregates.total_patients, aggregates.total_visits, patients, trends)
+
+def check_aggregates(aggregates, columns):
+    """
+    Compares maintained aggregates against a full recount of the hospital.
+
+    Args:
+        aggregates (StatisticsAggregates): The incrementally maintained counters.
+        columns (StatisticsColumns): The hospital in column form.
+
+    Returns:
+        list: A description of every difference; empty when consistent.
+    """
+    expected = compute_key_statistics(columns)
+    actual = aggregates.to_key_statistics()
+    differences = []
+    for field in ('total_patients', 'total_visits'):
+        if getattr(actual, field) != getattr(expected, field):
+            differences.append(f"{field}: {getattr(actual, field)} != {getattr(expected, field)}")
+    for dimension in STATISTICS_DIMENSIONS:
+        if actual.patients[dimension] != expected.patients[dimension]:
+            differences.append(f"patients by {dimension}")
+        for period in PERIODS:
+            if actual.trends[dimension][period] != expected.trends[dimension][period]:
+                differences.append(f"{period} trend by {dimension}")
+    return differences
+
+def format_key_statistics(statistics, period='year'):
+    """
+    Renders key statistics as the report printed for management users.
+
+    Args:
+        statistics (KeyStatistics): The statistics to render.
+        period (str): The trend granularity to show, 'month' or 'year'.
+
+    Returns:
+        str: The report text.
+    """
+    lines = [f"Total patients: {statistics.total_patients}, total visits: {statistics.total_visits}"]
+
+    def add_group_lines(dimension, indent):
+        for period_label, groups in statistics.trends[dimension][period].items():
+            for group, count in groups.items():
+                lines.append(f"{indent}{period_label} - {group}: {count.patients} patients, {count.visits} visits")
+
+    lines.append("\n1. Temporal trend of the number of patients who visited the hospital with different types of insurances:")
+    for insurance, count in statistics.patients['insurance'].items():
+        lines.append(f"   - Insurance: {insurance}, Number of patients: {count}")
+    lines.append(f"   Trend by {period}:")
+    add_group_lines('insurance', "     - ")
+
+    lines.append("\n2. Temporal trend of the number of patients who visited the hospital in different demographics groups:")
+    for dimension in DEMOGRAPHIC_DIMENSIONS:
+        lines.append(f"   - Demographic category: {dimension}")
+        groups = statistics.patients[dimension]
+        for group in sorted(groups) if dimension == 'age' else groups:
+            lines.append(f"     - {group}: {groups[group]}")
+        lines.append(f"     Trend by {period}:")
+        add_group_lines(dimension, "       - ")
+    return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,347 @@
+# batch_mode.py
+import json
+import shlex
+from datetime import datetime
+
+from analytics import PERIODS
+from instrumentation import timed
+from hospital_management import MAX_AGE, BatchValidationError
+from models import PatientRecord
+from renderers import RENDERERS, patient_record_from_dict, patient_record_to_dict
+from write_ahead_log import patient_added, patient_removed
+
+# Operations each role may run in batch mode, matching the interactive menus.
+ROLE_ACTIONS = {
+    'admin': frozenset({'count_visits'}),
+    'management': frozenset({'key_statistics'}),
+    'clinician': frozenset({'add_patient', 'remove_patient', 'add_patients', 'remove_patients', 'retrieve_patient',
+                            'count_visits', 'query'}),
+    'nurse': frozenset({'add_patient', 'remove_patient', 'add_patients', 'remove_patients', 'retrieve_patient',
+                        'count_visits', 'query'}),
+}
+
+# Operations that change the hospital, which the server runs through its
+# single writer.
+MUTATING_ACTIONS = frozenset({'add_patient', 'remove_patient', 'add_patients', 'remove_patients'})
+
+# Reads a HospitalVersion can answer, which the server runs on worker
+# threads without taking the write lock.
+VERSIONED_ACTIONS = frozenset({'retrieve_patient', 'count_visits', 'key_statistics'})
+
+# Positional argument names of each operation in script lines such as
+# "count_visits 2020-01-31" or "retrieve_patient P123".
+SCRIPT_ARGUMENTS = {
+    'add_patient': ('patient_id', 'gender', 'race', 'age', 'ethnicity', 'insurance', 'zip_code'),
+    'remove_patient': ('patient_id',),
+    'add_patients': ('file',),
+    'remove_patients': ('file',),
+    'retrieve_patient': ('patient_id',),
+    'count_visits': ('date',),
+    'key_statistics': ('period',),
+    'query': (),
+}
+
+# Arguments that must be text wherever they appear. age may also be an
+# integer, patient_ids is a list of text and patients a list of objects.
+TEXT_ARGUMENTS = frozenset({
+    'op', 'patient_id', 'gender', 'race', 'ethnicity', 'insurance', 'zip_code', 'file', 'date', 'start_date',
+    'end_date', 'visit_date', 'department', 'chief_complaint', 'note_type', 'format', 'period', 'username',
+    'password',
+})
+
+# Results are written once this many lines have accumulated.
+OUTPUT_BATCH_LINES = 1024
+
+class BatchError(Exception):
+    """
+    An operation that could not be run, reported on its output line.
+    """
+
+def parse_operation(line):
+    """
+    Parses one input line into an operation dict.
+
+    Lines starting with '{' are JSON objects with an "op" key. Any other
+    line is a script command: the operation name followed by its positional
+    arguments from SCRIPT_ARGUMENTS, or by key=value pairs.
+
+    Args:
+        line (str): The stripped input line.
+
+    Returns:
+        dict: The operation, with its name under "op".
+    """
+    if line.startswith('{'):
+        try:
+            operation = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise BatchError(f"Invalid JSON: {error}")
+        if not isinstance(operation, dict) or 'op' not in operation:
+            raise BatchError("Operation objects need an 'op' key.")
+        return operation
+    try:
+        words = shlex.split(line)
+    except ValueError as error:
+        raise BatchError(f"Invalid command: {error}")
+    operation = {'op': words[0]}
+    names = SCRIPT_ARGUMENTS.get(words[0], ())
+    for position, word in enumerate(words[1:]):
+        name, separator, value = word.partition('=')
+        if separator:
+            operation[name] = value
+        elif position < len(names):
+            operation[names[position]] = word
+        else:
+            raise BatchError(f"Unexpected argument: {word}")
+    return operation
+
+def check_operation(operation):
+    """
+    Checks the type of every argument of a parsed operation.
+
+    Script lines only hold text, but JSON values can be of any type.
+    run_operation checks before running an operation, and the server before
+    queuing a mutation for its writer.
+
+    Args:
+        operation (dict): The parsed operation.
+
+    Raises:
+        BatchError: Naming the first argument of the wrong type.
+    """
+    for name, value in operation.items():
+        _check_argument(name, value)
+
+def _parse_date(operation, name):
+    value = _optional(operation, name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise BatchError(f"Invalid date format for {name}: {value}")
+
+def _check_argument(name, value):
+    # Rejects an argument of the wrong type before any handler uses it.
+    if name == 'age':
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise BatchError(f"Invalid age: {value!r}")
+    elif name == 'patient_ids':
+        if not isinstance(value, list) or not all(isinstance(patient_id, str) for patient_id in value):
+            raise BatchError("patient_ids must be a list of text IDs.")
+    elif name == 'patients':
+        if not isinstance(value, list) or not all(isinstance(fields, dict) for fields in value):
+            raise BatchError("patients must be a list of patient objects.")
+    elif name in TEXT_ARGUMENTS and not isinstance(value, str):
+        raise BatchError(f"{name} must be text, not {type(value).__name__}.")
+
+def _optional(operation, name, default=None):
+    value = operation.get(name, default)
+    if value is not None:
+        _check_argument(name, value)
+    return value
+
+def _require(operation, name):
+    if name not in operation:
+        raise BatchError(f"Missing argument: {name}")
+    _check_argument(name, operation[name])
+    return operation[name]
+
+def _require_age(operation):
+    age = _require(operation, 'age')
+    if isinstance(age, str):
+        try:
+            age = int(age)
+        except ValueError:
+            raise BatchError(f"Invalid age: {age}")
+    if not 0 <= age <= MAX_AGE:
+        raise BatchError(f"Invalid age: {age}")
+    return age
+
+class BatchRunner:
+    """
+    Runs a stream of operations against a loaded system under one user's role.
+
+    With read_versions, the VERSIONED_ACTIONS read the system's current
+    HospitalVersion rather than the live hospital, so they may run on any
+    thread while the writer applies mutations.
+    """
+    def __init__(self, healthcare_system, user, read_versions=False):
+        self.healthcare_system = healthcare_system
+        self.user = user
+        self.read_versions = read_versions
+        self.allowed_actions = ROLE_ACTIONS.get(user.role, frozenset())
+
+    def _reader(self):
+        if self.read_versions:
+            return self.healthcare_system.current_version()
+        return self.healthcare_system.hospital
+
+    def run_operation(self, operation):
+        """
+        Runs one operation after checking it against the user's role.
+
+        Args:
+            operation (dict): The parsed operation.
+
+        Returns:
+            The JSON-ready result of the operation.
+        """
+        check_operation(operation)
+        action = operation['op']
+        handler = getattr(self, f"_run_{action}", None)
+        if handler is None:
+            raise BatchError(f"Unknown operation: {action}")
+        if action not in self.allowed_actions:
+            raise BatchError(f"Role '{self.user.role}' may not run '{action}'.")
+        with timed(f"action.{action}"):
+            return handler(operation)
+
+    def _run_count_visits(self, operation):
+        hospital = self._reader()
+        date = _parse_date(operation, 'date')
+        if date is not None:
+            return hospital.count_visits_on_date(date)
+        start_date = _parse_date(operation, 'start_date')
+        end_date = _parse_date(operation, 'end_date')
+        if start_date is None or end_date is None:
+            raise BatchError("count_visits needs a date or a start_date and end_date.")
+        return hospital.count_visits_between(start_date, end_date)
+
+    def _run_retrieve_patient(self, operation):
+        patient_record = self._reader().get_patient_record(_require(operation, 'patient_id'))
+        if patient_record is None:
+            raise BatchError("Patient not found.")
+        # A format other than the default returns the rendered text.
+        renderer = _optional(operation, 'format', 'json')
+        if renderer == 'json':
+            return patient_record_to_dict(patient_record)
+        if renderer not in RENDERERS:
+            raise BatchError(f"Unknown format: {renderer}")
+        return RENDERERS[renderer]().render(patient_record)
+
+    def _run_add_patient(self, operation):
+        hospital = self.healthcare_system.hospital
+        patient_id = _require(operation, 'patient_id')
+        if patient_id in hospital.patient_records:
+            raise BatchError("Patient already exists.")
+        age = _require_age(operation)
+        self.healthcare_system.apply_mutation(patient_added(PatientRecord(
+            patient_id, _require(operation, 'gender'), _require(operation, 'race'), age,
+            _require(operation, 'ethnicity'), _require(operation, 'insurance'), _require(operation, 'zip_code'))))
+        return "Patient added successfully."
+
+    def _run_remove_patient(self, operation):
+        hospital = self.healthcare_system.hospital
+        patient_id = _require(operation, 'patient_id')
+        if patient_id not in hospital.patient_records:
+            raise BatchError("Patient not found.")
+        self.healthcare_system.apply_mutation(patient_removed(patient_id))
+        return "Patient removed successfully."
+
+    def _run_add_patients(self, operation):
+        # Patients come inline as json renderer objects or from a JSON lines file.
+        if 'patients' in operation:
+            try:
+                patients = [patient_record_from_dict(fields) for fields in _require(operation, 'patients')]
+            except (KeyError, TypeError, ValueError, AttributeError) as error:
+                raise BatchError(f"Invalid patient: {type(error).__name__} {error}")
+        else:
+            patients = _require(operation, 'file')
+        try:
+            count = self.healthcare_system.add_patient_records(patients)
+        except OSError as error:
+            raise BatchError(f"Could not read {operation['file']}: {error.strerror}")
+        except BatchValidationError as error:
+            raise BatchError(str(error))
+        return f"{count} patients added successfully."
+
+    def _run_remove_patients(self, operation):
+        if 'patient_ids' in operation:
+            patient_ids = _require(operation, 'patient_ids')
+        else:
+            patient_ids = _require(operation, 'file')
+        try:
+            count = self.healthcare_system.remove_patient_records(patient_ids)
+        except OSError as error:
+            raise BatchError(f"Could not read {operation['file']}: {error.strerror}")
+        except BatchValidationError as error:
+            raise BatchError(str(error))
+        return f"{count} patients removed successfully."
+
+    def _run_query(self, operation):
+        criteria = {name: _require(operation, name)
+                    for name in ('department', 'chief_complaint', 'zip_code', 'insurance', 'note_type')
+                    if name in operation}
+        for name in ('visit_date', 'start_date', 'end_date'):
+            criteria[name] = _parse_date(operation, name)
+        result = self.healthcare_system.hospital.query(**criteria)
+        return {
+            'visits': [{'patient_id': patient_record.patient_id, 'visit_id': visit_record.visit_id}
+                       for patient_record, visit_record in result.matches],
+            'indexes_used': result.indexes_used,
+        }
+
+    def _run_key_statistics(self, operation):
+        period = _optional(operation, 'period', 'year')
+        if period not in PERIODS:
+            raise BatchError(f"Unknown period: {period}")
+        statistics = self.healthcare_system.generate_key_statistics(report=False)
+        return {
+            'total_patients': statistics.total_patients,
+            'total_visits': statistics.total_visits,
+            'patients': statistics.patients,
+            'trends': {dimension: {label: {group: count._asdict() for group, count in groups.items()}
+                                   for label, groups in periods[period].items()}
+                       for dimension, periods in statistics.trends.items()},
+        }
+
+    def run(self, input_file, output_file):
+        """
+        Runs every operation of an input stream and writes one JSON result line each.
+
+        Blank lines and lines starting with '#' are skipped. A failing
+        operation is reported on its own line and does not stop the batch,
+        whatever it raised, and the results gathered so far are written even
+        if reading the input or writing a result fails.
+
+        Args:
+            input_file (file): Text stream of script or JSONL operations.
+            output_file (file): Text stream the JSONL results are written to.
+
+        Returns:
+            tuple: The number of operations run and the number that failed.
+        """
+        pending = []
+        operations = failures = 0
+        try:
+            for line_number, line in enumerate(input_file, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                operations += 1
+                result = {'line': line_number}
+                try:
+                    operation = parse_operation(line)
+                    result['op'] = operation['op']
+                    value = self.run_operation(operation)
+                    result['ok'] = True
+                    result['result'] = value
+                except BatchError as error:
+                    failures += 1
+                    result['ok'] = False
+                    result['error'] = str(error)
+                except Exception as error:
+                    # Anything else a handler raises fails only its own line.
+                    failures += 1
+                    result['ok'] = False
+                    result['error'] = f"{type(error).__name__}: {error}"
+                pending.append(json.dumps(result))
+                if len(pending) >= OUTPUT_BATCH_LINES:
+                    output_file.write('\n'.join(pending) + '\n')
+                    pending.clear()
+        finally:
+            if pending:
+                output_file.write('\n'.join(pending) + '\n')
+            output_file.flush()
+        return operations, failures
\ No newline at end of file
@@ -0,0 +1,198 @@
+# benchmarks/concurrent_reads_benchmark.py
+"""
+Measures reader threads against a writer thread adding and removing patients, and checks every read is consistent.
+
+Usage: python benchmarks/concurrent_reads_benchmark.py [--rows N] [--readers 0 1 2 4] [--seconds S]
+           [--backend BACKEND] [--live]
+
+Every read takes the current published version and checks it against
+itself: the patients and visits it iterates match its totals and its
+visits per day, and on the first reader thread its key statistics sum to
+the same totals. With --live the readers read the hospital the writer is
+changing instead, without a lock, and every read that raises or disagrees
+with itself counts as failed. Exits with status 1 if any read failed.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from generate_data import (DEFAULT_SEED, credentials_file_name, generate_patient_rows, patient_file_name,
+                           write_credentials_file, write_patient_file)
+from healthcare_system import HOSPITAL_BACKENDS, HealthcareSystem
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import parse_visit_day
+from write_ahead_log import patient_added, patient_removed
+
+DEFAULT_ROWS = 100000
+DEFAULT_READERS = (0, 1, 2, 4)
+DEFAULT_SECONDS = 5.0
+# Patient file rows turned into the patients the writer adds and removes again.
+WRITER_ROWS = 2000
+
+def writer_patients(rows, seed):
+    """
+    Builds the patients the writer cycles through, with IDs no generated patient file uses.
+    """
+    patients = {}
+    visits = {}
+    for (patient_id, visit_id, visit_time, department, race, gender, ethnicity, age, zip_code, insurance,
+         chief_complaint, note_id, note_type) in generate_patient_rows(rows, seed):
+        patient_record = patients.get(patient_id)
+        if patient_record is None:
+            patient_record = patients[patient_id] = PatientRecord(f"writer-{patient_id}", gender, race, int(age),
+                                                                  ethnicity, insurance, zip_code)
+        visit_record = visits.get(visit_id)
+        if visit_record is None:
+            visit_record = visits[visit_id] = VisitRecord(f"writer-{visit_id}", parse_visit_day(visit_time),
+                                                          department, chief_complaint)
+            patient_record.visit_records.append(visit_record)
+        visit_record.add_note_record(NoteRecord(f"writer-{note_id}", note_type))
+    return list(patients.values())
+
+def check_read(patient_records, total_patients, total_visits, day_counts, key_statistics=None):
+    """
+    Iterates one view of the hospital and checks it agrees with itself.
+
+    Args:
+        patient_records (Mapping): Patient ID to record.
+        total_patients (int): The patient count the view reports.
+        total_visits (int): The visit count the view reports.
+        day_counts (Mapping): Visits per day ordinal.
+        key_statistics (callable): Returns the KeyStatistics of the view; None skips them.
+
+    Returns:
+        tuple: The number of patients read and a description of the first inconsistency, or None.
+    """
+    patients = 0
+    visits = 0
+    for patient_record in patient_records.values():
+        patients += 1
+        visits += len(patient_record.visit_records)
+    if patients != total_patients or visits != total_visits:
+        return patients, f"iterated {patients} patients and {visits} visits of {total_patients} and {total_visits}"
+    day_visits = sum(day_counts.values())
+    if day_visits != total_visits:
+        return patients, f"{day_visits} visits per day of {total_visits}"
+    if key_statistics is not None:
+        statistics = key_statistics()
+        insurance_patients = sum(statistics.patients['insurance'].values())
+        yearly_visits = sum(count.visits for groups in statistics.trends['insurance']['year'].values()
+                            for count in groups.values())
+        if (statistics.total_patients, statistics.total_visits) != (total_patients, total_visits):
+            return patients, "key statistics totals differ from the records"
+        if (insurance_patients, yearly_visits) != (total_patients, total_visits):
+            return patients, f"key statistics sum to {insurance_patients} patients and {yearly_visits} visits"
+    return patients, None
+
+def read_once(system, live, with_statistics):
+    if live:
+        hospital = system.hospital
+        statistics = hospital.statistics
+        return check_read(hospital.patient_records, statistics.total_patients, statistics.total_visits,
+                          hospital.visit_date_index.day_counts, hospital.key_statistics if with_statistics else None)
+    version = system.current_version()
+    statistics = version.statistics
+    return check_read(version.patient_records, statistics.total_patients, statistics.total_visits,
+                      version.day_counts, version.key_statistics if with_statistics else None)
+
+def run_reader(system, live, with_statistics, stop):
+    reads = 0
+    patients = 0
+    failures = []
+    while not stop.is_set():
+        try:
+            patient_count, failure = read_once(system, live, with_statistics)
+        except RuntimeError as error:
+            # Live dicts raise when the writer resizes them mid-iteration.
+            patient_count, failure = 0, f"{type(error).__name__}: {error}"
+        reads += 1
+        patients += patient_count
+        if failure is not None:
+            failures.append(failure)
+    return reads, patients, failures
+
+def run_writer(system, patients, stop):
+    # Each patient is removed again before the next is added, so the hospital
+    # is back where it started whenever the writer stops.
+    mutations = 0
+    while not stop.is_set():
+        for patient_record in patients:
+            system.apply_mutation(patient_added(patient_record))
+            system.apply_mutation(patient_removed(patient_record.patient_id))
+            mutations += 2
+            if stop.is_set():
+                break
+    return mutations
+
+def measure(system, patients, readers, seconds, live):
+    """
+    Runs the writer and a pool of readers for a number of seconds.
+
+    Returns:
+        tuple: Writer mutations, reads, patients read and failed reads, in
+            that order, and the seconds they took.
+    """
+    stop = threading.Event()
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=readers + 1) as executor:
+        writer = executor.submit(run_writer, system, patients, stop)
+        reader_futures = [executor.submit(run_reader, system, live, number == 0, stop) for number in range(readers)]
+        time.sleep(seconds)
+        stop.set()
+        mutations = writer.result()
+        reader_results = [future.result() for future in reader_futures]
+    elapsed = time.perf_counter() - start_time
+    reads = sum(result[0] for result in reader_results)
+    patients_read = sum(result[1] for result in reader_results)
+    failures = [failure for result in reader_results for failure in result[2]]
+    return mutations, reads, patients_read, failures, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="Size of the patient file, in rows.")
+    parser.add_argument('--readers', type=int, nargs='+', default=list(DEFAULT_READERS),
+                        help="Reader thread counts to measure.")
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS, help="How long each count runs.")
+    parser.add_argument('--backend', choices=list(HOSPITAL_BACKENDS), default='objects')
+    parser.add_argument('--live', action='store_true',
+                        help="Read the hospital being written instead of its published versions.")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'))
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    patient_file = os.path.join(args.data_dir, patient_file_name(args.rows, args.seed))
+    if not os.path.exists(patient_file):
+        print(f"generating {patient_file}", file=sys.stderr)
+        write_patient_file(patient_file, args.rows, args.seed)
+    credentials_file = os.path.join(args.data_dir, credentials_file_name(1, args.seed))
+    if not os.path.exists(credentials_file):
+        write_credentials_file(credentials_file, 1, args.seed)
+
+    start_time = time.perf_counter()
+    system = HealthcareSystem(credentials_file, patient_file, load_mode='chunked', backend=args.backend,
+                              publish_versions=not args.live)
+    print(f"loaded {len(system.hospital.patient_records):,} patients in {time.perf_counter() - start_time:.2f} s"
+          f" ({args.backend}, {'live' if args.live else 'versions'})")
+    patients = writer_patients(WRITER_ROWS, args.seed + 1)
+
+    failed = 0
+    for readers in args.readers:
+        mutations, reads, patients_read, failures, seconds = measure(system, patients, readers, args.seconds,
+                                                                     args.live)
+        print(f"{readers} readers: {mutations / seconds:10,.0f} mutations/s  {reads / seconds:8,.1f} reads/s"
+              f"  {patients_read / seconds:12,.0f} patients read/s  {len(failures)} failed reads")
+        if failures:
+            print(f"    first failure: {failures[0]}")
+        failed += len(failures)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,245 @@
+# benchmarks/generate_data.py
+"""
+Writes synthetic patient and credentials files in the schemas of PA3_patients.csv and PA3_credentials.txt.
+
+Usage: python benchmarks/generate_data.py <output_dir> [--rows N] [--users N] [--seed N]
+"""
+import argparse
+import csv
+import math
+import os
+import random
+from datetime import date
+
+# The header of PA3_patients.csv, after its unnamed index column.
+PATIENT_FILE_COLUMNS = ('Patient_ID', 'Visit_ID', 'Visit_time', 'Visit_department', 'Race', 'Gender', 'Ethnicity',
+                        'Age', 'Zip_code', 'Insurance', 'Chief_complaint', 'Note_ID', 'Note_type')
+
+# Category values and weights, following the frequencies in PA3_patients.csv.
+DEPARTMENTS = {'Head and Neck': 17, 'Psychiatry': 13, 'Emergency department': 12, 'Pediatrics': 12,
+               'Cardiology': 11, 'Surgery': 10, 'Neorology': 9, 'Radiology': 8, 'Obstetrics and gynaecology': 8}
+RACES = {'Pacific Islanders': 21, 'White': 18, 'Black': 18, 'Native Americans': 16, 'Asian': 14, 'Unknown': 13}
+GENDERS = {'Male': 36, 'Female': 35, 'Non-binary': 29}
+ETHNICITIES = {'Non-Hispanic': 29, 'Hispanic': 27, 'Other': 23, 'Unknown': 21}
+INSURANCES = {'Medicare': 23, 'Blueshield': 22, 'None': 21, 'Unknown': 20, 'Medicaid': 14}
+CHIEF_COMPLAINTS = {'Unknown': 18, 'chest pain': 15, 'infection': 15, 'injury': 14, 'back pain': 14,
+                    'bleeding': 14, 'fatigue': 10}
+NOTE_TYPES = {'social work note': 24, 'discharge note': 22, 'oncology note': 20, 'progress note': 18,
+              'admission note': 16}
+ROLES = {'clinician': 533, 'management': 507, 'nurse': 481, 'admin': 479}
+
+FIRST_VISIT_DAY = date(2000, 1, 1).toordinal()
+LAST_VISIT_DAY = date(2023, 12, 31).toordinal()
+ZIP_CODES = range(53001, 53999)
+MAX_AGE = 100
+
+DEFAULT_SEED = 2024
+DEFAULT_VISITS_PER_PATIENT = 3.0
+DEFAULT_NOTES_PER_VISIT = 1.5
+# Patients whose visits are written interleaved, as in an admissions feed.
+DEFAULT_INTERLEAVE = 64
+
+# IDs are distinct multiples of a number coprime to the ID space, so they
+# look random but never repeat; usernames do the same in base 36.
+_ID_SPACE = 10 ** 9
+_ID_MULTIPLIERS = {'patient': 387420489, 'visit': 282475249, 'note': 244140623}
+_NAME_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_NAME_LENGTH = 7
+_NAME_SPACE = len(_NAME_ALPHABET) ** _NAME_LENGTH
+_NAME_MULTIPLIER = 2654435761
+
+def synthetic_id(kind, number):
+    """
+    Returns the ID of the number-th patient, visit or note, unique up to a billion of each.
+
+    Args:
+        kind (str): 'patient', 'visit' or 'note'.
+        number (int): The position of the record in its kind, from 1.
+    """
+    return str(number * _ID_MULTIPLIERS[kind] % _ID_SPACE)
+
+def synthetic_username(number):
+    """
+    Returns the seven-character username of the number-th user, unique for any realistic user count.
+    """
+    value = number * _NAME_MULTIPLIER % _NAME_SPACE
+    characters = []
+    for _ in range(_NAME_LENGTH):
+        value, digit = divmod(value, len(_NAME_ALPHABET))
+        characters.append(_NAME_ALPHABET[digit])
+    return ''.join(characters)
+
+def _sampler(rng, weights):
+    values = list(weights)
+    cum_weights = []
+    total = 0
+    for value in values:
+        total += weights[value]
+        cum_weights.append(total)
+    choices = rng.choices
+    return lambda: choices(values, cum_weights=cum_weights)[0]
+
+def _count_sampler(rng, mean):
+    # At least one, with a geometric tail giving the requested mean.
+    if mean <= 1:
+        return lambda: 1
+    log_stay = math.log(1 - 1 / mean)
+    uniform = rng.random
+    return lambda: 1 + int(math.log(1.0 - uniform()) / log_stay)
+
+def generate_patient_rows(rows, seed=DEFAULT_SEED, visits_per_patient=DEFAULT_VISITS_PER_PATIENT,
+                          notes_per_visit=DEFAULT_NOTES_PER_VISIT, interleave=DEFAULT_INTERLEAVE):
+    """
+    Generates the data rows of a patient file, one per note.
+
+    Each patient gets a geometric number of visits and each visit a
+    geometric number of notes, repeating the patient and visit columns on
+    every note row. Visits of up to interleave patients are mixed, so a
+    patient's rows are spread through the file. The same arguments always
+    give the same rows.
+
+    Args:
+        rows (int): Number of rows to generate.
+        seed (int): Seed of the random generator.
+        visits_per_patient (float): Mean visits per patient.
+        notes_per_visit (float): Mean notes per visit.
+        interleave (int): Number of patients whose visits are mixed.
+
+    Yields:
+        list: The row values in the order of PATIENT_FILE_COLUMNS.
+    """
+    rng = random.Random(seed)
+    department = _sampler(rng, DEPARTMENTS)
+    race = _sampler(rng, RACES)
+    gender = _sampler(rng, GENDERS)
+    ethnicity = _sampler(rng, ETHNICITIES)
+    insurance = _sampler(rng, INSURANCES)
+    chief_complaint = _sampler(rng, CHIEF_COMPLAINTS)
+    note_type = _sampler(rng, NOTE_TYPES)
+    visit_count = _count_sampler(rng, visits_per_patient)
+    note_count = _count_sampler(rng, notes_per_visit)
+    randrange = rng.randrange
+    visit_times = [f"{day.year}-{day.month}-{day.day}"
+                   for day in map(date.fromordinal, range(FIRST_VISIT_DAY, LAST_VISIT_DAY + 1))]
+    zip_codes = [str(zip_code) for zip_code in ZIP_CODES]
+
+    patients = 0
+    visits = 0
+    notes = 0
+
+    def new_patient():
+        nonlocal patients
+        patients += 1
+        return [[synthetic_id('patient', patients), race(), gender(), ethnicity(), str(randrange(MAX_AGE + 1)),
+                 zip_codes[randrange(len(zip_codes))], insurance()], visit_count()]
+
+    active = [new_patient() for _ in range(max(interleave, 1))]
+    written = 0
+    while written < rows:
+        position = randrange(len(active))
+        patient = active[position]
+        patient_id, patient_race, patient_gender, patient_ethnicity, age, zip_code, patient_insurance = patient[0]
+        visits += 1
+        visit_fields = [patient_id, synthetic_id('visit', visits), visit_times[randrange(len(visit_times))],
+                        department(), patient_race, patient_gender, patient_ethnicity, age, zip_code,
+                        patient_insurance, chief_complaint()]
+        for _ in range(min(note_count(), rows - written)):
+            notes += 1
+            yield visit_fields + [synthetic_id('note', notes), note_type()]
+            written += 1
+        patient[1] -= 1
+        if not patient[1]:
+            active[position] = new_patient()
+
+def write_patient_file(file_path, rows, seed=DEFAULT_SEED, visits_per_patient=DEFAULT_VISITS_PER_PATIENT,
+                       notes_per_visit=DEFAULT_NOTES_PER_VISIT, interleave=DEFAULT_INTERLEAVE):
+    """
+    Writes a synthetic patient CSV file with the header and index column of PA3_patients.csv.
+
+    Rows are streamed to a temporary file and renamed into place, so an
+    interrupted run never leaves a truncated file under the final name.
+
+    Args:
+        file_path (str): Path of the file to write.
+        rows (int): Number of data rows.
+        seed (int): Seed of the random generator.
+        visits_per_patient (float): Mean visits per patient.
+        notes_per_visit (float): Mean notes per visit.
+        interleave (int): Number of patients whose visits are mixed.
+    """
+    temp_file = f"{file_path}.tmp"
+    with open(temp_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([''] + list(PATIENT_FILE_COLUMNS))
+        batch = []
+        generated = generate_patient_rows(rows, seed, visits_per_patient, notes_per_visit, interleave)
+        for index, row in enumerate(generated):
+            row.insert(0, index)
+            batch.append(row)
+            if len(batch) == 8192:
+                writer.writerows(batch)
+                batch.clear()
+        writer.writerows(batch)
+    os.replace(temp_file, file_path)
+
+def generate_credentials(users, seed=DEFAULT_SEED):
+    """
+    Generates credentials with unique seven-character usernames and passwords and weighted roles.
+
+    Args:
+        users (int): Number of users.
+        seed (int): Seed of the random generator.
+
+    Yields:
+        tuple: The username, password and role of each user.
+    """
+    rng = random.Random(seed)
+    role = _sampler(rng, ROLES)
+    choices = rng.choices
+    for number in range(1, users + 1):
+        yield synthetic_username(number), ''.join(choices(_NAME_ALPHABET, k=_NAME_LENGTH)), role()
+
+def write_credentials_file(file_path, users, seed=DEFAULT_SEED):
+    """
+    Writes a synthetic credentials file with the header and index column of PA3_credentials.txt.
+
+    Args:
+        file_path (str): Path of the file to write.
+        users (int): Number of users.
+        seed (int): Seed of the random generator.
+    """
+    temp_file = f"{file_path}.tmp"
+    with open(temp_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['', 'username', 'password', 'role'])
+        writer.writerows((index, *credential) for index, credential in enumerate(generate_credentials(users, seed)))
+    os.replace(temp_file, file_path)
+
+def patient_file_name(rows, seed=DEFAULT_SEED):
+    return f"patients_{rows}_seed{seed}.csv"
+
+def credentials_file_name(users, seed=DEFAULT_SEED):
+    return f"credentials_{users}_seed{seed}.txt"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output_dir')
+    parser.add_argument('--rows', type=int, default=10000, help="Patient file rows, one per note.")
+    parser.add_argument('--users', type=int, default=2000, help="Credentials file users.")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--visits-per-patient', type=float, default=DEFAULT_VISITS_PER_PATIENT)
+    parser.add_argument('--notes-per-visit', type=float, default=DEFAULT_NOTES_PER_VISIT)
+    parser.add_argument('--interleave', type=int, default=DEFAULT_INTERLEAVE)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    patient_file = os.path.join(args.output_dir, patient_file_name(args.rows, args.seed))
+    write_patient_file(patient_file, args.rows, args.seed, args.visits_per_patient, args.notes_per_visit,
+                       args.interleave)
+    credentials_file = os.path.join(args.output_dir, credentials_file_name(args.users, args.seed))
+    write_credentials_file(credentials_file, args.users, args.seed)
+    print(f"{patient_file}: {args.rows} rows")
+    print(f"{credentials_file}: {args.users} users")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,123 @@
+# benchmarks/load_generator.py
+"""
+Drives a running hospital server with concurrent clients and reports request latency.
+
+Usage: python benchmarks/load_generator.py <PA3_patients.csv> --username USER --password PASS
+           [--clients N] [--requests N] [--ops count_visits,retrieve_patient] [--write-ratio R]
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import HospitalClient
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+def load_workload_values(patient_data_file):
+    """
+    Reads the patient IDs, visit dates and departments requests are drawn from.
+
+    Args:
+        patient_data_file (str): Path to the CSV file the server was loaded from.
+
+    Returns:
+        dict: Sorted lists of distinct values under 'patient_ids', 'dates' and 'departments'.
+    """
+    patient_ids, dates, departments = set(), set(), set()
+    with open(patient_data_file, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            patient_ids.add(row['Patient_ID'])
+            year, month, day = row['Visit_time'].split('-')
+            dates.add(f"{int(year):04d}-{int(month):02d}-{int(day):02d}")
+            departments.add(row['Visit_department'])
+    return {'patient_ids': sorted(patient_ids), 'dates': sorted(dates), 'departments': sorted(departments)}
+
+def make_read(op, values, rng):
+    if op == 'count_visits':
+        return {'op': op, 'date': rng.choice(values['dates'])}
+    if op == 'retrieve_patient':
+        return {'op': op, 'patient_id': rng.choice(values['patient_ids'])}
+    if op == 'query':
+        return {'op': op, 'department': rng.choice(values['departments']), 'visit_date': rng.choice(values['dates'])}
+    return {'op': op}
+
+async def run_client(client_number, args, values, latencies, failures):
+    rng = random.Random(args.seed + client_number)
+    client = await HospitalClient.connect(args.host, args.port, args.unix)
+    try:
+        await client.login(args.username, args.password)
+        for request_number in range(args.requests):
+            if rng.random() < args.write_ratio:
+                patient_id = f"LOAD-{client_number}-{request_number}"
+                operations = [
+                    {'op': 'add_patient', 'patient_id': patient_id, 'gender': 'Female', 'race': 'Other', 'age': 40,
+                     'ethnicity': 'Unknown', 'insurance': 'Unknown', 'zip_code': '00000'},
+                    {'op': 'remove_patient', 'patient_id': patient_id},
+                ]
+            else:
+                operations = [make_read(rng.choice(args.ops), values, rng)]
+            for operation in operations:
+                start_time = time.perf_counter()
+                response = await client.request(**operation)
+                latencies.setdefault(operation['op'], []).append(time.perf_counter() - start_time)
+                if not response['ok']:
+                    failures.append(response['error'])
+    finally:
+        await client.close()
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the nearest-rank percentile of already sorted values.
+
+    Args:
+        sorted_values (list): The values in ascending order.
+        fraction (float): The percentile as a fraction, e.g. 0.99.
+    """
+    rank = max(0, min(len(sorted_values) - 1, int(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+def format_latencies(label, latencies):
+    latencies = sorted(latencies)
+    return (f"{label:<18} {len(latencies):>8}  p50 {percentile(latencies, 0.50) * 1000:8.3f} ms"
+            f"  p99 {percentile(latencies, 0.99) * 1000:8.3f} ms  max {latencies[-1] * 1000:8.3f} ms")
+
+async def run_load(args):
+    values = load_workload_values(args.patient_data_file)
+    latencies = {}
+    failures = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*[run_client(number, args, values, latencies, failures) for number in range(args.clients)])
+    seconds = time.perf_counter() - start_time
+
+    requests = sum(len(op_latencies) for op_latencies in latencies.values())
+    print(f"{args.clients} clients, {requests} requests in {seconds:.2f} s ({requests / seconds:,.0f} requests/s)")
+    for op in sorted(latencies):
+        print(format_latencies(op, latencies[op]))
+    print(format_latencies('all', [latency for op_latencies in latencies.values() for latency in op_latencies]))
+    if failures:
+        print(f"{len(failures)} failed requests, first error: {failures[0]}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test a running hospital server.")
+    parser.add_argument('patient_data_file', help="The patient CSV the server was loaded from.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help="Connect to a Unix socket instead of TCP.")
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--clients', type=int, default=50, help="Concurrent connections.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per connection.")
+    parser.add_argument('--ops', type=lambda value: value.split(','), default=['count_visits'],
+                        help="Comma separated read operations to draw from.")
+    parser.add_argument('--write-ratio', type=float, default=0.0,
+                        help="Fraction of requests replaced by an add_patient/remove_patient pair.")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(run_load(parse_args()))
\ No newline at end of file
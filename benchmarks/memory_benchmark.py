@@ -0,0 +1,57 @@
+# benchmarks/memory_benchmark.py
+"""
+Compares the memory held by the object and columnar Hospital backends.
+
+Usage: python benchmarks/memory_benchmark.py <PA3_patients.csv> [--load-mode MODE]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from healthcare_system import HOSPITAL_BACKENDS, HealthcareSystem
+
+def measure_backend(patient_data_file, backend, load_mode):
+    """
+    Loads the patient file into a fresh hospital and measures what it retains.
+
+    Args:
+        patient_data_file (str): Path to the CSV file containing patient data.
+        backend (str): A key of HOSPITAL_BACKENDS.
+        load_mode (str): The loader mode passed to load_patient_data.
+
+    Returns:
+        dict: The load time and the retained and peak traced memory in bytes.
+    """
+    system = HealthcareSystem.__new__(HealthcareSystem)
+    system.hospital = HOSPITAL_BACKENDS[backend]()
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    stats = system.load_patient_data(patient_data_file, mode=load_mode)
+    # Build the columnar offset tables so both backends are ready for reads.
+    next(iter(system.hospital.patient_records.values())).visit_records[0].note_records
+    seconds = time.perf_counter() - start_time
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'backend': backend, 'rows': stats.rows, 'seconds': seconds, 'retained_bytes': retained, 'peak_bytes': peak}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('patient_data_file')
+    parser.add_argument('--load-mode', choices=['dict', 'chunked'], default='chunked')
+    args = parser.parse_args()
+    for backend in HOSPITAL_BACKENDS:
+        result = measure_backend(args.patient_data_file, backend, args.load_mode)
+        print(f"{result['backend']:>8}: {result['rows']} rows in {result['seconds']:.2f}s, "
+              f"retained {result['retained_bytes'] / 2**20:.1f} MiB "
+              f"({result['retained_bytes'] / max(result['rows'], 1):.0f} B/row), "
+              f"peak {result['peak_bytes'] / 2**20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+# benchmarks/model_benchmark.py
+"""
+Compares per-object memory and construction speed of the models module against the former classes.
+
+Usage: python benchmarks/model_benchmark.py <PA3_patients.csv> [--rows N]
+"""
+import argparse
+import csv
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import NoteRecord, PatientRecord, VisitRecord
+
+# The classes hospital_management.py and visit_record.py defined before the
+# models module, kept here as the baseline.
+class LegacyPatientRecord:
+    def __init__(self, patient_id, gender, race, age, ethnicity, insurance, zip_code):
+        self.patient_id = patient_id
+        self.gender = gender
+        self.race = race
+        self.age = age
+        self.ethnicity = ethnicity
+        self.insurance = insurance
+        self.zip_code = zip_code
+        self.visit_records = []
+
+class LegacyVisitRecord:
+    def __init__(self, visit_id, visit_time, department, chief_complaint):
+        self.visit_id = visit_id
+        self.visit_time = visit_time
+        self.department = department
+        self.chief_complaint = chief_complaint
+        self.note_records = []
+
+class LegacyNoteRecord:
+    def __init__(self, note_id, note_type):
+        self.note_id = note_id
+        self.note_type = note_type
+
+def read_rows(patient_data_file, limit):
+    # Dates are parsed up front so the timings cover record construction only.
+    visit_times = {}
+    rows = []
+    with open(patient_data_file, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            visit_time = visit_times.get(row['Visit_time'])
+            if visit_time is None:
+                visit_time = visit_times[row['Visit_time']] = datetime.strptime(row['Visit_time'], '%Y-%m-%d')
+            row['Visit_time'] = visit_time
+            rows.append(row)
+            if len(rows) == limit:
+                break
+    return rows
+
+def build_legacy(rows):
+    records = []
+    for row in rows:
+        patient_record = LegacyPatientRecord(row['Patient_ID'], row['Gender'], row['Race'], int(row['Age']),
+                                             row['Ethnicity'], row['Insurance'], row['Zip_code'])
+        visit_record = LegacyVisitRecord(row['Visit_ID'], row['Visit_time'],
+                                         row['Visit_department'], row['Chief_complaint'])
+        visit_record.note_records.append(LegacyNoteRecord(row['Note_ID'], row['Note_type']))
+        patient_record.visit_records.append(visit_record)
+        records.append(patient_record)
+    return records
+
+def build_models(rows):
+    records = []
+    for row in rows:
+        patient_record = PatientRecord(row['Patient_ID'], row['Gender'], row['Race'], int(row['Age']),
+                                       row['Ethnicity'], row['Insurance'], row['Zip_code'])
+        visit_record = VisitRecord(row['Visit_ID'], row['Visit_time'],
+                                   row['Visit_department'], row['Chief_complaint'])
+        visit_record.note_records.append(NoteRecord(row['Note_ID'], row['Note_type']))
+        patient_record.visit_records.append(visit_record)
+        records.append(patient_record)
+    return records
+
+def measure(build, patient_data_file, limit):
+    """
+    Builds one patient, visit and note per row and measures the time and retained memory.
+
+    Rows are re-read for every run so the categorical strings start out as
+    distinct objects, as they do when parsed from the CSV file. Time and
+    memory come from separate builds, as tracing slows allocation down.
+
+    Returns:
+        tuple: The construction seconds, retained bytes and number of rows.
+    """
+    rows = read_rows(patient_data_file, limit)
+    gc.collect()
+    start_time = time.perf_counter()
+    records = build(rows)
+    seconds = time.perf_counter() - start_time
+    count = len(records)
+    del records, rows
+
+    rows = read_rows(patient_data_file, limit)
+    gc.collect()
+    tracemalloc.start()
+    records = build(rows)
+    # Drop the parsed rows so only what the records hold stays traced.
+    del rows
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return seconds, retained, count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('patient_data_file')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {}
+    for label, build in (('former classes', build_legacy), ('models', build_models)):
+        seconds, retained, count = measure(build, args.patient_data_file, args.rows)
+        results[label] = (seconds, retained)
+        print(f"{label:<15} {count:>8} rows  {seconds * 1e6 / count:7.2f} us/row  "
+              f"{retained / count:7.1f} bytes/row  ({retained / 2 ** 20:.1f} MiB)")
+    (old_seconds, old_bytes), (new_seconds, new_bytes) = results['former classes'], results['models']
+    print(f"models vs former: {new_seconds / old_seconds:.2f}x time, {new_bytes / old_bytes:.2f}x memory")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
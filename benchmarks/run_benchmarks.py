@@ -0,0 +1,395 @@
+# benchmarks/run_benchmarks.py
+"""
+Times and memory-profiles loading, visit counts, key statistics and logins on synthetic data of several sizes.
+
+Usage: python benchmarks/run_benchmarks.py [--rows N [N ...]] [--output results.json] [--compare baseline.json]
+
+Bulk adds and removals are measured per patient, against the same patients
+added or removed one call at a time.
+Key statistics are measured with the result cache off and warm.
+
+Data files are generated once per size and seed into --data-dir and reused,
+so runs on different commits measure the same input; the 'dataset' load mode
+reads the columnar dataset exported from each file next to it. Results are written as
+JSON with the commit, interpreter and parameters they were taken with;
+--compare reports each result against an earlier results file and exits
+with status 1 if any got slower or larger by more than --threshold.
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPOSITORY_DIR)
+
+from columnar_dataset import is_columnar_dataset
+from credentials_manage import DEFAULT_HASH_ITERATIONS, CredentialManager, read_credentials
+from generate_data import (DEFAULT_SEED, FIRST_VISIT_DAY, LAST_VISIT_DAY, credentials_file_name,
+                           generate_patient_rows, patient_file_name, write_credentials_file, write_patient_file)
+from healthcare_system import HOSPITAL_BACKENDS, HealthcareSystem
+from lazy_hospital import LazyHospital
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import parse_visit_day
+from result_cache import ResultCache
+
+RESULTS_FORMAT = 1
+DEFAULT_ROWS = (10000, 100000)
+DEFAULT_USERS = 2000
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+# Calls per sample of the per-call benchmarks.
+COUNT_VISITS_CALLS = 10000
+LOGIN_USERS = 200
+# Patient file rows turned into the patients of one bulk add.
+BULK_ROWS = 10000
+
+def repository_state():
+    """
+    Describes the checked-out commit, or None outside a git work tree.
+
+    Returns:
+        dict: The commit hash and whether the work tree has local changes.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPOSITORY_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': bool(status.strip())}
+
+def time_samples(run, setup=None, repeat=DEFAULT_REPEAT):
+    """
+    Times a benchmark body several times, each on freshly set up state.
+
+    Args:
+        run (callable): Called with the result of setup; its duration is measured.
+        setup (callable): Builds the state for one sample, untimed.
+        repeat (int): Number of samples.
+
+    Returns:
+        list: The duration of every sample in seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()
+        start_time = time.perf_counter()
+        run(state)
+        samples.append(time.perf_counter() - start_time)
+        del state
+    return samples
+
+def trace_memory(run, setup=None):
+    """
+    Runs a benchmark body once under tracemalloc.
+
+    Tracing slows allocation down, so this is a separate run from the timed ones.
+
+    Returns:
+        tuple: Bytes still held by the result of run afterwards, and the peak during it.
+    """
+    state = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    result = run(state)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result, state
+    return retained, peak
+
+def benchmark(name, params, run, setup=None, repeat=DEFAULT_REPEAT, calls=1, memory=True):
+    """
+    Measures one benchmark and returns its result record.
+
+    Args:
+        name (str): The operation measured.
+        params (dict): The parameters that, with the name, identify the result.
+        run (callable): The benchmark body, called with the result of setup.
+        setup (callable): Builds the state for one sample, untimed.
+        repeat (int): Number of timed samples.
+        calls (int): Operations performed by one call of run, for the per-call time.
+        memory (bool): Whether to also trace memory.
+
+    Returns:
+        dict: The samples and summary of the result.
+    """
+    samples = time_samples(run, setup, repeat)
+    result = {
+        'name': name,
+        'params': params,
+        'samples': samples,
+        'best_seconds': min(samples),
+        'median_seconds': statistics.median(samples),
+        'calls': calls,
+        'best_us_per_call': min(samples) * 1e6 / calls,
+    }
+    if memory:
+        result['retained_bytes'], result['peak_bytes'] = trace_memory(run, setup)
+    print(f"{result_key(result):<75} {result['best_seconds']:10.4f}s  {result['best_us_per_call']:12.2f} us/call"
+          + (f"  peak {result['peak_bytes'] / 2 ** 20:8.1f} MiB" if memory else ''), file=sys.stderr)
+    return result
+
+def result_key(result):
+    params = ','.join(f"{key}={value}" for key, value in sorted(result['params'].items()))
+    return f"{result['name']}[{params}]"
+
+def _empty_system(backend):
+    system = HealthcareSystem.__new__(HealthcareSystem)
+    system.hospital = LazyHospital() if backend == 'lazy' else HOSPITAL_BACKENDS[backend]()
+    return system
+
+def _loaded_system(patient_file, backend):
+    system = _empty_system(backend)
+    system.load_patient_data(patient_file, mode='lazy' if backend == 'lazy' else 'chunked')
+    return system
+
+def benchmark_patient_data(patient_file, rows, args):
+    """
+    Benchmarks loading, visit counts and key statistics on one patient file for every backend.
+
+    The lazy load mode builds its own hospital, so it is measured as a backend of its own.
+    """
+    dataset_directory = f"{patient_file}.dataset"
+    if 'dataset' in args.load_modes and not is_columnar_dataset(dataset_directory):
+        _loaded_system(patient_file, 'objects').hospital.export_dataset(dataset_directory)
+    results = []
+    rng = random.Random(args.seed)
+    visit_dates = [date.fromordinal(rng.randint(FIRST_VISIT_DAY, LAST_VISIT_DAY)) for _ in range(COUNT_VISITS_CALLS)]
+    backends = args.backends + (['lazy'] if 'lazy' in args.load_modes else [])
+    for backend in backends:
+        load_modes = ['lazy'] if backend == 'lazy' else [mode for mode in args.load_modes if mode != 'lazy']
+        for mode in load_modes:
+            source = dataset_directory if mode == 'dataset' else patient_file
+            results.append(benchmark(
+                'load_patient_data', {'rows': rows, 'backend': backend, 'mode': mode},
+                lambda system, mode=mode, source=source: system.load_patient_data(source, mode=mode),
+                setup=lambda backend=backend: _empty_system(backend), repeat=args.repeat, memory=args.memory))
+
+        system = _loaded_system(patient_file, backend)
+        count_visits_on_date = system.hospital.count_visits_on_date
+        results.append(benchmark(
+            'count_visits_on_date', {'rows': rows, 'backend': backend},
+            lambda state: [count_visits_on_date(visit_date) for visit_date in visit_dates],
+            repeat=args.repeat, calls=len(visit_dates), memory=args.memory))
+        # 'off' recomputes the statistics every time; 'warm' reports the best
+        # sample, which is served from the cache filled by an earlier one.
+        for cache, result_cache in (('off', ResultCache(0)), ('warm', ResultCache())):
+            system.hospital.result_cache = result_cache
+            results.append(benchmark(
+                'generate_key_statistics', {'rows': rows, 'backend': backend, 'cache': cache},
+                lambda state: system.generate_key_statistics(report=False),
+                repeat=args.repeat, memory=args.memory))
+        del system
+    return results
+
+def bulk_patients(rows, seed):
+    """
+    Builds new patients from generated rows, with IDs that never collide with a generated patient file.
+    """
+    patients = {}
+    visits = {}
+    for (patient_id, visit_id, visit_time, department, race, gender, ethnicity, age, zip_code, insurance,
+         chief_complaint, note_id, note_type) in generate_patient_rows(rows, seed):
+        patient_record = patients.get(patient_id)
+        if patient_record is None:
+            patient_record = patients[patient_id] = PatientRecord(f"bulk-{patient_id}", gender, race, int(age),
+                                                                  ethnicity, insurance, zip_code)
+        visit_record = visits.get(visit_id)
+        if visit_record is None:
+            visit_record = visits[visit_id] = VisitRecord(visit_id, parse_visit_day(visit_time), department,
+                                                          chief_complaint)
+            patient_record.visit_records.append(visit_record)
+        visit_record.add_note_record(NoteRecord(note_id, note_type))
+    return list(patients.values())
+
+def benchmark_bulk_mutations(patient_file, rows, args):
+    """
+    Benchmarks adding and removing a batch of patients in one call and one call per patient.
+    """
+    results = []
+    new_patients = bulk_patients(BULK_ROWS, args.seed + 1)
+    for backend in args.backends:
+        params = {'rows': rows, 'backend': backend, 'patients': len(new_patients)}
+
+        def with_new_patients(backend=backend):
+            return _loaded_system(patient_file, backend), copy.deepcopy(new_patients)
+
+        def add_each(state):
+            system, patient_records = state
+            for patient_record in patient_records:
+                system.hospital.add_patient_record(patient_record)
+
+        results.append(benchmark('add_patient_records', dict(params, method='each'), add_each,
+                                 setup=with_new_patients, repeat=args.repeat, calls=len(new_patients),
+                                 memory=False))
+        results.append(benchmark('add_patient_records', dict(params, method='bulk'),
+                                 lambda state: state[0].hospital.add_patient_records(state[1]),
+                                 setup=with_new_patients, repeat=args.repeat, calls=len(new_patients),
+                                 memory=False))
+
+        def with_removals(backend=backend):
+            system = _loaded_system(patient_file, backend)
+            patient_ids = list(system.hospital.patient_records)
+            return system, random.Random(args.seed).sample(patient_ids, min(len(new_patients), len(patient_ids)))
+
+        def remove_each(state):
+            system, patient_ids = state
+            for patient_id in patient_ids:
+                system.hospital.remove_patient_record(patient_id)
+
+        removals = min(len(new_patients), len(_loaded_system(patient_file, backend).hospital.patient_records))
+        params['patients'] = removals
+        results.append(benchmark('remove_patient_records', dict(params, method='each'), remove_each,
+                                 setup=with_removals, repeat=args.repeat, calls=removals, memory=False))
+        results.append(benchmark('remove_patient_records', dict(params, method='bulk'),
+                                 lambda state: state[0].hospital.remove_patient_records(state[1]),
+                                 setup=with_removals, repeat=args.repeat, calls=removals, memory=False))
+    return results
+
+def benchmark_logins(credentials_file, users, args):
+    """
+    Benchmarks building the credential index and validating logins with and without the session cache.
+    """
+    index_file = f"{credentials_file}.index"
+    params = {'users': users, 'iterations': args.hash_iterations}
+
+    def build_index(state):
+        if os.path.exists(index_file):
+            os.remove(index_file)
+        return CredentialManager(credentials_file, iterations=args.hash_iterations)
+
+    # Building hashes every password, so it is measured once.
+    results = [benchmark('build_credential_index', params, build_index, repeat=1, memory=args.memory)]
+
+    rng = random.Random(args.seed)
+    credentials = list(read_credentials(credentials_file))
+    logins = rng.sample(credentials, min(LOGIN_USERS, len(credentials)))
+
+    def validate_all(manager):
+        return [manager.validate_user(credential.username, credential.password) for credential in logins]
+
+    results.append(benchmark(
+        'validate_user', dict(params, cache='cold'), validate_all,
+        setup=lambda: CredentialManager(credentials_file, iterations=args.hash_iterations),
+        repeat=args.repeat, calls=len(logins), memory=args.memory))
+
+    def warm_manager():
+        manager = CredentialManager(credentials_file, iterations=args.hash_iterations)
+        validate_all(manager)
+        return manager
+
+    results.append(benchmark(
+        'validate_user', dict(params, cache='warm'), validate_all, setup=warm_manager,
+        repeat=args.repeat, calls=len(logins), memory=args.memory))
+    return results
+
+def compare_results(results, baseline, threshold):
+    """
+    Prints each result against the baseline result with the same name and parameters.
+
+    Args:
+        results (list): Result records of this run.
+        baseline (dict): An earlier results file.
+        threshold (float): The relative increase reported as a regression.
+
+    Returns:
+        list: The keys of the results that regressed.
+    """
+    baseline_results = {result_key(result): result for result in baseline['results']}
+    regressions = []
+    print(f"compared with {(baseline.get('repository') or {}).get('commit', 'unknown commit')}:", file=sys.stderr)
+    for result in results:
+        key = result_key(result)
+        previous = baseline_results.get(key)
+        if previous is None:
+            print(f"  {key:<75} new", file=sys.stderr)
+            continue
+        ratios = {'time': result['best_seconds'] / previous['best_seconds']}
+        if 'peak_bytes' in result and previous.get('peak_bytes'):
+            ratios['peak memory'] = result['peak_bytes'] / previous['peak_bytes']
+        regressed = [metric for metric, ratio in ratios.items() if ratio > 1 + threshold]
+        if regressed:
+            regressions.append(key)
+        print(f"  {key:<75} " + '  '.join(f"{metric} {ratio:5.2f}x" for metric, ratio in ratios.items())
+              + (f"  REGRESSED ({', '.join(regressed)})" if regressed else ''), file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS),
+                        help="Patient file sizes to benchmark, in rows.")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'))
+    parser.add_argument('--backends', nargs='+', choices=list(HOSPITAL_BACKENDS), default=list(HOSPITAL_BACKENDS))
+    parser.add_argument('--load-modes', nargs='+', choices=['dict', 'chunked', 'parallel', 'lazy', 'dataset'],
+                        default=['dict', 'chunked', 'lazy', 'dataset'])
+    parser.add_argument('--hash-iterations', type=int, default=DEFAULT_HASH_ITERATIONS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip the tracemalloc runs.")
+    parser.add_argument('--skip-logins', action='store_true')
+    parser.add_argument('--skip-bulk', action='store_true', help="Skip the bulk add and remove benchmarks.")
+    parser.add_argument('--output', help="Results file to write, defaults to stdout.")
+    parser.add_argument('--compare', help="Earlier results file to compare with.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = []
+    for rows in args.rows:
+        patient_file = os.path.join(args.data_dir, patient_file_name(rows, args.seed))
+        if not os.path.exists(patient_file):
+            print(f"generating {patient_file}", file=sys.stderr)
+            write_patient_file(patient_file, rows, args.seed)
+        results.extend(benchmark_patient_data(patient_file, rows, args))
+        if not args.skip_bulk:
+            results.extend(benchmark_bulk_mutations(patient_file, rows, args))
+    if not args.skip_logins:
+        credentials_file = os.path.join(args.data_dir, credentials_file_name(args.users, args.seed))
+        if not os.path.exists(credentials_file):
+            write_credentials_file(credentials_file, args.users, args.seed)
+        results.extend(benchmark_logins(credentials_file, args.users, args))
+
+    report = {
+        'format': RESULTS_FORMAT,
+        'started_at': started_at,
+        'repository': repository_state(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        if compare_results(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,109 @@
+# benchmarks/visit_merge_benchmark.py
+"""
+Measures the memory saved by merging the note rows of a visit into one visit record.
+
+Usage: python benchmarks/visit_merge_benchmark.py [--rows N] [--notes-per-visit N] [--backends NAME [NAME ...]]
+
+A patient file with many notes per visit is generated into --data-dir and
+loaded twice per backend: once by the chunked loader, which keeps one visit
+per Visit_ID, and once building a visit for every row as the loaders did
+before visits were merged.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from generate_data import DEFAULT_SEED, write_patient_file
+from healthcare_system import HOSPITAL_BACKENDS, HealthcareSystem
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import DEFAULT_CHUNK_SIZE, gc_paused, make_load_stats, parse_visit_day, read_row_chunks
+
+DEFAULT_ROWS = 200000
+DEFAULT_NOTES_PER_VISIT = 8.0
+
+def load_visit_per_row(hospital, patient_data_file):
+    """
+    Loads a patient file building one visit per row, the layout before visits were merged.
+
+    Returns:
+        LoadStats: The number of rows loaded and the load rate.
+    """
+    start_time = time.perf_counter()
+    patient_records = hospital.patient_records
+    rows = 0
+    with open(patient_data_file, 'r', newline='') as file, gc_paused():
+        for chunk in read_row_chunks(file, DEFAULT_CHUNK_SIZE):
+            rows += len(chunk)
+            for (patient_id, gender, race, age, ethnicity, insurance, zip_code,
+                 visit_id, visit_time, department, chief_complaint, note_id, note_type) in chunk:
+                visit_record = VisitRecord(visit_id, parse_visit_day(visit_time), department, chief_complaint)
+                visit_record.add_note_record(NoteRecord(note_id, note_type))
+                patient_record = patient_records.get(patient_id)
+                if patient_record is None:
+                    patient_record = PatientRecord(patient_id, gender, race, int(age), ethnicity, insurance, zip_code)
+                    hospital.add_patient_record(patient_record)
+                hospital.add_visit_record(patient_record, visit_record)
+    return make_load_stats(rows, time.perf_counter() - start_time)
+
+def measure_load(patient_data_file, backend, merged):
+    """
+    Loads the patient file into a fresh hospital and measures what it retains.
+
+    Args:
+        patient_data_file (str): Path to the CSV file containing patient data.
+        backend (str): A key of HOSPITAL_BACKENDS.
+        merged (bool): Whether to merge the rows of a visit, or build a visit per row.
+
+    Returns:
+        dict: The visits held, the load time and the retained and peak traced memory in bytes.
+    """
+    system = HealthcareSystem.__new__(HealthcareSystem)
+    system.hospital = HOSPITAL_BACKENDS[backend]()
+    gc.collect()
+    tracemalloc.start()
+    if merged:
+        stats = system.load_patient_data(patient_data_file, mode='chunked')
+    else:
+        stats = load_visit_per_row(system.hospital, patient_data_file)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    visits = sum(len(patient_record.visit_records) for patient_record in system.hospital.patient_records.values())
+    return {'backend': backend, 'merged': merged, 'rows': stats.rows, 'visits': visits, 'seconds': stats.seconds,
+            'retained_bytes': retained, 'peak_bytes': peak}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--notes-per-visit', type=float, default=DEFAULT_NOTES_PER_VISIT)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'))
+    parser.add_argument('--backends', nargs='+', choices=list(HOSPITAL_BACKENDS), default=list(HOSPITAL_BACKENDS))
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    patient_file = os.path.join(args.data_dir,
+                                f"patients_{args.rows}_seed{args.seed}_notes{args.notes_per_visit:g}.csv")
+    if not os.path.exists(patient_file):
+        print(f"generating {patient_file}", file=sys.stderr)
+        write_patient_file(patient_file, args.rows, args.seed, notes_per_visit=args.notes_per_visit)
+    for backend in args.backends:
+        per_row = measure_load(patient_file, backend, merged=False)
+        merged = measure_load(patient_file, backend, merged=True)
+        for result in (per_row, merged):
+            print(f"{backend:>8} {'merged' if result['merged'] else 'per row':>7}: {result['visits']} visits "
+                  f"from {result['rows']} rows in {result['seconds']:.2f}s, "
+                  f"retained {result['retained_bytes'] / 2**20:.1f} MiB, peak {result['peak_bytes'] / 2**20:.1f} MiB")
+        saved = per_row['retained_bytes'] - merged['retained_bytes']
+        print(f"{backend:>8}   saved: {saved / 2**20:.1f} MiB retained "
+              f"({saved / max(per_row['retained_bytes'], 1):.0%}), "
+              f"{saved / max(per_row['visits'] - merged['visits'], 1):.0f} B per merged row")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,100 @@
+# benchmarks/wal_benchmark.py
+"""
+Measures write-ahead log write throughput and recovery time.
+
+Usage: python benchmarks/wal_benchmark.py <PA3_credentials.txt> <PA3_patients.csv>
+           [--mutations N] [--sync-batches 1,16,256] [--backend BACKEND]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from healthcare_system import HealthcareSystem
+from models import NoteRecord, PatientRecord, VisitRecord
+from write_ahead_log import patient_added, patient_removed
+
+def synthetic_entries(count):
+    """
+    Builds log entries that add patients with one visit and note each, removing every fourth again.
+
+    Args:
+        count (int): The number of entries to build.
+    """
+    entries = []
+    for number in range(count):
+        if number % 4 == 3:
+            entries.append(patient_removed(f"WAL-{number - 1}"))
+            continue
+        patient_record = PatientRecord(f"WAL-{number}", 'Female', 'Other', 20 + number % 70, 'Unknown', 'Medicare', '00000')
+        visit_record = VisitRecord(f"WAL-V{number}", datetime(2023, 1 + number % 12, 1 + number % 28), 'Emergency', 'Fever')
+        visit_record.add_note_record(NoteRecord(f"WAL-N{number}", 'Progress'))
+        patient_record.add_visit_record(visit_record)
+        entries.append(patient_added(patient_record))
+    return entries
+
+def open_system(args, log_file, **options):
+    start_time = time.perf_counter()
+    system = HealthcareSystem(args.credentials_file, args.patient_data_file, load_mode='chunked',
+                              backend=args.backend, log_file=log_file, **options)
+    return system, time.perf_counter() - start_time
+
+def measure_writes(args, directory, entries, sync_batch):
+    log_file = os.path.join(directory, f"writes-{sync_batch}.log")
+    system, _ = open_system(args, log_file)
+    system.write_ahead_log.sync_batch = sync_batch
+    # Only the batch size decides when to sync.
+    system.write_ahead_log.sync_interval = float('inf')
+    start_time = time.perf_counter()
+    for entry in entries:
+        system.apply_mutation(entry)
+    system.close()
+    seconds = time.perf_counter() - start_time
+    return len(entries) / seconds, os.path.getsize(log_file)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('credentials_file')
+    parser.add_argument('patient_data_file')
+    parser.add_argument('--mutations', type=int, default=20000)
+    parser.add_argument('--sync-batches', type=lambda value: [int(part) for part in value.split(',')],
+                        default=[1, 16, 256])
+    parser.add_argument('--backend', choices=['objects', 'columnar'], default='objects')
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.mutations)
+    directory = tempfile.mkdtemp(prefix='wal-benchmark-')
+    try:
+        print(f"Write throughput, {len(entries)} mutations:")
+        for sync_batch in args.sync_batches:
+            rate, size = measure_writes(args, directory, entries, sync_batch)
+            print(f"  fsync every {sync_batch:>5} entries: {rate:>12,.0f} mutations/s  ({size / len(entries):.0f} bytes/entry)")
+
+        log_file = os.path.join(directory, 'recovery.log')
+        _, base_seconds = open_system(args, None)
+        system, _ = open_system(args, log_file)
+        for entry in entries:
+            system.apply_mutation(entry)
+        system.close()
+        system, seconds = open_system(args, log_file)
+        print("Recovery:")
+        print(f"  load sources only:         {base_seconds:8.3f} s")
+        print(f"  load sources + replay:     {seconds:8.3f} s  ({system.replay_stats.rows} entries, "
+              f"{system.replay_stats.rows_per_second:,.0f} entries/s)")
+        start_time = time.perf_counter()
+        system.compact_write_ahead_log()
+        compact_seconds = time.perf_counter() - start_time
+        system.close()
+        _, seconds = open_system(args, log_file)
+        print(f"  compaction:                {compact_seconds:8.3f} s")
+        print(f"  load compacted base:       {seconds:8.3f} s")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
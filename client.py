@@ -0,0 +1,113 @@
+# client.py
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from batch_mode import BatchError, parse_operation
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+# Responses such as key statistics can be far longer than asyncio's default line limit.
+RESPONSE_LIMIT = 1 << 26
+
+class HospitalClient:
+    """
+    Client for HospitalServer that sends one request at a time over a connection.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        """
+        Opens a connection to a server on a TCP port or a Unix socket.
+
+        Args:
+            host (str): The server host.
+            port (int): The server TCP port.
+            unix_path (str): Path of the server's Unix socket, used instead of TCP.
+
+        Returns:
+            HospitalClient: The connected client.
+        """
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path, limit=RESPONSE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=RESPONSE_LIMIT)
+        return cls(reader, writer)
+
+    async def request(self, op, **arguments):
+        """
+        Sends one operation and waits for its response.
+
+        Args:
+            op (str): The operation name, e.g. 'count_visits'.
+            **arguments: The operation's arguments.
+
+        Returns:
+            dict: The response, with 'ok' and either 'result' or 'error'.
+        """
+        self.next_id += 1
+        operation = dict(arguments, op=op, id=self.next_id)
+        self.writer.write(json.dumps(operation).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection.")
+        return json.loads(line)
+
+    async def login(self, username, password):
+        """
+        Logs the connection in, raising BatchError when the server refuses.
+
+        Returns:
+            dict: The username and role of the logged in user.
+        """
+        response = await self.request('login', username=username, password=password)
+        if not response['ok']:
+            raise BatchError(response['error'])
+        return response['result']
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def run_client(args, password):
+    client = await HospitalClient.connect(args.host, args.port, args.unix)
+    try:
+        user = await client.login(args.username, password)
+        print(f"Logged in as {user['username']} ({user['role']}).", file=sys.stderr)
+        for line in sys.stdin:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                operation = parse_operation(line)
+            except BatchError as error:
+                print(json.dumps({'ok': False, 'error': str(error)}))
+                continue
+            print(json.dumps(await client.request(**operation)))
+    finally:
+        await client.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Send script or JSONL operations from stdin to a hospital server.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Server host.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Server TCP port.")
+    parser.add_argument('--unix', metavar='PATH', help="Connect to a Unix socket instead of TCP.")
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', help="Defaults to the HOSPITAL_PASSWORD environment variable.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    password = args.password if args.password is not None else os.environ.get('HOSPITAL_PASSWORD')
+    if password is None:
+        sys.exit("A password is needed, with --password or HOSPITAL_PASSWORD.")
+    try:
+        asyncio.run(run_client(args, password))
+    except BatchError as error:
+        sys.exit(str(error))
\ No newline at end of file
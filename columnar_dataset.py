@@ -0,0 +1,353 @@
+# columnar_dataset.py
+import ast
+import json
+import os
+import shutil
+import struct
+import sys
+from array import array
+from collections import Counter
+from datetime import date
+
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import gc_paused
+
+DATASET_FORMAT = 'hospital-columnar'
+DATASET_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+PATIENTS_DIRECTORY = 'patients'
+
+NPY_MAGIC = b'\x93NUMPY'
+# Headers are padded so the data starts on a multiple of this, as numpy does.
+_NPY_ALIGNMENT = 64
+# Visit dates are stored as numpy datetime64[D], days since 1970-01-01.
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+# Columns stored as int32 codes into a dictionary kept in the manifest.
+DICTIONARY_COLUMNS = ('gender', 'race', 'ethnicity', 'insurance', 'zip_code', 'department', 'chief_complaint',
+                      'note_type')
+# Integer numpy dtypes and the array typecodes they are read into.
+_INT_DTYPES = {'<i4': 'i', '<i8': 'q', '<M8[D]': 'q'}
+
+def write_npy(file_path, dtype, values):
+    """
+    Writes one column as a version 1.0 .npy file that numpy.load reads directly.
+
+    Args:
+        file_path (str): Path of the file to write.
+        dtype (str): '<i4' or '<i8' for integers, '<M8[D]' for day numbers
+            since 1970-01-01 and '<U' for strings, whose width is the longest value.
+        values (iterable): The column values.
+    """
+    if dtype == '<U':
+        values = list(values)
+        width = max(map(len, values), default=0) or 1
+        dtype = f'<U{width}'
+        data = ''.join(value.ljust(width, '\0') for value in values).encode('utf-32-le')
+        count = len(values)
+    else:
+        column = array(_INT_DTYPES[dtype], values)
+        if sys.byteorder == 'big':
+            column.byteswap()
+        data = column.tobytes()
+        count = len(column)
+    header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': ({count},), }}"
+    padding = -(len(NPY_MAGIC) + 2 + 2 + len(header) + 1) % _NPY_ALIGNMENT
+    header = (header + ' ' * padding + '\n').encode('latin-1')
+    with open(file_path, 'wb') as file:
+        file.write(NPY_MAGIC + b'\x01\x00' + struct.pack('<H', len(header)) + header)
+        file.write(data)
+
+def read_npy(file_path):
+    """
+    Reads a one-dimensional .npy column written by write_npy.
+
+    Returns:
+        array or list: An array of integers for integer and date columns and a
+            list of str for string columns.
+    """
+    with open(file_path, 'rb') as file:
+        magic = file.read(8)
+        if magic[:6] != NPY_MAGIC:
+            raise ValueError(f"{file_path} is not a .npy file.")
+        header_length_format = '<H' if magic[6] == 1 else '<I'
+        header_length, = struct.unpack(header_length_format, file.read(struct.calcsize(header_length_format)))
+        header = ast.literal_eval(file.read(header_length).decode('latin-1'))
+        data = file.read()
+    dtype = header['descr']
+    if header['fortran_order'] or len(header['shape']) != 1:
+        raise ValueError(f"{file_path} is not a one-dimensional column.")
+    count = header['shape'][0]
+    if dtype.startswith('<U'):
+        width = int(dtype[2:])
+        text = data.decode('utf-32-le')
+        return [text[start:start + width].rstrip('\0') for start in range(0, count * width, width)]
+    if dtype not in _INT_DTYPES:
+        raise ValueError(f"{file_path} has the unsupported dtype {dtype}.")
+    column = array(_INT_DTYPES[dtype])
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+def is_columnar_dataset(path):
+    """
+    Tells whether a path is a dataset directory written by write_columnar_dataset.
+    """
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+class _Partition:
+    """
+    The visit and note columns of one visit year while a dataset is written.
+    """
+    def __init__(self, year):
+        self.year = year
+        self.visit_sequence = []
+        self.patient = []
+        self.visit_id = []
+        self.visit_date = []
+        self.department = []
+        self.chief_complaint = []
+        self.note_count = []
+        self.note_id = []
+        self.note_type = []
+
+def write_columnar_dataset(directory, hospital, metadata=None):
+    """
+    Writes the hospital as a directory of .npy columns partitioned by visit year.
+
+    The directory holds manifest.json, a patients directory with one file
+    per patient column and a year=YYYY directory per visit year with the
+    visit columns and the note columns of those visits. Category columns
+    are int32 codes into dictionaries in the manifest, visit dates are
+    datetime64[D] and the patient column of a visit is the row of its
+    patient, so numpy can rebuild any table with plain indexing. Each
+    partition's date range and departments are in the manifest for readers
+    to skip partitions without opening them.
+
+    The dataset is written into a temporary directory and swapped in, so a
+    reader never sees a partial one.
+
+    Args:
+        directory (str): Path of the dataset directory, replaced if it exists.
+        hospital (Hospital): The hospital to write.
+        metadata (dict): JSON-serializable values stored in the manifest.
+
+    Returns:
+        dict: The manifest.
+    """
+    dictionaries = {column: {} for column in DICTIONARY_COLUMNS}
+
+    def codes(column, values):
+        dictionary = dictionaries[column]
+        return [dictionary.setdefault(value, len(dictionary)) for value in values]
+
+    patients = list(hospital.patient_records.values())
+    partitions = {}
+    day_years = {}
+    sequence = 0
+    for patient_index, patient_record in enumerate(patients):
+        for visit_record in patient_record.visit_records:
+            visit_day = visit_record.visit_day
+            year = day_years.get(visit_day)
+            if year is None:
+                year = day_years[visit_day] = date.fromordinal(visit_day).year
+            partition = partitions.get(year)
+            if partition is None:
+                partition = partitions[year] = _Partition(year)
+            note_records = visit_record.note_records
+            partition.visit_sequence.append(sequence)
+            partition.patient.append(patient_index)
+            partition.visit_id.append(visit_record.visit_id)
+            partition.visit_date.append(visit_day - _EPOCH_DAY)
+            partition.department.append(visit_record.department)
+            partition.chief_complaint.append(visit_record.chief_complaint)
+            partition.note_count.append(len(note_records))
+            for note_record in note_records:
+                partition.note_id.append(note_record.note_id)
+                partition.note_type.append(note_record.note_type)
+            sequence += 1
+
+    temp_directory = f"{directory}.tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    patients_directory = os.path.join(temp_directory, PATIENTS_DIRECTORY)
+    os.makedirs(patients_directory)
+    write_npy(os.path.join(patients_directory, 'patient_id.npy'), '<U', [p.patient_id for p in patients])
+    write_npy(os.path.join(patients_directory, 'age.npy'), '<i4', [p.age for p in patients])
+    for column in ('gender', 'race', 'ethnicity', 'insurance', 'zip_code'):
+        write_npy(os.path.join(patients_directory, f'{column}.npy'), '<i4',
+                  codes(column, [getattr(p, column) for p in patients]))
+
+    partition_entries = []
+    for year in sorted(partitions):
+        partition = partitions[year]
+        path = f'year={year}'
+        partition_directory = os.path.join(temp_directory, path)
+        os.makedirs(partition_directory)
+        write_npy(os.path.join(partition_directory, 'visit_sequence.npy'), '<i4', partition.visit_sequence)
+        write_npy(os.path.join(partition_directory, 'patient.npy'), '<i4', partition.patient)
+        write_npy(os.path.join(partition_directory, 'visit_id.npy'), '<U', partition.visit_id)
+        write_npy(os.path.join(partition_directory, 'visit_date.npy'), '<M8[D]', partition.visit_date)
+        department_codes = codes('department', partition.department)
+        write_npy(os.path.join(partition_directory, 'department.npy'), '<i4', department_codes)
+        write_npy(os.path.join(partition_directory, 'chief_complaint.npy'), '<i4',
+                  codes('chief_complaint', partition.chief_complaint))
+        write_npy(os.path.join(partition_directory, 'note_count.npy'), '<i4', partition.note_count)
+        write_npy(os.path.join(partition_directory, 'note_id.npy'), '<U', partition.note_id)
+        write_npy(os.path.join(partition_directory, 'note_type.npy'), '<i4', codes('note_type', partition.note_type))
+        partition_entries.append({
+            'year': year,
+            'path': path,
+            'visits': len(partition.visit_id),
+            'notes': len(partition.note_id),
+            'first_date': date.fromordinal(min(partition.visit_date) + _EPOCH_DAY).isoformat(),
+            'last_date': date.fromordinal(max(partition.visit_date) + _EPOCH_DAY).isoformat(),
+            'departments': sorted(set(department_codes)),
+        })
+
+    manifest = {
+        'format': DATASET_FORMAT,
+        'version': DATASET_VERSION,
+        'patients': {'path': PATIENTS_DIRECTORY, 'rows': len(patients)},
+        'visits': sequence,
+        'notes': sum(entry['notes'] for entry in partition_entries),
+        'partitions': partition_entries,
+        'dictionaries': {column: list(dictionary) for column, dictionary in dictionaries.items()},
+        'metadata': metadata or {},
+    }
+    with open(os.path.join(temp_directory, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file, indent=1)
+
+    old_directory = f"{directory}.old"
+    shutil.rmtree(old_directory, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_directory)
+    os.rename(temp_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
+    return manifest
+
+def read_dataset_manifest(directory):
+    """
+    Reads the manifest of a dataset directory.
+
+    Raises:
+        ValueError: If the directory holds another format or version.
+    """
+    with open(os.path.join(directory, MANIFEST_FILE), 'r') as file:
+        manifest = json.load(file)
+    if manifest.get('format') != DATASET_FORMAT or manifest.get('version') != DATASET_VERSION:
+        raise ValueError(f"{directory} is not a version {DATASET_VERSION} {DATASET_FORMAT} dataset.")
+    return manifest
+
+def read_columnar_dataset(directory, hospital, first_date=None, last_date=None, departments=None):
+    """
+    Loads a dataset written by write_columnar_dataset into a hospital, optionally only some of its visits.
+
+    The date and department predicates are pushed down: partitions whose
+    date range or departments cannot match are never opened, and within a
+    partition the visits are selected from the date and department columns
+    before any record is built. With a predicate only the patients of the
+    matching visits are loaded; without one every patient is, including
+    those without visits.
+
+    Args:
+        directory (str): Path of the dataset directory.
+        hospital (Hospital): The empty hospital to fill.
+        first_date (date): Earliest visit date to load, inclusive.
+        last_date (date): Latest visit date to load, inclusive.
+        departments (iterable): Departments whose visits are loaded.
+
+    Returns:
+        int: The number of notes loaded.
+
+    Raises:
+        ValueError: If a patient ID is repeated in the dataset or already in
+            the hospital, before any patient is added.
+    """
+    manifest = read_dataset_manifest(directory)
+    dictionaries = manifest['dictionaries']
+    first_day = first_date.toordinal() if first_date is not None else None
+    last_day = last_date.toordinal() if last_date is not None else None
+    department_codes = None
+    if departments is not None:
+        departments = set(departments)
+        department_codes = {code for code, department in enumerate(dictionaries['department'])
+                            if department in departments}
+    filtered = first_day is not None or last_day is not None or department_codes is not None
+
+    # Visits land at their position in the hospital's visit order, which
+    # keeps each patient's visits together and in their original order.
+    visits = [None] * manifest['visits']
+    notes = 0
+    department_names = dictionaries['department']
+    chief_complaint_names = dictionaries['chief_complaint']
+    note_type_names = dictionaries['note_type']
+    with gc_paused(), hospital.loading():
+        for entry in manifest['partitions']:
+            if first_day is not None and date.fromisoformat(entry['last_date']).toordinal() < first_day:
+                continue
+            if last_day is not None and date.fromisoformat(entry['first_date']).toordinal() > last_day:
+                continue
+            if department_codes is not None and department_codes.isdisjoint(entry['departments']):
+                continue
+            partition_directory = os.path.join(directory, entry['path'])
+
+            def column(name):
+                return read_npy(os.path.join(partition_directory, f'{name}.npy'))
+
+            visit_days = [day + _EPOCH_DAY for day in column('visit_date')]
+            partition_departments = column('department')
+            note_counts = column('note_count')
+            note_starts = array('i', [0])
+            for count in note_counts:
+                note_starts.append(note_starts[-1] + count)
+            selected = range(len(visit_days))
+            if first_day is not None:
+                selected = [index for index in selected if visit_days[index] >= first_day]
+            if last_day is not None:
+                selected = [index for index in selected if visit_days[index] <= last_day]
+            if department_codes is not None:
+                selected = [index for index in selected if partition_departments[index] in department_codes]
+            if not selected:
+                continue
+
+            visit_sequences = column('visit_sequence')
+            visit_patients = column('patient')
+            visit_ids = column('visit_id')
+            chief_complaints = column('chief_complaint')
+            note_ids = column('note_id')
+            note_types = column('note_type')
+            for index in selected:
+                note_records = [NoteRecord(note_ids[note], note_type_names[note_types[note]])
+                                for note in range(note_starts[index], note_starts[index + 1])]
+                notes += len(note_records)
+                visit_record = VisitRecord(visit_ids[index], visit_days[index],
+                                           department_names[partition_departments[index]],
+                                           chief_complaint_names[chief_complaints[index]], note_records)
+                visits[visit_sequences[index]] = (visit_patients[index], visit_record)
+
+        patients_directory = os.path.join(directory, manifest['patients']['path'])
+        patient_columns = []
+        for name in ('patient_id', 'gender', 'race', 'age', 'ethnicity', 'insurance', 'zip_code'):
+            values = read_npy(os.path.join(patients_directory, f'{name}.npy'))
+            if name in dictionaries:
+                names = dictionaries[name]
+                values = [names[code] for code in values]
+            patient_columns.append(values)
+        patient_fields = list(zip(*patient_columns))
+
+        patient_visits = {}
+        for visit in visits:
+            if visit is not None:
+                patient_visits.setdefault(visit[0], []).append(visit[1])
+        patient_indexes = sorted(patient_visits) if filtered else range(len(patient_fields))
+        counts = Counter(patient_fields[patient_index][0] for patient_index in patient_indexes)
+        duplicates = [patient_id for patient_id, count in counts.items()
+                      if count > 1 or patient_id in hospital.patient_records]
+        if duplicates:
+            raise ValueError(f"{directory} holds {len(duplicates)} patients that are repeated or already loaded, "
+                             f"such as {', '.join(duplicates[:5])}.")
+        for patient_index in patient_indexes:
+            patient_record = PatientRecord(*patient_fields[patient_index])
+            patient_record.visit_records = patient_visits.get(patient_index, [])
+            hospital.add_patient_record(patient_record)
+    return notes
\ No newline at end of file
@@ -0,0 +1,578 @@
+# columnar_hospital.py
+from array import array
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import date, datetime
+
+from analytics import StatisticsColumns, age_bin
+from hospital_management import HOSPITAL_METHOD_ROWS, HOSPITAL_METHODS, Hospital
+from hospital_versions import freeze_patient
+from instrumentation import instrument
+
+# An offset table is rebuilt once the rows appended after it was built exceed
+# this fraction of the rows it covers; until then the new rows are read
+# through the chains.
+OFFSET_REBUILD_FRACTION = 0.25
+# The rows of removed patients and their visits are reclaimed once they number
+# at least COMPACT_MIN_DEAD_ROWS and COMPACT_DEAD_FRACTION of all such rows.
+COMPACT_MIN_DEAD_ROWS = 4096
+COMPACT_DEAD_FRACTION = 0.25
+
+class StringDictionary:
+    """
+    Dictionary-encodes a low-cardinality string column as small integer codes.
+    """
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        """
+        Returns the code of a value, assigning the next free code to new values.
+
+        Args:
+            value (str): The value to encode.
+        """
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class IdColumn:
+    """
+    Stores identifier strings, keeping canonical decimal IDs as 64-bit integers.
+
+    Identifiers that would not survive a round trip through int() are kept as
+    strings and referenced by negative codes.
+    """
+    def __init__(self):
+        self.numbers = array('q')
+        self.others = []
+
+    def append(self, value):
+        """
+        Appends an identifier to the column.
+
+        Args:
+            value (str): The identifier to append.
+        """
+        if value.isascii() and value.isdigit() and len(value) < 19 and (value[0] != '0' or value == '0'):
+            self.numbers.append(int(value))
+        else:
+            self.numbers.append(-1 - len(self.others))
+            self.others.append(value)
+
+    def __getitem__(self, index):
+        number = self.numbers[index]
+        if number >= 0:
+            return str(number)
+        return self.others[-1 - number]
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def take(self, indexes):
+        """
+        Returns a new column holding the identifiers at the given indexes, in that order.
+
+        Args:
+            indexes (iterable): Positions in this column.
+        """
+        column = IdColumn()
+        numbers = self.numbers
+        for index in indexes:
+            number = numbers[index]
+            if number >= 0:
+                column.numbers.append(number)
+            else:
+                column.numbers.append(-1 - len(column.others))
+                column.others.append(self.others[-1 - number])
+        return column
+
+def _check_fits(column, values):
+    # Raises OverflowError or TypeError if the typed column cannot hold the
+    # values, before anything has been appended.
+    array(column.typecode, values)
+
+def _grouped(rows, codes, dictionary=None):
+    # The rows per value of a column, decoding each distinct code once.
+    groups = defaultdict(list)
+    for row, code in zip(rows, codes):
+        groups[code].append(row)
+    if dictionary is None:
+        return groups
+    return {dictionary.values[code]: keys for code, keys in groups.items()}
+
+def _encoded_property(column, dictionary):
+    return property(lambda view: getattr(view._hospital, dictionary).values[getattr(view._hospital, column)[view._row]])
+
+def _id_property(column):
+    return property(lambda view: getattr(view._hospital, column)[view._row])
+
+class NoteView:
+    """
+    Read-only view of one note row of a ColumnarHospital.
+    """
+    __slots__ = ('_hospital', '_row')
+
+    def __init__(self, hospital, row):
+        self._hospital = hospital
+        self._row = row
+
+    note_id = _id_property('_note_ids')
+    note_type = _encoded_property('_note_types', 'note_type_dictionary')
+
+class VisitView:
+    """
+    View of one visit row of a ColumnarHospital.
+    """
+    __slots__ = ('_hospital', '_row')
+
+    def __init__(self, hospital, row):
+        self._hospital = hospital
+        self._row = row
+
+    visit_id = _id_property('_visit_ids')
+    department = _encoded_property('_departments', 'department_dictionary')
+    chief_complaint = _encoded_property('_chief_complaints', 'chief_complaint_dictionary')
+
+    @property
+    def visit_day(self):
+        return self._hospital._visit_days[self._row]
+
+    @property
+    def visit_time(self):
+        return datetime.fromordinal(self._hospital._visit_days[self._row])
+
+    @property
+    def visit_date(self):
+        return date.fromordinal(self._hospital._visit_days[self._row])
+
+    @property
+    def note_records(self):
+        hospital = self._hospital
+        return [NoteView(hospital, row) for row in hospital._note_rows(self._row)]
+
+    def add_note_record(self, note_record):
+        self._hospital._append_note(self._row, note_record)
+
+class PatientView:
+    """
+    View of one patient row of a ColumnarHospital.
+    """
+    __slots__ = ('_hospital', '_row')
+
+    def __init__(self, hospital, row):
+        self._hospital = hospital
+        self._row = row
+
+    gender = _encoded_property('_genders', 'gender_dictionary')
+    race = _encoded_property('_races', 'race_dictionary')
+    ethnicity = _encoded_property('_ethnicities', 'ethnicity_dictionary')
+    insurance = _encoded_property('_insurances', 'insurance_dictionary')
+    zip_code = _encoded_property('_zip_codes', 'zip_code_dictionary')
+
+    @property
+    def patient_id(self):
+        return self._hospital._patient_ids[self._row]
+
+    @property
+    def age(self):
+        return self._hospital._ages[self._row]
+
+    @property
+    def visit_records(self):
+        hospital = self._hospital
+        return [VisitView(hospital, row) for row in hospital._visit_rows(self._row)]
+
+    def add_visit_record(self, visit_record):
+        self._hospital.add_visit_record(self, visit_record)
+
+class _ChainedVisit(VisitView):
+    """
+    VisitView whose notes come from the note chain rather than the offset table.
+    """
+    __slots__ = ()
+
+    @property
+    def note_records(self):
+        hospital = self._hospital
+        return [NoteView(hospital, row) for row in reversed(hospital._visit_note_rows(self._row))]
+
+class _ChainedPatient(PatientView):
+    """
+    PatientView whose visits and notes come from the chains rather than the offset tables.
+    """
+    __slots__ = ()
+
+    @property
+    def visit_records(self):
+        hospital = self._hospital
+        return [_ChainedVisit(hospital, row) for row in reversed(hospital._patient_visit_rows(self._row))]
+
+class _PatientRecordsView(Mapping):
+    """
+    Read-only mapping from patient ID to PatientView, standing in for the
+    patient_records dict of Hospital.
+    """
+    def __init__(self, hospital):
+        self._hospital = hospital
+        self._rows = hospital._patient_rows
+
+    def __getitem__(self, patient_id):
+        return PatientView(self._hospital, self._rows[patient_id])
+
+    def get(self, patient_id, default=None):
+        row = self._rows.get(patient_id)
+        if row is None:
+            return default
+        return PatientView(self._hospital, row)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+class ColumnarHospital(Hospital):
+    """
+    Hospital backend that keeps patients, visits and notes in parallel typed arrays.
+
+    Categorical strings are dictionary-encoded, visit dates are day ordinals,
+    and visits and notes are appended in arrival order with a column pointing
+    at their parent row. Offset tables grouping visits by patient and notes by
+    visit cover the rows present when they were built; rows appended later
+    are read through per-parent chains until enough of them pile up to make
+    rebuilding a table worth it. Rows of removed patients are reclaimed in
+    one pass once they make up a large enough share of the columns. Reads
+    hand out lightweight view objects, so retrieve_patient_record and the
+    loaders work unchanged; views handed out before rows are reclaimed must
+    not be used afterwards.
+    """
+    def __init__(self):
+        super().__init__()
+        self.gender_dictionary = StringDictionary()
+        self.race_dictionary = StringDictionary()
+        self.ethnicity_dictionary = StringDictionary()
+        self.insurance_dictionary = StringDictionary()
+        self.zip_code_dictionary = StringDictionary()
+        self.department_dictionary = StringDictionary()
+        self.chief_complaint_dictionary = StringDictionary()
+        self.note_type_dictionary = StringDictionary()
+
+        self._patient_rows = {}
+        self._patient_ids = []
+        self._genders = array('H')
+        self._races = array('H')
+        self._ethnicities = array('H')
+        self._insurances = array('H')
+        self._zip_codes = array('I')
+        self._ages = array('i')
+        self._patient_last_visits = array('i')
+
+        self._visit_patients = array('i')
+        self._visit_previous = array('i')
+        self._visit_last_notes = array('i')
+        self._visit_ids = IdColumn()
+        self._visit_days = array('i')
+        self._departments = array('H')
+        self._chief_complaints = array('H')
+
+        self._note_visits = array('i')
+        self._note_previous = array('i')
+        self._note_ids = IdColumn()
+        self._note_types = array('H')
+
+        self._reset_offsets()
+        self._dead_rows = 0
+
+        self.patient_records = _PatientRecordsView(self)
+
+    def _store_patient_row(self, patient_record):
+        # The patient is registered once all of its columns were appended.
+        row = len(self._patient_ids)
+        self._genders.append(self.gender_dictionary.encode(patient_record.gender))
+        self._races.append(self.race_dictionary.encode(patient_record.race))
+        self._ethnicities.append(self.ethnicity_dictionary.encode(patient_record.ethnicity))
+        self._insurances.append(self.insurance_dictionary.encode(patient_record.insurance))
+        self._zip_codes.append(self.zip_code_dictionary.encode(patient_record.zip_code))
+        self._ages.append(patient_record.age)
+        self._patient_last_visits.append(-1)
+        self._patient_ids.append(patient_record.patient_id)
+        self._patient_rows[patient_record.patient_id] = row
+        return row
+
+    def _store_patient(self, patient_record):
+        # A patient the columns cannot hold is rejected before any of its rows are stored.
+        _check_fits(self._ages, [patient_record.age])
+        _check_fits(self._visit_days, [visit_record.visit_day for visit_record in patient_record.visit_records])
+        row = self._store_patient_row(patient_record)
+        patient_view = PatientView(self, row)
+        entries = [(self._store_visit(row, visit_record), patient_view, visit_record, visit_record.visit_day)
+                   for visit_record in patient_record.visit_records]
+        return self._statistics_groups(patient_record), [entry[3] for entry in entries], entries
+
+    def add_visit_record(self, patient_record, visit_record):
+        if isinstance(patient_record, PatientView) and patient_record._hospital is self:
+            row = patient_record._row
+        else:
+            row = self._patient_rows[patient_record.patient_id]
+        _check_fits(self._visit_days, [visit_record.visit_day])
+        if self._deferred(self._patient_ids[row]):
+            return VisitView(self, self._store_visit(row, visit_record))
+        return self._append_visit(row, visit_record, self._statistics_groups(PatientView(self, row)))
+
+    def _append_visit(self, patient_row, visit_record, groups):
+        visit_day = visit_record.visit_day
+        self.statistics.add_visit(groups, visit_day, self._patient_ids[patient_row], self._patient_visit_days(patient_row))
+        visit_row = self._store_visit(patient_row, visit_record)
+        self.visit_date_index.add(visit_day)
+        self.visit_indexes.add_visit(visit_row, PatientView(self, patient_row), visit_record, visit_day)
+        return VisitView(self, visit_row)
+
+    def _store_visit(self, patient_row, visit_record):
+        visit_row = len(self._visit_days)
+        self._visit_patients.append(patient_row)
+        self._visit_previous.append(self._patient_last_visits[patient_row])
+        self._patient_last_visits[patient_row] = visit_row
+        self._visit_ids.append(visit_record.visit_id)
+        self._visit_days.append(visit_record.visit_day)
+        self._departments.append(self.department_dictionary.encode(visit_record.department))
+        self._chief_complaints.append(self.chief_complaint_dictionary.encode(visit_record.chief_complaint))
+        self._visit_last_notes.append(-1)
+        for note_record in visit_record.note_records:
+            self._store_note(visit_row, note_record)
+        return visit_row
+
+    def _store_note(self, visit_row, note_record):
+        self._note_previous.append(self._visit_last_notes[visit_row])
+        self._visit_last_notes[visit_row] = len(self._note_visits)
+        self._note_visits.append(visit_row)
+        self._note_ids.append(note_record.note_id)
+        self._note_types.append(self.note_type_dictionary.encode(note_record.note_type))
+
+    def _append_note(self, visit_row, note_record):
+        self._store_note(visit_row, note_record)
+        self.visit_indexes.add_note(visit_row, note_record)
+
+    def add_note_record(self, patient_record, visit_record, note_record):
+        if self._deferred(patient_record.patient_id):
+            self._store_note(visit_record._row, note_record)
+        else:
+            self._append_note(visit_record._row, note_record)
+
+    @staticmethod
+    def _chain(row, previous):
+        # Walks a newest-first chain of child rows. Unlike the offset tables
+        # the chains stay current while rows are being appended.
+        rows = []
+        while row >= 0:
+            rows.append(row)
+            row = previous[row]
+        return rows
+
+    def _patient_visit_rows(self, patient_row):
+        return self._chain(self._patient_last_visits[patient_row], self._visit_previous)
+
+    def _patient_visit_days(self, patient_row):
+        # Lazily, so the chain is only walked when the aggregates ask for it.
+        visit_days = self._visit_days
+        visit_previous = self._visit_previous
+        row = self._patient_last_visits[patient_row]
+        while row >= 0:
+            yield visit_days[row]
+            row = visit_previous[row]
+
+    def _visit_note_rows(self, visit_row):
+        return self._chain(self._visit_last_notes[visit_row], self._note_previous)
+
+    def _stored_patient(self, patient_id):
+        # Visit rows are the visit keys. The chains are current while rows are appended.
+        row = self._patient_rows[patient_id]
+        patient_view = PatientView(self, row)
+        entries = [(visit_row, patient_view, _ChainedVisit(self, visit_row), self._visit_days[visit_row])
+                   for visit_row in reversed(self._patient_visit_rows(row))]
+        return self._statistics_groups(patient_view), [entry[3] for entry in entries], entries
+
+    def _post_visits(self, entries):
+        # Groups the visit rows by the code columns and decodes each value
+        # once, rather than reading every visit through its views.
+        rows = [entry[0] for entry in entries]
+        patient_rows = [self._visit_patients[row] for row in rows]
+        note_types = defaultdict(list)
+        for row in rows:
+            codes = {self._note_types[note_row] for note_row in self._visit_note_rows(row)}
+            for code in codes:
+                note_types[code].append(row)
+        self.visit_indexes.add_postings({
+            'department': _grouped(rows, map(self._departments.__getitem__, rows), self.department_dictionary),
+            'chief_complaint': _grouped(rows, map(self._chief_complaints.__getitem__, rows),
+                                        self.chief_complaint_dictionary),
+            'zip_code': _grouped(rows, map(self._zip_codes.__getitem__, patient_rows), self.zip_code_dictionary),
+            'insurance': _grouped(rows, map(self._insurances.__getitem__, patient_rows), self.insurance_dictionary),
+            'visit_date': _grouped(rows, map(self._visit_days.__getitem__, rows)),
+            'note_type': {self.note_type_dictionary.values[code]: keys for code, keys in note_types.items()},
+        })
+
+    def _forget_patient(self, patient_id):
+        # The row stays in the columns; only the ID mapping, the date index,
+        # the aggregates and the secondary indexes forget it.
+        stored = self._stored_patient(patient_id)
+        del self._patient_rows[patient_id]
+        self._dead_rows += 1 + len(stored[2])
+        return stored
+
+    def _reclaim(self):
+        # Never inside loading(), where the loaders hold views of the rows.
+        dead_rows = self._dead_rows
+        if (self._loading is None and dead_rows >= COMPACT_MIN_DEAD_ROWS
+                and dead_rows >= COMPACT_DEAD_FRACTION * (len(self._patient_ids) + len(self._visit_days))):
+            self._compact()
+
+    def _compact(self):
+        # Rewrites the columns without the rows of removed patients, keeping
+        # the order of the rest, and renumbers the visit keys of the indexes.
+        patient_map = array('i', [-1]) * len(self._patient_ids)
+        patients = []
+        for row in self._patient_rows.values():
+            patient_map[row] = len(patients)
+            patients.append(row)
+        visit_map = array('i', [-1]) * len(self._visit_days)
+        visits = []
+        for row, patient_row in enumerate(self._visit_patients):
+            if patient_map[patient_row] >= 0:
+                visit_map[row] = len(visits)
+                visits.append(row)
+        note_map = array('i', [-1]) * len(self._note_visits)
+        notes = []
+        for row, visit_row in enumerate(self._note_visits):
+            if visit_map[visit_row] >= 0:
+                note_map[row] = len(notes)
+                notes.append(row)
+        # -1 ends a chain; as the last entry of the maps it maps to itself.
+        visit_map.append(-1)
+        note_map.append(-1)
+
+        def take(column, rows, row_map=None):
+            values = map(column.__getitem__, rows)
+            if row_map is not None:
+                values = map(row_map.__getitem__, values)
+            return array(column.typecode, values)
+
+        self._patient_ids = [self._patient_ids[row] for row in patients]
+        self._genders = take(self._genders, patients)
+        self._races = take(self._races, patients)
+        self._ethnicities = take(self._ethnicities, patients)
+        self._insurances = take(self._insurances, patients)
+        self._zip_codes = take(self._zip_codes, patients)
+        self._ages = take(self._ages, patients)
+        self._patient_last_visits = take(self._patient_last_visits, patients, visit_map)
+        self._visit_previous = take(self._visit_previous, visits, visit_map)
+        self._visit_last_notes = take(self._visit_last_notes, visits, note_map)
+        self._visit_patients = take(self._visit_patients, visits, patient_map)
+        self._visit_ids = self._visit_ids.take(visits)
+        self._visit_days = take(self._visit_days, visits)
+        self._departments = take(self._departments, visits)
+        self._chief_complaints = take(self._chief_complaints, visits)
+        self._note_previous = take(self._note_previous, notes, note_map)
+        self._note_visits = take(self._note_visits, notes, visit_map)
+        self._note_ids = self._note_ids.take(notes)
+        self._note_types = take(self._note_types, notes)
+        # patient_records reads this dict, so it is updated in place.
+        for patient_id, row in self._patient_rows.items():
+            self._patient_rows[patient_id] = patient_map[row]
+        self.visit_indexes.renumber(visit_map)
+        self._reset_offsets()
+        self._dead_rows = 0
+
+    def _frozen_record(self, patient_id):
+        # Publishing follows every mutation, and most of them append rows the
+        # offset tables do not cover yet.
+        row = self._patient_rows.get(patient_id)
+        return None if row is None else freeze_patient(_ChainedPatient(self, row))
+
+    def _visit_entry(self, key):
+        return PatientView(self, self._visit_patients[key]), VisitView(self, key)
+
+    def _visit_day(self, key):
+        return self._visit_days[key]
+
+    def _all_visit_entries(self):
+        alive = self._alive_patients()
+        return [self._visit_entry(visit_row) for visit_row, patient_row in enumerate(self._visit_patients)
+                if alive[patient_row]]
+
+    def _alive_patients(self):
+        # Rows of removed or replaced patients stay in the columns.
+        alive = bytearray(len(self._patient_ids))
+        for row in self._patient_rows.values():
+            alive[row] = 1
+        return alive
+
+    @staticmethod
+    def _group_rows(parents, parent_count):
+        # Stable counting sort of child rows by parent row, giving CSR offsets.
+        offsets = array('i', bytes(4 * (parent_count + 1)))
+        for parent in parents:
+            offsets[parent + 1] += 1
+        for index in range(parent_count):
+            offsets[index + 1] += offsets[index]
+        order = array('i', bytes(4 * len(parents)))
+        cursor = array('i', offsets)
+        for child, parent in enumerate(parents):
+            order[cursor[parent]] = child
+            cursor[parent] += 1
+        return offsets, order
+
+    def _reset_offsets(self):
+        # The tables and the (parent rows, child rows) they cover.
+        self._visit_offsets = self._visit_order = None
+        self._visit_table_rows = (0, 0)
+        self._note_offsets = self._note_order = None
+        self._note_table_rows = (0, 0)
+
+    def _visit_rows(self, patient_row):
+        patients, visits = self._visit_table_rows
+        if patient_row >= patients or self._patient_last_visits[patient_row] >= visits:
+            # A patient added, or given a visit, since the table was built.
+            if len(self._visit_days) - visits <= OFFSET_REBUILD_FRACTION * visits:
+                return self._patient_visit_rows(patient_row)[::-1]
+            self._visit_offsets, self._visit_order = self._group_rows(self._visit_patients, len(self._patient_ids))
+            self._visit_table_rows = (len(self._patient_ids), len(self._visit_days))
+        return self._visit_order[self._visit_offsets[patient_row]:self._visit_offsets[patient_row + 1]]
+
+    def _note_rows(self, visit_row):
+        visits, notes = self._note_table_rows
+        if visit_row >= visits or self._visit_last_notes[visit_row] >= notes:
+            if len(self._note_visits) - notes <= OFFSET_REBUILD_FRACTION * notes:
+                return self._visit_note_rows(visit_row)[::-1]
+            self._note_offsets, self._note_order = self._group_rows(self._note_visits, len(self._visit_days))
+            self._note_table_rows = (len(self._visit_days), len(self._note_visits))
+        return self._note_order[self._note_offsets[visit_row]:self._note_offsets[visit_row + 1]]
+
+    def statistics_columns(self):
+        # Group by the dictionary codes; analytics decodes only the group keys.
+        alive = self._alive_patients()
+        age_bins = StringDictionary()
+        age_codes = {age: age_bins.encode(age_bin(age)) for age in set(self._ages)}
+        patient_groups = {
+            'insurance': self._insurances,
+            'age': array('H', map(age_codes.__getitem__, self._ages)),
+            'race': self._races,
+            'gender': self._genders,
+            'ethnicity': self._ethnicities,
+        }
+        decoders = {
+            'insurance': self.insurance_dictionary.values,
+            'age': age_bins.values,
+            'race': self.race_dictionary.values,
+            'gender': self.gender_dictionary.values,
+            'ethnicity': self.ethnicity_dictionary.values,
+        }
+        return StatisticsColumns(patient_groups, decoders, self._visit_patients, self._visit_days, alive)
+
+instrument(ColumnarHospital, HOSPITAL_METHODS, 'hospital', HOSPITAL_METHOD_ROWS)
\ No newline at end of file
@@ -1,28 +1,332 @@
 # credentials_manage.py
 import csv
-from collections import namedtuple
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from source_files import source_fingerprint, source_is_current
 
 Credential = namedtuple('Credential', ['username', 'password', 'role'])
+StoredCredential = namedtuple('StoredCredential', ['username', 'role', 'salt', 'password_hash', 'password_digest'])
+
+DEFAULT_HASH_ITERATIONS = 20000
+DEFAULT_SESSION_CACHE_SIZE = 1024
+# Below this many users the index is hashed in-process.
+_PARALLEL_HASH_MIN_USERS = 256
+
+INDEX_MAGIC = b'HCREDIDX'
+INDEX_VERSION = 2
+
+# Magic, format version, PBKDF2 iterations, entry count, manifest length.
+_INDEX_HEADER = struct.Struct('<8sIIII')
+# Username key, record offset; sorted by key.
+_INDEX_ENTRY = struct.Struct('<QI')
+# Username length, role length, salt, PBKDF2-SHA256 hash, password digest; then username and role.
+_INDEX_RECORD = struct.Struct('<HB16s32s16s')
+# Length of the secret keying the password digests, kept in <index_file>.key.
+_DIGEST_KEY_SIZE = 32
+# The header rows read_credentials recognises, with the columns they put the credential fields in.
+_HEADER_COLUMNS = {('', 'username', 'password', 'role'): [1, 2, 3], ('username', 'password', 'role'): [0, 1, 2]}
+
+def hash_password(password, salt, iterations=DEFAULT_HASH_ITERATIONS):
+    """
+    Derives the stored hash of a password with PBKDF2-HMAC-SHA256.
+
+    Args:
+        password (str): The plaintext password.
+        salt (bytes): The 16 random bytes stored with the user.
+        iterations (int): The PBKDF2 iteration count.
+
+    Returns:
+        bytes: The 32-byte hash.
+    """
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+def _username_key(username):
+    return int.from_bytes(hashlib.blake2b(username.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _digest_key(index_file):
+    # The secret keying the password digests of an index, created on first
+    # use. It lives outside the index, so the digests alone do not make
+    # guessing a password any cheaper than PBKDF2.
+    key_file = f"{index_file}.key"
+    try:
+        with open(key_file, 'rb') as file:
+            key = file.read()
+        if len(key) == _DIGEST_KEY_SIZE:
+            return key
+    except FileNotFoundError:
+        pass
+    key = os.urandom(_DIGEST_KEY_SIZE)
+    temp_file = f"{key_file}.tmp"
+    descriptor = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(key)
+    os.replace(temp_file, key_file)
+    return key
+
+def _password_digest(key, username, password):
+    # Tells whether a user's password changed since the index was built, without PBKDF2.
+    message = username.encode('utf-8') + b'\0' + password.encode('utf-8')
+    return hmac.new(key, message, hashlib.sha256).digest()[:16]
+
+def read_credentials(file_path):
+    """
+    Reads the plaintext credentials file.
+
+    Handles both the indexed format of PA3_credentials.txt, with a header
+    row naming the username, password and role columns after an unnamed
+    index column, and plain username,password,role rows with or without a
+    header. Only a first row matching one of these headers exactly is
+    skipped, so a user named 'username' is still read.
+
+    Args:
+        file_path (str): Path to the credentials file.
+
+    Yields:
+        Credential: One credential per data row.
+    """
+    with open(file_path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        first_row = next(reader, None)
+        if first_row is None:
+            return
+        columns = _HEADER_COLUMNS.get(tuple(first_row))
+        if columns is None:
+            columns = [0, 1, 2]
+            yield Credential(*first_row)
+        for row in reader:
+            if row:
+                yield Credential(*[row[column] for column in columns])
+
+def build_credential_index(credential_file, index_file, iterations=DEFAULT_HASH_ITERATIONS):
+    """
+    Hashes the passwords of a credentials file and writes the on-disk username index.
+
+    The index starts with a header and a JSON manifest holding the source
+    file's fingerprint, followed by a table of (username key, record offset)
+    entries sorted by key and the variable-length records they point to. It
+    is written next to its final path, readable only by its owner, and
+    renamed into place.
+
+    Each record also holds a digest of the password keyed by the secret in
+    <index_file>.key. When an index built with the same iteration count
+    already exists, users whose digest still matches keep their salt and
+    hash, so editing the file only hashes the passwords that changed.
+
+    Args:
+        credential_file (str): Path to the plaintext credentials file.
+        index_file (str): Path of the index to write.
+        iterations (int): The PBKDF2 iteration count.
+    """
+    fingerprint = source_fingerprint(credential_file)
+    credentials = {credential.username: credential for credential in read_credentials(credential_file)}
+    keyed = sorted((_username_key(username), credential) for username, credential in credentials.items())
+    manifest = json.dumps({'source': fingerprint}).encode('utf-8')
+    records_start = _INDEX_HEADER.size + len(manifest) + _INDEX_ENTRY.size * len(keyed)
+
+    digest_key = _digest_key(index_file)
+    digests = [_password_digest(digest_key, credential.username, credential.password) for _, credential in keyed]
+    salts = [None] * len(keyed)
+    password_hashes = [None] * len(keyed)
+    try:
+        previous = CredentialIndex(index_file)
+    except (FileNotFoundError, ValueError):
+        previous = None
+    if previous is not None:
+        if previous.iterations == iterations:
+            for position, ((_, credential), digest) in enumerate(zip(keyed, digests)):
+                stored = previous.lookup(credential.username)
+                if stored is not None and hmac.compare_digest(stored.password_digest, digest):
+                    salts[position] = stored.salt
+                    password_hashes[position] = stored.password_hash
+        previous.close()
+
+    changed = [position for position, password_hash in enumerate(password_hashes) if password_hash is None]
+    for position in changed:
+        salts[position] = os.urandom(16)
+    passwords = [keyed[position][1].password for position in changed]
+    changed_salts = [salts[position] for position in changed]
+    workers = os.cpu_count() or 1
+    if workers > 1 and len(changed) >= _PARALLEL_HASH_MIN_USERS:
+        # Hashing dominates the build and each hash holds the GIL.
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            new_hashes = list(executor.map(hash_password, passwords, changed_salts, repeat(iterations),
+                                           chunksize=len(changed) // (workers * 4) + 1))
+    else:
+        new_hashes = list(map(hash_password, passwords, changed_salts, repeat(iterations)))
+    for position, password_hash in zip(changed, new_hashes):
+        password_hashes[position] = password_hash
+
+    table = []
+    records = []
+    offset = records_start
+    for (key, credential), salt, password_hash, digest in zip(keyed, salts, password_hashes, digests):
+        username = credential.username.encode('utf-8')
+        role = credential.role.encode('utf-8')
+        record = _INDEX_RECORD.pack(len(username), len(role), salt, password_hash, digest) + username + role
+        table.append(_INDEX_ENTRY.pack(key, offset))
+        records.append(record)
+        offset += len(record)
+
+    temp_file = f"{index_file}.tmp"
+    descriptor = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, iterations, len(keyed), len(manifest)))
+        file.write(manifest)
+        file.writelines(table)
+        file.writelines(records)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, index_file)
+
+class CredentialIndex:
+    """
+    Memory-mapped username index written by build_credential_index.
+
+    A lookup binary searches the sorted key table and decodes only the
+    records under the matching key, so it touches a handful of pages
+    whatever the number of users.
+    """
+    def __init__(self, index_file):
+        with open(index_file, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.iterations, self.count, manifest_length = _INDEX_HEADER.unpack_from(self.buffer)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.buffer.close()
+            raise ValueError(f"{index_file} is not a credential index.")
+        self.manifest = json.loads(self.buffer[_INDEX_HEADER.size:_INDEX_HEADER.size + manifest_length])
+        self.table_start = _INDEX_HEADER.size + manifest_length
+
+    def _key_at(self, position):
+        return _INDEX_ENTRY.unpack_from(self.buffer, self.table_start + position * _INDEX_ENTRY.size)
+
+    def lookup(self, username):
+        """
+        Finds the stored credential of a user.
+
+        Args:
+            username (str): The username to look up.
+
+        Returns:
+            StoredCredential: The user's role, salt and password hash, or
+                None if the username is not in the index.
+        """
+        key = _username_key(username)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        # Distinct usernames can share a 64-bit key, so check every entry under it.
+        while low < self.count:
+            entry_key, offset = self._key_at(low)
+            if entry_key != key:
+                break
+            username_length, role_length, salt, password_hash, password_digest = _INDEX_RECORD.unpack_from(
+                self.buffer, offset)
+            start = offset + _INDEX_RECORD.size
+            stored_username = self.buffer[start:start + username_length].decode('utf-8')
+            if stored_username == username:
+                role = self.buffer[start + username_length:start + username_length + role_length].decode('utf-8')
+                return StoredCredential(stored_username, role, salt, password_hash, password_digest)
+            low += 1
+        return None
+
+    def close(self):
+        self.buffer.close()
 
 class CredentialManager:
-    def __init__(self, credential_file):
-        self.credentials = self._load_credentials(credential_file)
-
-    def _load_credentials(self, file_path):
-        credentials = {}
-        with open(file_path, 'r') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                username, password, role = row
-                credentials[username] = Credential(username, password, role)
-        return credentials
+    """
+    Verifies logins against salted password hashes in an on-disk username index.
+
+    The index is built from the plaintext credentials file on first use and
+    rebuilt whenever that file changes, hashing only the passwords that
+    changed. It is kept at index_file, next to the credentials file by
+    default, with its digest key in index_file plus '.key'. Successful logins are remembered in a
+    bounded LRU cache keyed by username and a keyed digest of the password,
+    so repeated logins skip the deliberately slow PBKDF2 work.
+
+    Each login stats the credentials file. When it changed since the last
+    check, the index is rebuilt if the contents differ and the remembered
+    logins are dropped, so a removed user or changed password takes effect
+    without a restart.
+    """
+    def __init__(self, credential_file, index_file=None, iterations=DEFAULT_HASH_ITERATIONS,
+                 session_cache_size=DEFAULT_SESSION_CACHE_SIZE):
+        self.credential_file = credential_file
+        self.index_file = index_file or f"{credential_file}.index"
+        self.session_cache_size = session_cache_size
+        self.sessions = OrderedDict()
+        self._session_key = os.urandom(32)
+        self.iterations = iterations
+        self._source_stat = source_fingerprint(credential_file, with_hash=False)
+        self.index = self._open_index(iterations)
+
+    def _open_index(self, iterations):
+        try:
+            index = CredentialIndex(self.index_file)
+        except (FileNotFoundError, ValueError):
+            index = None
+        if index is not None:
+            if index.iterations == iterations and source_is_current(index.manifest['source'], self.credential_file):
+                return index
+            index.close()
+        build_credential_index(self.credential_file, self.index_file, iterations)
+        return CredentialIndex(self.index_file)
+
+    def _refresh_index(self):
+        # Taken before the check, so a change made during a rebuild is seen by the next login.
+        source_stat = source_fingerprint(self.credential_file, with_hash=False)
+        if source_stat == self._source_stat:
+            return
+        if not source_is_current(self.index.manifest['source'], self.credential_file):
+            self.index.close()
+            self.index = self._open_index(self.iterations)
+            self.sessions.clear()
+        self._source_stat = source_stat
+
+    def _session_digest(self, password):
+        return hmac.new(self._session_key, password.encode('utf-8'), hashlib.sha256).digest()
 
     def validate_user(self, username, password):
-        if username in self.credentials:
-            credential = self.credentials[username]
-            if credential.password == password:
-                return UserProfile(credential)
-        return None
+        """
+        Checks a username and password.
+
+        Args:
+            username (str): The username.
+            password (str): The plaintext password.
+
+        Returns:
+            UserProfile: The user if the password matches, else None.
+        """
+        self._refresh_index()
+        session_digest = self._session_digest(password)
+        session = self.sessions.get(username)
+        if session is not None and hmac.compare_digest(session[0], session_digest):
+            self.sessions.move_to_end(username)
+            return session[1]
+
+        stored = self.index.lookup(username)
+        if stored is None:
+            return None
+        password_hash = hash_password(password, stored.salt, self.index.iterations)
+        if not hmac.compare_digest(password_hash, stored.password_hash):
+            return None
+        user = UserProfile(stored)
+        self.sessions[username] = (session_digest, user)
+        self.sessions.move_to_end(username)
+        if len(self.sessions) > self.session_cache_size:
+            self.sessions.popitem(last=False)
+        return user
 
 class UserProfile:
     def __init__(self, credential):
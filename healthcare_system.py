@@ -1,29 +1,293 @@
 # healthcare_system.py
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
+import atexit
 import csv
+import getpass
+import os
+import threading
+import time
 
+from analytics import format_key_statistics
+from columnar_dataset import is_columnar_dataset
+from columnar_hospital import ColumnarHospital
 from credentials_manage import CredentialManager
-from hospital_management import Hospital, PatientRecord, VisitRecord
-from patient_profile import PatientProfile
-from visit_record import VisitRecord, NoteRecord
+from hospital_management import BatchValidationError, Hospital, read_patient_file, read_patient_id_file
+from instrumentation import instrument, timed
+from lazy_hospital import LazyHospital
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import (DEFAULT_CHUNK_SIZE, VisitMerger, gc_paused, make_load_stats, merge_range_patients,
+                            parse_byte_range, parse_visit_day, read_row_chunks, split_byte_ranges)
+from result_cache import DEFAULT_RESULT_CACHE_SIZE, DEFAULT_RESULT_CACHE_TTL, ResultCache
+from snapshot import read_snapshot, read_snapshot_metadata, write_snapshot
+from write_ahead_log import (DEFAULT_COMPACT_BYTES, WriteAheadLog, apply_entry, entry_patient_ids, patient_added,
+                             patient_removed, patients_added, patients_removed)
+
+# Hospital implementations selectable with the backend argument.
+HOSPITAL_BACKENDS = {'objects': Hospital, 'columnar': ColumnarHospital}
+
+def _dataset_filter_metadata(dataset_filter):
+    # The filter as stored with a snapshot, which is only reused by a load with the same filter.
+    if not dataset_filter:
+        return None
+    first_date, last_date = dataset_filter.get('first_date'), dataset_filter.get('last_date')
+    departments = dataset_filter.get('departments')
+    return {'first_date': first_date.isoformat() if first_date is not None else None,
+            'last_date': last_date.isoformat() if last_date is not None else None,
+            'departments': sorted(departments) if departments is not None else None}
 
 class HealthcareSystem:
-    def __init__(self, credentials_file, patient_data_file):
-        self.credentials_manager = CredentialManager(credentials_file)
-        self.hospital = Hospital()
-        self.load_patient_data(patient_data_file)
+    def __init__(self, credentials_file, patient_data_file, load_mode='dict', snapshot_file=None, backend='objects',
+                 log_file=None, compact_bytes=DEFAULT_COMPACT_BYTES, result_cache_size=DEFAULT_RESULT_CACHE_SIZE,
+                 result_cache_ttl=DEFAULT_RESULT_CACHE_TTL, publish_versions=False, credentials_index_file=None,
+                 dataset_filter=None):
+        if load_mode == 'lazy' and (snapshot_file or backend != 'objects'):
+            # A snapshot or the columnar backend holds every record, which is what the lazy mode avoids building.
+            raise ValueError("The lazy load mode reads the objects backend from the patient file, "
+                             "without a snapshot.")
+        self.hospital_class = HOSPITAL_BACKENDS[backend]
+        self.credentials_file = credentials_file
+        self.patient_data_file = patient_data_file
+        self.dataset_filter = dataset_filter
+        self.compact_bytes = compact_bytes
+        self.result_cache_size = result_cache_size
+        self.result_cache_ttl = result_cache_ttl
+        self.write_ahead_log = None
+        self.load_conflicts = []
+        self.duplicate_rows = 0
+        # Serializes writers; readers on other threads use current_version instead.
+        self.write_lock = threading.RLock()
+        self.credentials_manager = CredentialManager(credentials_file, index_file=credentials_index_file)
+        if log_file:
+            self.open_write_ahead_log(log_file, load_mode, snapshot_file)
+        else:
+            self._load_sources(load_mode, snapshot_file)
+        if publish_versions:
+            self.hospital.publish()
+
+    def _load_sources(self, load_mode, snapshot_file):
+        if load_mode == 'lazy':
+            self.hospital = self._new_hospital(LazyHospital)
+            self.load_stats = self.load_patient_data(self.patient_data_file, mode=load_mode,
+                                                     dataset_filter=self.dataset_filter)
+            return
+        filter_metadata = _dataset_filter_metadata(self.dataset_filter)
+        metadata = (read_snapshot_metadata(snapshot_file) or {}) if snapshot_file else {}
+        # Snapshots written before the loaders merged the rows of a visit hold
+        # one visit per row, and those of a filtered dataset only its matches.
+        if (metadata.get('merged_visits') and metadata.get('dataset_filter') == filter_metadata
+                and self.load_snapshot(snapshot_file, self.patient_data_file)):
+            return
+        self.hospital = self._new_hospital(self.hospital_class)
+        self.load_stats = self.load_patient_data(self.patient_data_file, mode=load_mode,
+                                                 dataset_filter=self.dataset_filter)
+        if snapshot_file:
+            metadata = {'merged_visits': True}
+            if filter_metadata is not None:
+                metadata['dataset_filter'] = filter_metadata
+            write_snapshot(snapshot_file, self.hospital, self.patient_data_file, metadata=metadata)
+
+    def _new_hospital(self, hospital_class):
+        hospital = hospital_class()
+        hospital.result_cache = ResultCache(self.result_cache_size, self.result_cache_ttl)
+        return hospital
+
+    def open_write_ahead_log(self, log_file, load_mode='dict', snapshot_file=None):
+        """
+        Load the base the write-ahead log applies to, replay the log and keep it open for mutations.
+
+        The base is the source files (or their snapshot) until the first
+        compaction, and the compacted base file next to the log after it.
+        The lazy mode only reads the source files, so it rejects a compacted
+        log, and its own logs are never compacted.
+
+        Args:
+            log_file (str): Path to the write-ahead log, created if missing.
+            load_mode (str): The load_patient_data mode for the source files.
+            snapshot_file (str): Optional snapshot of the source files.
+
+        Returns:
+            LoadStats: The number of log entries replayed and the replay rate.
+        """
+        write_ahead_log = WriteAheadLog(log_file)
+        base_file = f"{log_file}.base"
+        metadata = read_snapshot_metadata(base_file) or {}
+        base_generation = metadata.get('log_generation', 0)
+        if base_generation == write_ahead_log.generation + 1:
+            # A compaction wrote its base file but stopped before emptying the log.
+            write_ahead_log.reset(base_generation)
+        if write_ahead_log.generation == 0:
+            self._load_sources(load_mode, snapshot_file)
+        elif load_mode == 'lazy':
+            write_ahead_log.close()
+            raise ValueError(f"{log_file} was compacted into {base_file}, which the lazy load mode cannot read.")
+        elif (base_generation != write_ahead_log.generation
+              or not self.load_snapshot(base_file, self.patient_data_file)):
+            raise ValueError(f"{log_file} applies to {base_file} generation {write_ahead_log.generation}, "
+                             f"which is missing or was built from other source files.")
+
+        start_time = time.perf_counter()
+        entries = write_ahead_log.read_entries()
+        with gc_paused(), self.hospital.loading():
+            for entry in entries:
+                apply_entry(self.hospital, entry)
+        self.replay_stats = make_load_stats(len(entries), time.perf_counter() - start_time)
+        self.write_ahead_log = write_ahead_log
+        atexit.register(self.close)
+        return self.replay_stats
+
+    def apply_mutation(self, entry):
+        """
+        Apply a mutation to the hospital and log it to the write-ahead log, if one is open.
+
+        The entry is only logged once it applied, so a mutation that raises is
+        never replayed. Compacts the log once it has grown past compact_bytes,
+        unless the hospital is lazy.
+        Once the hospital has published a version, the mutation publishes the
+        next.
+
+        Args:
+            entry (dict): An entry built by the write_ahead_log entry functions.
+        """
+        with self.write_lock:
+            apply_entry(self.hospital, entry)
+            if self.write_ahead_log is not None:
+                self.write_ahead_log.append(entry)
+            if self.hospital.version is not None:
+                self.hospital.publish(entry_patient_ids(entry))
+            if (self.write_ahead_log is not None and self.write_ahead_log.size >= self.compact_bytes
+                    and not isinstance(self.hospital, LazyHospital)):
+                self.compact_write_ahead_log()
+
+    def current_version(self):
+        """
+        Returns the hospital as last published, for reading from any thread without a lock.
+
+        The version never changes, so a reader iterating it sees one
+        consistent state however many mutations are applied meanwhile. If
+        nothing was published yet, the first version is published under the
+        write lock, and every mutation publishes the next one from then on.
+
+        Returns:
+            HospitalVersion: The current version.
+        """
+        version = self.hospital.version
+        if version is None:
+            with self.write_lock:
+                version = self.hospital.version or self.hospital.publish()
+        return version
+
+    def compact_write_ahead_log(self):
+        """
+        Fold the write-ahead log into a new base file and start an empty log on top of it.
+
+        Raises:
+            ValueError: If the hospital is lazy, as the base file would hold
+                every record and the lazy mode could not load it.
+        """
+        if isinstance(self.hospital, LazyHospital):
+            raise ValueError("The write-ahead log of a lazy hospital cannot be compacted.")
+        write_ahead_log = self.write_ahead_log
+        write_ahead_log.sync()
+        generation = write_ahead_log.generation + 1
+        write_snapshot(f"{write_ahead_log.path}.base", self.hospital, self.patient_data_file,
+                       metadata={'log_generation': generation})
+        write_ahead_log.reset(generation)
+
+    def close(self):
+        """
+        Sync and close the write-ahead log, if one is open.
+        """
+        if self.write_ahead_log is not None:
+            self.write_ahead_log.close()
+
+    def load_snapshot(self, snapshot_file, patient_data_file):
+        """
+        Load the hospital from a binary snapshot instead of the patient CSV.
+
+        Args:
+            snapshot_file (str): Path to the snapshot written by an earlier run.
+            patient_data_file (str): Path to the patient CSV the snapshot must match.
+
+        Returns:
+            bool: True if the snapshot was current and loaded, False if the
+                CSV has to be parsed again.
+        """
+        start_time = time.perf_counter()
+        snapshot = read_snapshot(snapshot_file, patient_data_file, self._new_hospital(self.hospital_class))
+        if snapshot is None:
+            return False
+        self.hospital, rows = snapshot
+        self.load_stats = make_load_stats(rows, time.perf_counter() - start_time)
+        return True
 
    
-    def load_patient_data(self, file_path):
+    def load_patient_data(self, file_path, mode='dict', chunk_size=DEFAULT_CHUNK_SIZE, workers=None,
+                          dataset_filter=None):
         """
         Load patient data from a CSV file into the hospital object.
 
         Args:
             file_path (str): Path to the CSV file containing patient data.
+            mode (str): 'dict' reads rows through csv.DictReader, 'chunked' reads
+                them in chunks by column position with the cached date parser,
+                'parallel' parses byte ranges of the file into merged patients
+                in worker processes and adds them whole,
+                'lazy' only indexes the rows of each patient into a LazyHospital,
+                which parses them when the patient is read.
+            chunk_size (int): Rows per chunk in 'chunked' mode.
+            workers (int): Worker processes in 'parallel' mode, defaults to the CPU count.
+            dataset_filter (dict): first_date, last_date and departments for
+                Hospital.import_dataset, so only the matching visits of a
+                dataset directory and their patients are loaded.
+
+        file_path may also be a dataset directory written by
+        Hospital.export_dataset, which is read column by column whatever the
+        mode and counts one row per note. Only dataset directories can be
+        filtered while loading; a CSV file is always read whole.
+
+        Each row is one note. Every mode attaches the rows of a visit to one
+        visit record keyed by Patient_ID and Visit_ID, and leaves the rows that
+        contradict the first row of their visit in load_conflicts and the
+        number of rows repeating a note in duplicate_rows. The patients loaded
+        are counted and indexed in one batch after the last row, inside
+        Hospital.loading.
+
+        Returns:
+            LoadStats: The number of rows loaded and the load rate.
+
+        Raises:
+            ValueError: If a dataset_filter is given for a CSV file.
         """
+        start_time = time.perf_counter()
+        merger = VisitMerger()
+        dataset = is_columnar_dataset(file_path)
+        if dataset_filter and not dataset:
+            raise ValueError(f"{file_path} is not a dataset directory, so it cannot be filtered while loading.")
+        with self.hospital.loading():
+            if dataset:
+                rows = self.hospital.import_dataset(file_path, **(dataset_filter or {}))
+            elif mode == 'dict':
+                rows = self._load_patient_data_dict(file_path, merger)
+            elif mode == 'chunked':
+                rows = self._load_patient_data_chunked(file_path, chunk_size, merger)
+            elif mode == 'parallel':
+                rows = self._load_patient_data_parallel(file_path, workers or os.cpu_count() or 1, merger)
+            elif mode == 'lazy':
+                rows = self._load_patient_data_lazy(file_path, merger)
+            else:
+                raise ValueError(f"Unknown load mode: {mode}")
+        self.load_conflicts = merger.conflicts
+        self.duplicate_rows = merger.duplicate_rows
+        return make_load_stats(rows, time.perf_counter() - start_time)
+
+    def _load_patient_data_dict(self, file_path, merger):
+        rows = 0
         with open(file_path, 'r') as file:
             reader = csv.DictReader(file)
             for row in reader:
+                rows += 1
                 patient_id = row['Patient_ID']
                 gender = row['Gender']
                 race = row['Race']
@@ -32,10 +296,22 @@ class HealthcareSystem:
                 insurance = row['Insurance']
                 zip_code = row['Zip_code']
                 visit_id = row['Visit_ID']
-                visit_time = datetime.strptime(row['Visit_time'], '%Y-%m-%d')
+                visit_day = datetime.strptime(row['Visit_time'], '%Y-%m-%d').toordinal()
                 department = row['Visit_department']
                 chief_complaint = row['Chief_complaint']
-                visit_record = VisitRecord(visit_id, visit_time, department, chief_complaint)
+                note_id = row['Note_ID']
+                note_type = row['Note_type']
+                note_record = NoteRecord(note_id, note_type)
+
+                # A later row of a visit only adds its note to the visit
+                entry = merger.find(patient_id, visit_id)
+                if entry is not None:
+                    if merger.merge_note(rows - 1, patient_id, visit_id, entry, visit_day, department,
+                                         chief_complaint, note_id):
+                        self.hospital.add_note_record(entry[0], entry[1], note_record)
+                    continue
+                visit_record = VisitRecord(visit_id, visit_day, department, chief_complaint)
+                visit_record.add_note_record(note_record)
 
                 # Check if patient already exists, if not, create a new patient record
                 if patient_id not in self.hospital.patient_records:
@@ -44,12 +320,94 @@ class HealthcareSystem:
                 else:
                     patient_record = self.hospital.patient_records[patient_id]
 
-                # Associate visit record with patient record
-                patient_record.add_visit_record(visit_record)
-                note_id = row['Note_ID']
-                note_type = row['Note_type']
-                note_record = NoteRecord(note_id, note_type)
-                visit_record.add_note_record(note_record)
+                # Associate visit record with patient record so the date index sees it
+                visit_record = self.hospital.add_visit_record(patient_record, visit_record)
+                merger.add_visit(patient_id, visit_id, patient_record, visit_record, visit_day, department,
+                                 chief_complaint, note_id)
+        return rows
+
+    def _load_patient_data_chunked(self, file_path, chunk_size, merger):
+        hospital = self.hospital
+        patient_records = hospital.patient_records
+        find_visit = merger.find
+        rows = 0
+        with open(file_path, 'r', newline='') as file, gc_paused():
+            for chunk in read_row_chunks(file, chunk_size):
+                for row, (patient_id, gender, race, age, ethnicity, insurance, zip_code,
+                          visit_id, visit_time, department, chief_complaint,
+                          note_id, note_type) in enumerate(chunk, rows):
+                    visit_day = parse_visit_day(visit_time)
+                    entry = find_visit(patient_id, visit_id)
+                    if entry is not None:
+                        if merger.merge_note(row, patient_id, visit_id, entry, visit_day, department,
+                                             chief_complaint, note_id):
+                            hospital.add_note_record(entry[0], entry[1], NoteRecord(note_id, note_type))
+                        continue
+                    visit_record = VisitRecord(visit_id, visit_day, department, chief_complaint)
+                    visit_record.add_note_record(NoteRecord(note_id, note_type))
+
+                    patient_record = patient_records.get(patient_id)
+                    if patient_record is None:
+                        patient_record = PatientRecord(patient_id, gender, race, int(age), ethnicity, insurance, zip_code)
+                        hospital.add_patient_record(patient_record)
+                    merger.add_visit(patient_id, visit_id, patient_record,
+                                     hospital.add_visit_record(patient_record, visit_record),
+                                     visit_day, department, chief_complaint, note_id)
+                rows += len(chunk)
+        return rows
+
+    def _load_patient_data_lazy(self, file_path, merger):
+        if not isinstance(self.hospital, LazyHospital):
+            raise ValueError("The 'lazy' load mode needs a LazyHospital.")
+        return self.hospital.index_patient_file(file_path, merger)
+
+    def _load_patient_data_parallel(self, file_path, workers, merger):
+        header, ranges = split_byte_ranges(file_path, workers)
+        hospital = self.hospital
+        patient_records = hospital.patient_records
+        # The collector stays paused while the results are unpickled too, as
+        # they hold a tuple or list per patient, visit and note.
+        with gc_paused():
+            with ProcessPoolExecutor(max_workers=max(1, len(ranges))) as executor:
+                results = list(executor.map(partial(parse_byte_range, file_path, header),
+                                            [start for start, _ in ranges], [end for _, end in ranges]))
+            # merge_range_patients yields the patients in file order, which
+            # keeps patient and visit ordering identical to a sequential load.
+            for (patient_id, gender, race, age, ethnicity, insurance, zip_code,
+                 visits) in merge_range_patients(results, merger):
+                visit_records = [VisitRecord(visit_id, visit_day, department, chief_complaint,
+                                             [NoteRecord(note_id, note_type) for note_id, note_type in notes])
+                                 for visit_id, visit_day, department, chief_complaint, notes in visits]
+                patient_record = patient_records.get(patient_id)
+                if patient_record is None:
+                    hospital.add_patient_record(PatientRecord(patient_id, gender, race, age, ethnicity, insurance,
+                                                              zip_code, visit_records))
+                else:
+                    for visit_record in visit_records:
+                        hospital.add_visit_record(patient_record, visit_record)
+        return sum(result.rows for result in results)
+
+    def authenticate_user(self, username=None, password=None):
+        """
+        Log a user in against the credential store.
+
+        Args:
+            username (str): The username, prompted for when not given.
+            password (str): The password, prompted for when not given.
+
+        Returns:
+            UserProfile: The authenticated user, or None if the given
+                username and password do not match. When prompting, asks
+                again until a login succeeds.
+        """
+        if username is not None and password is not None:
+            return self.credentials_manager.validate_user(username, password)
+        while True:
+            user = self.credentials_manager.validate_user(input("Enter username: ").strip(),
+                                                          getpass.getpass("Enter password: "))
+            if user is not None:
+                return user
+            print("Invalid username or password. Please try again.")
 
     def start_program(self):
         """
@@ -73,8 +431,9 @@ class HealthcareSystem:
         if action == 'count_visits':
             date_str = input("Enter date (YYYY-MM-DD): ")
             try:
-                date = datetime.strptime(date_str, '%Y-%m-%d')
-                total_visits = self.hospital.count_visits_on_date(date)
+                with timed('action.count_visits'):
+                    date = datetime.strptime(date_str, '%Y-%m-%d')
+                    total_visits = self.hospital.count_visits_on_date(date)
                 print("Total visits on", date.strftime('%Y-%m-%d'), ":", total_visits)
             except ValueError:
                 print("Invalid date format.")
@@ -102,19 +461,36 @@ class HealthcareSystem:
         print("You are logged in as a clinician/nurse.")
         print("You can perform all actions.")
         while True:
-            action = input("Enter 'add_patient', 'remove_patient', 'retrieve_patient', 'count_visits', or 'stop': ").strip().lower()
+            action = input("Enter 'add_patient', 'remove_patient', 'add_patients', 'remove_patients', "
+                           "'retrieve_patient', 'count_visits', or 'stop': ").strip().lower()
             if action == 'add_patient':
                 self.add_patient_record()
             elif action == 'remove_patient':
                 self.remove_patient_record()
+            elif action in ('add_patients', 'remove_patients'):
+                file_path = input("Enter the path of the patient file: " if action == 'add_patients'
+                                  else "Enter the path of the file of patient IDs: ")
+                try:
+                    with timed(f'action.{action}'):
+                        if action == 'add_patients':
+                            count = self.add_patient_records(file_path)
+                        else:
+                            count = self.remove_patient_records(file_path)
+                    print(f"{count} patients {'added' if action == 'add_patients' else 'removed'} successfully.")
+                except OSError as error:
+                    print(f"Could not read {file_path}: {error.strerror}.")
+                except BatchValidationError as error:
+                    print(f"Nothing changed. {error}")
             elif action == 'retrieve_patient':
                 patient_id = input("Enter Patient_ID: ")
-                self.hospital.retrieve_patient_record(patient_id)
+                with timed('action.retrieve_patient'):
+                    self.hospital.retrieve_patient_record(patient_id)
             elif action == 'count_visits':
                 date_str = input("Enter date (YYYY-MM-DD): ")
                 try:
-                    date = datetime.strptime(date_str, '%Y-%m-%d')
-                    total_visits = self.hospital.count_visits_on_date(date)
+                    with timed('action.count_visits'):
+                        date = datetime.strptime(date_str, '%Y-%m-%d')
+                        total_visits = self.hospital.count_visits_on_date(date)
                     print("Total visits on", date.strftime('%Y-%m-%d'), ":", total_visits)
                 except ValueError:
                     print("Invalid date format.")
@@ -138,8 +514,9 @@ class HealthcareSystem:
         ethnicity = input("Enter Ethnicity: ")
         insurance = input("Enter Insurance: ")
         zip_code = input("Enter Zip code: ")
-        patient_record = PatientRecord(patient_id, gender, race, age, ethnicity, insurance, zip_code)
-        self.hospital.add_patient_record(patient_record)
+        with timed('action.add_patient'):
+            patient_record = PatientRecord(patient_id, gender, race, age, ethnicity, insurance, zip_code)
+            self.apply_mutation(patient_added(patient_record))
         print("Patient added successfully.")
 
     def remove_patient_record(self):
@@ -148,44 +525,94 @@ class HealthcareSystem:
         """
         patient_id = input("Enter Patient_ID: ")
         if patient_id in self.hospital.patient_records:
-            self.hospital.remove_patient_record(patient_id)
+            with timed('action.remove_patient'):
+                self.apply_mutation(patient_removed(patient_id))
             print("Patient removed successfully.")
         else:
             print("Patient not found.")
 
-    def generate_key_statistics(self):
+    def add_patient_records(self, patient_records):
         """
-        Generate key statistics reports based on patient data.
+        Add a batch of new patients with their visits and notes as one logged mutation.
+
+        The batch is validated before it is logged, so an invalid batch
+        changes neither the hospital nor the write-ahead log.
+
+        Args:
+            patient_records (iterable or str): PatientRecords, or the path of a
+                JSON lines file of patients as the json renderer writes them.
+
+        Returns:
+            int: The number of patients added.
+
+        Raises:
+            BatchValidationError: If any patient in the batch is invalid.
         """
-        print("Generating key statistics reports...")
-        # Initialize dictionaries to store statistics
-        patients_count = {}
-        insurance_count = {}
-        demographics_count = {'age': {}, 'race': {}, 'gender': {}, 'ethnicity': {}}
+        if isinstance(patient_records, str):
+            patient_records = read_patient_file(patient_records)
+        patient_records = list(patient_records)
+        with self.write_lock:
+            self.hospital.validate_new_patients(patient_records)
+            self.apply_mutation(patients_added(patient_records))
+        return len(patient_records)
 
-        # Collect statistics from patient data
-        for patient_record in self.hospital.patient_records.values():
-            # Count total patients
-            patients_count[patient_record.patient_id] = patients_count.get(patient_record.patient_id, 0) + 1
+    def remove_patient_records(self, patient_ids):
+        """
+        Remove a batch of patients as one logged mutation.
+
+        Args:
+            patient_ids (iterable or str): Patient IDs, or the path of a text file with one ID per line.
+
+        Returns:
+            int: The number of patients removed.
+
+        Raises:
+            BatchValidationError: If any ID is unknown or repeated.
+        """
+        if isinstance(patient_ids, str):
+            patient_ids = read_patient_id_file(patient_ids)
+        patient_ids = list(patient_ids)
+        with self.write_lock:
+            self.hospital.validate_removals(patient_ids)
+            self.apply_mutation(patients_removed(patient_ids))
+        return len(patient_ids)
 
-            # Count insurance types
-            insurance_count[patient_record.insurance] = insurance_count.get(patient_record.insurance, 0) + 1
+    def generate_key_statistics(self, report=True, period='year'):
+        """
+        Generate key statistics reports from the aggregates the hospital maintains.
 
-            # Count demographics
-            demographics_count['age'][patient_record.age] = demographics_count['age'].get(patient_record.age, 0) + 1
-            demographics_count['race'][patient_record.race] = demographics_count['race'].get(patient_record.race, 0) + 1
-            demographics_count['gender'][patient_record.gender] = demographics_count['gender'].get(patient_record.gender, 0) + 1
-            demographics_count['ethnicity'][patient_record.ethnicity] = demographics_count['ethnicity'].get(patient_record.ethnicity, 0) + 1
+        The statistics and each period's printed report are kept in the
+        hospital's result cache until the aggregates next change. Once the
+        hospital publishes versions, they are read from the current version,
+        so a report can run on any thread while patients change. Reports are
+        then cached under the version's generation, so readers still holding
+        an older version do not evict the report of the newest one.
 
-        # Print key statistics
-        print("\n1. Temporal trend of the number of patients who visited the hospital with different types of insurances:")
-        for insurance, count in insurance_count.items():
-            print(f"   - Insurance: {insurance}, Number of patients: {count}")
+        Args:
+            report (bool): Whether to print the report.
+            period (str): The trend granularity printed, 'month' or 'year'.
 
-        print("\n2. Temporal trend of the number of patients who visited the hospital in different demographics groups:")
-        for category, data in demographics_count.items():
-            print(f"   - Demographic category: {category}")
-            for group, count in data.items():
-                print(f"     - {group}: {count}")
+        Returns:
+            KeyStatistics: Patient counts per insurance type and demographic
+                group, and their monthly and yearly visit trends.
+        """
+        hospital = self.hospital
+        version = hospital.version
+        if version is not None:
+            statistics = version.key_statistics()
+            generation = version.statistics.generation
+            key = ('key_statistics_report', period, version.generation)
+        else:
+            statistics = hospital.key_statistics()
+            generation = hospital.statistics.generation
+            key = ('key_statistics_report', period)
+        if report:
+            print("Generating key statistics reports...")
+            print(hospital.result_cache.get(key, generation,
+                                            format_key_statistics, statistics, period))
+            print("Key statistics reports generated successfully.")
+        return statistics
 
-        print("Key statistics reports generated successfully.")
\ No newline at end of file
+instrument(HealthcareSystem, ('load_patient_data', 'load_snapshot', 'open_write_ahead_log', 'apply_mutation',
+                              'compact_write_ahead_log', 'generate_key_statistics'), 'system',
+           {'load_patient_data': lambda stats: stats.rows, 'open_write_ahead_log': lambda stats: stats.rows})
\ No newline at end of file
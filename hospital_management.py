@@ -1,66 +1,693 @@
 # hospital_management.py
+import json
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+
+from analytics import STATISTICS_DIMENSIONS, StatisticsAggregates, StatisticsColumns, age_bin
+from columnar_dataset import read_columnar_dataset, write_columnar_dataset
+from hospital_versions import HospitalVersion, ShardedMapping, freeze_patient, publish_statistics
+from instrumentation import instrument
+from patient_loader import gc_paused
+from query_index import QueryResult, VisitIndexes
+from renderers import patient_record_from_dict, write_patient_record
+from result_cache import ResultCache
+
+# Problems listed in the message of a BatchValidationError; all are kept on the error.
+BATCH_PROBLEMS_SHOWN = 5
+# Ages are stored as 32-bit integers by the columnar backend, snapshots and
+# .npy exports, and visit days are date ordinals.
+MAX_AGE = (1 << 31) - 1
+MAX_VISIT_DAY = date.max.toordinal()
+
+class BatchValidationError(ValueError):
+    """
+    A bulk add or remove rejected before anything was changed.
+
+    Attributes:
+        problems (list): A message for every invalid patient, visit or note in the batch.
+    """
+    def __init__(self, problems):
+        self.problems = problems
+        shown = '; '.join(problems[:BATCH_PROBLEMS_SHOWN])
+        more = len(problems) - BATCH_PROBLEMS_SHOWN
+        super().__init__(f"{len(problems)} invalid records in the batch: {shown}"
+                         + (f"; and {more} more" if more > 0 else ''))
+
+def _is_text(value):
+    return isinstance(value, str) and value != ''
+
+def _patient_problems(patient_record):
+    # Everything wrong with one patient, its visits and its notes.
+    problems = []
+    if (not isinstance(patient_record.age, int) or isinstance(patient_record.age, bool)
+            or not 0 <= patient_record.age <= MAX_AGE):
+        problems.append(f"invalid age {patient_record.age!r}")
+    for name in ('gender', 'race', 'ethnicity', 'insurance', 'zip_code'):
+        if not isinstance(getattr(patient_record, name), str):
+            problems.append(f"{name} is not text")
+    visit_ids = set()
+    for visit_record in patient_record.visit_records:
+        visit_id = visit_record.visit_id
+        if not _is_text(visit_id):
+            problems.append(f"invalid visit ID {visit_id!r}")
+        elif visit_id in visit_ids:
+            problems.append(f"visit {visit_id} appears twice")
+        visit_ids.add(visit_id)
+        if (not isinstance(visit_record.visit_day, int) or isinstance(visit_record.visit_day, bool)
+                or not 1 <= visit_record.visit_day <= MAX_VISIT_DAY):
+            problems.append(f"visit {visit_id} has an invalid day {visit_record.visit_day!r}")
+        note_ids = set()
+        for note_record in visit_record.note_records:
+            if not _is_text(note_record.note_id):
+                problems.append(f"visit {visit_id} has an invalid note ID {note_record.note_id!r}")
+            elif note_record.note_id in note_ids:
+                problems.append(f"note {note_record.note_id} appears twice in visit {visit_id}")
+            note_ids.add(note_record.note_id)
+    return problems
+
+def read_patient_file(file_path):
+    """
+    Reads patients from a JSON lines file, one object per line as the json renderer writes them.
+
+    Raises:
+        BatchValidationError: Listing every line that is not a valid patient.
+    """
+    patient_records = []
+    problems = []
+    with open(file_path, 'r') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                patient_records.append(patient_record_from_dict(json.loads(line)))
+            except (KeyError, TypeError, ValueError, AttributeError) as error:
+                problems.append(f"line {line_number}: {type(error).__name__} {error}")
+    if problems:
+        raise BatchValidationError(problems)
+    return patient_records
+
+def read_patient_id_file(file_path):
+    """
+    Reads patient IDs from a text file, one per line.
+    """
+    with open(file_path, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+class VisitDateIndex:
+    """
+    Counts visits per calendar day so date queries never scan the patient records.
+
+    Days are stored as proleptic Gregorian ordinals. A dict answers single-day
+    queries, and a sorted list of the distinct days with lazily rebuilt prefix
+    sums answers date-range queries with a binary search.
+    """
+    def __init__(self):
+        self.day_counts = {}
+        self.days = []
+        self._prefix_sums = None
+
+    def add(self, day, count=1):
+        """
+        Records visits on the given day.
+
+        Args:
+            day (int): The day ordinal of the visit.
+            count (int): The number of visits to record.
+        """
+        if day in self.day_counts:
+            self.day_counts[day] += count
+        else:
+            self.day_counts[day] = count
+            insort(self.days, day)
+        self._prefix_sums = None
+
+    def remove(self, day, count=1):
+        """
+        Forgets visits on the given day.
+
+        Args:
+            day (int): The day ordinal of the visit.
+            count (int): The number of visits to forget.
+        """
+        remaining = self.day_counts[day] - count
+        if remaining > 0:
+            self.day_counts[day] = remaining
+        else:
+            del self.day_counts[day]
+            del self.days[bisect_left(self.days, day)]
+        self._prefix_sums = None
+
+    def add_days(self, day_counts):
+        """
+        Records a batch of visits, sorting the new days in once.
+
+        Args:
+            day_counts (dict): Visits to record per day ordinal.
+        """
+        new_days = []
+        for day, count in day_counts.items():
+            if day in self.day_counts:
+                self.day_counts[day] += count
+            else:
+                self.day_counts[day] = count
+                new_days.append(day)
+        if new_days:
+            self.days.extend(new_days)
+            self.days.sort()
+        self._prefix_sums = None
+
+    def remove_days(self, day_counts):
+        """
+        Forgets a batch of visits, dropping the emptied days in one pass.
+
+        Args:
+            day_counts (dict): Visits to forget per day ordinal.
+        """
+        emptied = set()
+        for day, count in day_counts.items():
+            remaining = self.day_counts[day] - count
+            if remaining > 0:
+                self.day_counts[day] = remaining
+            else:
+                del self.day_counts[day]
+                emptied.add(day)
+        if emptied:
+            self.days[:] = [day for day in self.days if day not in emptied]
+        self._prefix_sums = None
+
+    def count_on(self, day):
+        """
+        Returns the number of visits on a single day.
+
+        Args:
+            day (int): The day ordinal to look up.
+        """
+        return self.day_counts.get(day, 0)
+
+    def count_between(self, first_day, last_day):
+        """
+        Returns the number of visits between two days, both inclusive.
+
+        Args:
+            first_day (int): The first day ordinal of the range.
+            last_day (int): The last day ordinal of the range.
+        """
+        if self._prefix_sums is None:
+            prefix_sums = [0]
+            for day in self.days:
+                prefix_sums.append(prefix_sums[-1] + self.day_counts[day])
+            self._prefix_sums = prefix_sums
+        start = bisect_left(self.days, first_day)
+        end = bisect_right(self.days, last_day)
+        if start >= end:
+            return 0
+        return self._prefix_sums[end] - self._prefix_sums[start]
+
 class Hospital:
     def __init__(self):
         self.patient_records = {}
+        self.visit_date_index = VisitDateIndex()
+        self.statistics = StatisticsAggregates()
+        self.visit_indexes = VisitIndexes(self.visit_date_index)
+        self.result_cache = ResultCache()
+        self.version = None
+        self._visit_entries = {}
+        self._patient_visit_keys = {}
+        self._next_visit_key = 0
+        # IDs of the patients added inside loading(), in the order they were added.
+        self._loading = None
+
+    @staticmethod
+    def _statistics_groups(patient_record):
+        return (patient_record.insurance, age_bin(patient_record.age), patient_record.race,
+                patient_record.gender, patient_record.ethnicity)
+
+    @contextmanager
+    def loading(self):
+        """
+        Defers counting and indexing the patients added until the end of a load.
+
+        Inside the block, patients added, and visits and notes added to them,
+        are only stored. When the block ends they are counted into the date
+        index and the key statistics aggregates and posted to the query
+        indexes in one batch, as add_patient_records does, rather than once
+        per visit and note. A block inside another joins the outer one.
+        """
+        if self._loading is not None:
+            yield
+            return
+        self._loading = {}
+        try:
+            yield
+        finally:
+            patient_ids = self._loading
+            self._loading = None
+            with gc_paused():
+                self._add_stored([self._stored_patient(patient_id) for patient_id in patient_ids])
+            self._reclaim()
+
+    def _deferred(self, patient_id):
+        # Whether a patient was added inside loading() and is not counted or indexed yet.
+        return self._loading is not None and patient_id in self._loading
 
     def add_patient_record(self, patient_record):
+        if patient_record.patient_id in self.patient_records:
+            self.remove_patient_record(patient_record.patient_id)
+        self._add_new([patient_record])
+
+    def add_visit_record(self, patient_record, visit_record):
+        """
+        Adds a visit to a patient already in the hospital.
+
+        Args:
+            patient_record (PatientRecord): The patient, as held by this hospital.
+            visit_record (VisitRecord): The visit to add, with any notes it already has.
+
+        Returns:
+            The visit as held by this hospital, to pass to add_note_record.
+        """
+        visit_day = visit_record.visit_day
+        if self._deferred(patient_record.patient_id):
+            patient_record.add_visit_record(visit_record)
+            self._visit_key(patient_record, visit_record)
+            return visit_record
+        self.statistics.add_visit(self._statistics_groups(patient_record), visit_day, patient_record.patient_id,
+                                  (other.visit_day for other in patient_record.visit_records))
+        patient_record.add_visit_record(visit_record)
+        self.visit_date_index.add(visit_day)
+        self._index_visit(patient_record, visit_record, visit_day)
+        return visit_record
+
+    def add_note_record(self, patient_record, visit_record, note_record):
+        """
+        Adds a note to a visit already in the hospital and indexes its note type.
+
+        Args:
+            patient_record (PatientRecord): The patient the visit belongs to.
+            visit_record (VisitRecord): The visit, as held by this hospital.
+            note_record (NoteRecord): The note to add.
+        """
+        visit_record.add_note_record(note_record)
+        if not self._deferred(patient_record.patient_id):
+            self._index_note(patient_record, visit_record, note_record)
+
+    def _visit_key(self, patient_record, visit_record):
+        # Hands out the key of a new visit; keys follow the order of the patient's visits.
+        key = self._next_visit_key
+        self._next_visit_key += 1
+        self._visit_entries[key] = (patient_record, visit_record)
+        self._patient_visit_keys.setdefault(patient_record.patient_id, []).append(key)
+        return key
+
+    def _index_visit(self, patient_record, visit_record, visit_day):
+        self.visit_indexes.add_visit(self._visit_key(patient_record, visit_record), patient_record, visit_record,
+                                     visit_day)
+
+    def _index_note(self, patient_record, visit_record, note_record):
+        # Notes are mostly added to recent visits, so the search starts from the newest.
+        visit_records = patient_record.visit_records
+        position = next(position for position in range(len(visit_records) - 1, -1, -1)
+                        if visit_records[position] is visit_record)
+        self.visit_indexes.add_note(self._patient_visit_keys[patient_record.patient_id][position], note_record)
+
+    def _store_patient(self, patient_record):
+        # Holds a new patient and hands out its visit keys without touching
+        # the aggregates or indexes, which _add_stored updates per batch.
+        # Returns the patient's groups, its visit days and the index entries of its visits.
         self.patient_records[patient_record.patient_id] = patient_record
+        self._patient_visit_keys[patient_record.patient_id] = []
+        entries = [(self._visit_key(patient_record, visit_record), patient_record, visit_record,
+                    visit_record.visit_day) for visit_record in patient_record.visit_records]
+        return self._statistics_groups(patient_record), [entry[3] for entry in entries], entries
 
-    def remove_patient_record(self, patient_id):
-        del self.patient_records[patient_id]
+    def _stored_patient(self, patient_id):
+        # What _store_patient returns for a patient already stored, with the visits added since.
+        entries = []
+        for key in self._patient_visit_keys.get(patient_id, ()):
+            patient_record, visit_record = self._visit_entries[key]
+            entries.append((key, patient_record, visit_record, visit_record.visit_day))
+        return self._statistics_groups(self.patient_records[patient_id]), [entry[3] for entry in entries], entries
 
-    def retrieve_patient_record(self, patient_id):
-        if patient_id in self.patient_records:
-            patient_record = self.patient_records[patient_id]
-            print(f"Patient ID: {patient_record.patient_id}")
-            print(f"Gender: {patient_record.gender}")
-            print(f"Race: {patient_record.race}")
-            print(f"Age: {patient_record.age}")
-            print(f"Ethnicity: {patient_record.ethnicity}")
-            print(f"Insurance: {patient_record.insurance}")
-            print(f"Zip code: {patient_record.zip_code}")
-            print("Visit records:")
-            for visit_record in patient_record.visit_records:
-                print(f"  Visit ID: {visit_record.visit_id}")
-                print(f"  Visit time: {visit_record.visit_time}")
-                print(f"  Department: {visit_record.department}")
-                print(f"  Chief complaint: {visit_record.chief_complaint}")
-                print("  Note records:")
-                for note_record in visit_record.note_records:
-                    print(f"    Note ID: {note_record.note_id}")
-                    print(f"    Note type: {note_record.note_type}")
+    def _add_new(self, patient_records):
+        # Stores new patients, then counts and indexes them unless a load is in progress.
+        stored = [self._store_patient(patient_record) for patient_record in patient_records]
+        if self._loading is None:
+            self._add_stored(stored)
         else:
-            print("Patient not found.")
+            self._loading.update(dict.fromkeys(patient_record.patient_id for patient_record in patient_records))
+
+    def _add_stored(self, stored):
+        # Counts and indexes patients held by _store_patient, once for the whole batch.
+        statistics_batch = []
+        day_counts = Counter()
+        index_entries = []
+        for groups, visit_days, entries in stored:
+            statistics_batch.append((groups, visit_days))
+            day_counts.update(visit_days)
+            index_entries.extend(entries)
+        self.statistics.add_patients(statistics_batch)
+        self.visit_date_index.add_days(day_counts)
+        self._post_visits(index_entries)
+
+    def _post_visits(self, entries):
+        self.visit_indexes.add_visits(entries)
+
+    def _forget_patient(self, patient_id):
+        # Drops a patient from storage, returning what _stored_patient returned for it.
+        stored = self._stored_patient(patient_id)
+        del self.patient_records[patient_id]
+        for key in self._patient_visit_keys.pop(patient_id, ()):
+            del self._visit_entries[key]
+        return stored
+
+    def _reclaim(self):
+        # Called once removals are complete; backends that keep the rows of
+        # removed patients free them here. Records need nothing.
+        pass
+
+    def remove_patient_record(self, patient_id):
+        if self._deferred(patient_id):
+            del self._loading[patient_id]
+            self._forget_patient(patient_id)
+            return
+        groups, visit_days, entries = self._forget_patient(patient_id)
+        for visit_day in visit_days:
+            self.visit_date_index.remove(visit_day)
+        self.statistics.remove_patient(groups, visit_days, patient_id)
+        for key, patient_record, visit_record, visit_day in entries:
+            self.visit_indexes.remove_visit(key, patient_record, visit_record, visit_day)
+        self._reclaim()
+
+    def validate_new_patients(self, patient_records):
+        """
+        Checks a batch of patients for add_patient_records without changing anything.
+
+        Args:
+            patient_records (list): The PatientRecords to add.
+
+        Raises:
+            BatchValidationError: Listing every problem in the batch, such as
+                patients already in the hospital or repeated in the batch,
+                ages or days that are invalid or beyond what the backends
+                store, and repeated visit or note IDs.
+        """
+        problems = []
+        seen = set()
+        for position, patient_record in enumerate(patient_records):
+            patient_id = patient_record.patient_id
+            label = f"patient {position} ({patient_id!r})"
+            if not _is_text(patient_id):
+                problems.append(f"{label}: invalid patient ID")
+            elif patient_id in seen:
+                problems.append(f"{label}: appears twice in the batch")
+            elif patient_id in self.patient_records:
+                problems.append(f"{label}: already exists")
+            seen.add(patient_id)
+            problems.extend(f"{label}: {problem}" for problem in _patient_problems(patient_record))
+        if problems:
+            raise BatchValidationError(problems)
+
+    def validate_removals(self, patient_ids):
+        """
+        Checks a batch of patient IDs for remove_patient_records without changing anything.
+
+        Raises:
+            BatchValidationError: Listing unknown IDs and IDs repeated in the batch.
+        """
+        problems = []
+        seen = set()
+        for position, patient_id in enumerate(patient_ids):
+            if patient_id in seen:
+                problems.append(f"patient {position} ({patient_id!r}): appears twice in the batch")
+            elif patient_id not in self.patient_records:
+                problems.append(f"patient {position} ({patient_id!r}): not found")
+            seen.add(patient_id)
+        if problems:
+            raise BatchValidationError(problems)
+
+    def add_patient_records(self, patient_records):
+        """
+        Adds a batch of new patients, with their visits and notes, all or nothing.
+
+        The whole batch is validated before anything changes, so either every
+        patient is added or a BatchValidationError leaves the hospital as it
+        was. The date index, the key statistics aggregates and the query
+        indexes are then updated once for the whole batch instead of once
+        per visit.
+
+        Args:
+            patient_records (iterable or str): PatientRecords, or the path of a
+                JSON lines file of patients as the json renderer writes them.
+
+        Returns:
+            int: The number of patients added.
+        """
+        if isinstance(patient_records, str):
+            patient_records = read_patient_file(patient_records)
+        patient_records = list(patient_records)
+        self.validate_new_patients(patient_records)
+        with gc_paused():
+            self._add_new(patient_records)
+        return len(patient_records)
+
+    def remove_patient_records(self, patient_ids):
+        """
+        Removes a batch of patients, all or nothing.
+
+        Every ID is checked before anything changes, then the date index,
+        the key statistics aggregates and the query indexes are updated once
+        for the whole batch.
+
+        Args:
+            patient_ids (iterable or str): Patient IDs, or the path of a text
+                file with one ID per line.
+
+        Returns:
+            int: The number of patients removed.
+        """
+        if isinstance(patient_ids, str):
+            patient_ids = read_patient_id_file(patient_ids)
+        patient_ids = list(patient_ids)
+        self.validate_removals(patient_ids)
+        statistics_batch = []
+        day_counts = Counter()
+        index_entries = []
+        with gc_paused():
+            for patient_id in patient_ids:
+                groups, visit_days, entries = self._forget_patient(patient_id)
+                if self._deferred(patient_id):
+                    del self._loading[patient_id]
+                    continue
+                statistics_batch.append((groups, visit_days, patient_id))
+                day_counts.update(visit_days)
+                index_entries.extend(entries)
+            self.statistics.remove_patients(statistics_batch)
+            self.visit_date_index.remove_days(day_counts)
+            self.visit_indexes.remove_visits(index_entries)
+        self._reclaim()
+        return len(patient_ids)
+
+    def publish(self, patient_ids=None):
+        """
+        Publishes the hospital as it is now as the HospitalVersion readers on other threads use.
+
+        Only the writer calls this, between mutations. Given the patients
+        changed since the last publish, the new version copies only the
+        shards those patients, their visit days and their statistics counters
+        fall in, and shares the rest with the last version. Without them, or
+        for the first version, every record is frozen anew.
+
+        Args:
+            patient_ids (iterable): IDs of every patient added, removed or changed since the last publish.
+
+        Returns:
+            HospitalVersion: The version published, also held in version.
+        """
+        previous = self.version
+        day_counts = self.visit_date_index.day_counts
+        if previous is None or patient_ids is None:
+            with gc_paused():
+                self.version = HospitalVersion(
+                    1 if previous is None else previous.generation + 1,
+                    ShardedMapping.from_items((patient_id, freeze_patient(patient_record))
+                                              for patient_id, patient_record in self.patient_records.items()),
+                    ShardedMapping.from_items(day_counts.items()), publish_statistics(self.statistics))
+            return self.version
+
+        patient_changes = {}
+        visit_days = set()
+        changed_keys = (set(), set(), set())
+        for patient_id in patient_ids:
+            patient_changes[patient_id] = self._frozen_record(patient_id)
+            # Counts change under the keys of the patient as it was and as it is now.
+            for frozen_record in (previous.patient_records.get(patient_id), patient_changes[patient_id]):
+                if frozen_record is None:
+                    continue
+                days = [visit_record.visit_day for visit_record in frozen_record.visit_records]
+                visit_days.update(days)
+                combination, month_keys, year_keys = self.statistics.counter_keys(
+                    self._statistics_groups(frozen_record), days)
+                changed_keys[0].add(combination)
+                changed_keys[1].update(month_keys)
+                changed_keys[2].update(year_keys)
+        self.version = HospitalVersion(
+            previous.generation + 1, previous.patient_records.updated(patient_changes),
+            previous.day_counts.updated({day: day_counts.get(day) for day in visit_days}),
+            publish_statistics(self.statistics, previous.statistics, changed_keys))
+        return self.version
+
+    def _frozen_record(self, patient_id):
+        patient_record = self.patient_records.get(patient_id)
+        return None if patient_record is None else freeze_patient(patient_record)
+
+    def key_statistics(self):
+        """
+        Returns the key statistics from the maintained aggregates, without a rescan.
+
+        The projection is cached until the aggregates next change.
+        """
+        return self.result_cache.get(('key_statistics',), self.statistics.generation,
+                                     self.statistics.to_key_statistics)
+
+    def query(self, department=None, chief_complaint=None, zip_code=None, insurance=None, note_type=None,
+              visit_date=None, start_date=None, end_date=None):
+        """
+        Finds visits matching every given predicate through the secondary indexes.
+
+        Args:
+            department (str): Required visit department.
+            chief_complaint (str): Required chief complaint.
+            zip_code (str): Required zip code of the patient.
+            insurance (str): Required insurance of the patient.
+            note_type (str): Required type of at least one note of the visit.
+            visit_date (datetime): Required visit day.
+            start_date (datetime): First day of a required visit date range.
+            end_date (datetime): Last day of a required visit date range.
+
+        Returns:
+            QueryResult: The matching (patient record, visit record) pairs and
+                the indexes used, in the order they were applied.
+        """
+        predicates = {
+            'department': department,
+            'chief_complaint': chief_complaint,
+            'zip_code': zip_code,
+            'insurance': insurance,
+            'note_type': note_type,
+            'visit_date': visit_date.toordinal() if visit_date is not None else None,
+        }
+        predicates = {field: value for field, value in predicates.items() if value is not None}
+        first_day = start_date.toordinal() if start_date is not None else None
+        last_day = end_date.toordinal() if end_date is not None else None
+        if not predicates and first_day is None and last_day is None:
+            return QueryResult(self._all_visit_entries(), [])
+        keys, indexes_used = self.visit_indexes.search(predicates, first_day, last_day, self._visit_day)
+        return QueryResult([self._visit_entry(key) for key in keys], indexes_used)
+
+    def _visit_entry(self, key):
+        return self._visit_entries[key]
+
+    def _visit_day(self, key):
+        return self._visit_entries[key][1].visit_day
+
+    def _all_visit_entries(self):
+        return list(self._visit_entries.values())
+
+    def get_patient_record(self, patient_id):
+        """
+        Returns the record of a patient, or None if the patient is unknown.
+        """
+        return self.patient_records.get(patient_id)
+
+    def retrieve_patient_record(self, patient_id, renderer='text', file=None, stream=None):
+        """
+        Writes a patient's record, visits and notes with one of the RENDERERS.
+
+        Args:
+            patient_id (str): The ID of the patient.
+            renderer (str): 'text', 'json' or 'csv'.
+            file (file): The text stream to write to, defaults to stdout.
+            stream (bool): Whether to write in batches rather than one string,
+                by default only for very long visit histories.
+
+        Returns:
+            bool: Whether the patient was found.
+        """
+        return write_patient_record(self.get_patient_record(patient_id), renderer, file, stream)
+
+    def export_dataset(self, directory, metadata=None):
+        """
+        Writes the patients, visits and notes as .npy columns partitioned by visit year.
+
+        See write_columnar_dataset for the layout, which numpy.load and the
+        standard library both read.
+
+        Args:
+            directory (str): Path of the dataset directory, replaced if it exists.
+            metadata (dict): JSON-serializable values stored in the manifest.
+
+        Returns:
+            dict: The manifest written.
+        """
+        return write_columnar_dataset(directory, self, metadata)
+
+    def import_dataset(self, directory, first_date=None, last_date=None, departments=None):
+        """
+        Adds the records of a dataset written by export_dataset, optionally only the matching visits.
+
+        Args:
+            directory (str): Path of the dataset directory.
+            first_date (date): Earliest visit date to load, inclusive.
+            last_date (date): Latest visit date to load, inclusive.
+            departments (iterable): Departments whose visits are loaded.
+
+        Returns:
+            int: The number of notes loaded.
+
+        Raises:
+            ValueError: If a patient in the dataset is repeated or already in the hospital.
+        """
+        return read_columnar_dataset(directory, self, first_date, last_date, departments)
 
     def count_visits_on_date(self, date):
-        total_visits = 0
-        for patient_record in self.patient_records.values():
+        return self.visit_date_index.count_on(date.toordinal())
+
+    def count_visits_between(self, start_date, end_date):
+        return self.visit_date_index.count_between(start_date.toordinal(), end_date.toordinal())
+
+    def statistics_columns(self):
+        """
+        Collects the patient attributes and visit days the key statistics group by.
+
+        Returns:
+            StatisticsColumns: One value per patient for each dimension, with
+                ages already binned, and the patient position and day ordinal
+                of every visit.
+        """
+        insurances, ages, races, genders, ethnicities = [], [], [], [], []
+        visit_patients = []
+        visit_days = []
+        for position, patient_record in enumerate(self.patient_records.values()):
+            insurances.append(patient_record.insurance)
+            ages.append(age_bin(patient_record.age))
+            races.append(patient_record.race)
+            genders.append(patient_record.gender)
+            ethnicities.append(patient_record.ethnicity)
             for visit_record in patient_record.visit_records:
-                if visit_record.visit_time.date() == date.date():
-                    total_visits += 1
-        return total_visits
-
-class PatientRecord:
-    def __init__(self, patient_id, gender, race, age, ethnicity, insurance, zip_code):
-        self.patient_id = patient_id
-        self.gender = gender
-        self.race = race
-        self.age = age
-        self.ethnicity = ethnicity
-        self.insurance = insurance
-        self.zip_code = zip_code
-        self.visit_records = []
-
-    def add_visit_record(self, visit_record):
-        self.visit_records.append(visit_record)
-
-class VisitRecord:
-    def __init__(self, visit_id, visit_time, department, chief_complaint):
-        self.visit_id = visit_id
-        self.visit_time = visit_time
-        self.department = department
-        self.chief_complaint = chief_complaint
-        self.note_records = []
-
-    def add_note_record(self, note_record):
-        self.note_records.append(note_record)
\ No newline at end of file
+                visit_patients.append(position)
+                visit_days.append(visit_record.visit_day)
+        patient_groups = dict(zip(STATISTICS_DIMENSIONS, (insurances, ages, races, genders, ethnicities)))
+        return StatisticsColumns(patient_groups, {}, visit_patients, visit_days, None)
+
+# Hospital methods timed while instrumentation is enabled, shared by the backends.
+HOSPITAL_METHODS = ('add_patient_record', 'add_visit_record', 'add_note_record', 'remove_patient_record',
+                    'get_patient_record', 'retrieve_patient_record', 'count_visits_on_date', 'count_visits_between',
+                    'key_statistics', 'query', 'statistics_columns', 'export_dataset', 'import_dataset',
+                    'add_patient_records', 'remove_patient_records', 'publish')
+HOSPITAL_METHOD_ROWS = {'query': lambda result: len(result.matches), 'import_dataset': lambda notes: notes,
+                        'add_patient_records': lambda patients: patients,
+                        'remove_patient_records': lambda patients: patients}
+
+instrument(Hospital, HOSPITAL_METHODS, 'hospital', HOSPITAL_METHOD_ROWS)
\ No newline at end of file
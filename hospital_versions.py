@@ -0,0 +1,198 @@
+# hospital_versions.py
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from collections.abc import Mapping
+from itertools import chain
+
+from analytics import project_key_statistics
+from models import NoteRecord, PatientRecord, VisitRecord
+from renderers import write_patient_record
+
+# A prime, so packed integer keys that differ only in their high bits, like
+# the statistics counter keys, still spread over every shard.
+DEFAULT_SHARDS = 251
+
+# The counters of a StatisticsAggregates as published, under the names
+# project_key_statistics reads; the counters are ShardedMappings.
+StatisticsVersion = namedtuple('StatisticsVersion', [
+    'generation', 'total_patients', 'total_visits', 'combination_groups',
+    'combination_patients', 'month_visits', 'month_patients', 'year_patients',
+])
+
+class ShardedMapping(Mapping):
+    """
+    Read-only mapping spread over dict shards by key hash, updated by copying only the shards a change touches.
+
+    A ShardedMapping never changes once built. updated returns a new one
+    that shares every untouched shard with the old, so readers of the old
+    one keep a consistent view while the writer pays for a few small dict
+    copies instead of a copy of the whole mapping.
+    """
+    __slots__ = ('_shards', '_length')
+
+    def __init__(self, shards):
+        self._shards = shards
+        self._length = sum(map(len, shards))
+
+    @classmethod
+    def from_items(cls, items, shard_count=DEFAULT_SHARDS):
+        """
+        Builds a ShardedMapping from (key, value) pairs.
+        """
+        shards = tuple({} for _ in range(shard_count))
+        for key, value in items:
+            shards[hash(key) % shard_count][key] = value
+        return cls(shards)
+
+    def updated(self, changes):
+        """
+        Returns a copy with some keys changed, sharing the shards none of them fall in.
+
+        Args:
+            changes (dict): The new value of every changed key, None for keys to remove.
+        """
+        shards = list(self._shards)
+        shard_count = len(shards)
+        copied = set()
+        for key, value in changes.items():
+            index = hash(key) % shard_count
+            if index not in copied:
+                shards[index] = dict(shards[index])
+                copied.add(index)
+            if value is None:
+                shards[index].pop(key, None)
+            else:
+                shards[index][key] = value
+        return ShardedMapping(tuple(shards))
+
+    def __getitem__(self, key):
+        return self._shards[hash(key) % len(self._shards)][key]
+
+    def get(self, key, default=None):
+        return self._shards[hash(key) % len(self._shards)].get(key, default)
+
+    def __contains__(self, key):
+        return key in self._shards[hash(key) % len(self._shards)]
+
+    def __iter__(self):
+        return chain.from_iterable(self._shards)
+
+    def __len__(self):
+        return self._length
+
+    # Iterate the shards directly rather than looking every key up again.
+    def items(self):
+        return chain.from_iterable(shard.items() for shard in self._shards)
+
+    def values(self):
+        return chain.from_iterable(shard.values() for shard in self._shards)
+
+def freeze_patient(patient_record):
+    """
+    Copies a patient record of any backend into a PatientRecord whose visits and notes are tuples.
+
+    NoteRecords are shared rather than copied, as nothing changes a note once built.
+
+    Args:
+        patient_record: The patient, as held by a hospital.
+    """
+    return PatientRecord(
+        patient_record.patient_id, patient_record.gender, patient_record.race, patient_record.age,
+        patient_record.ethnicity, patient_record.insurance, patient_record.zip_code,
+        tuple(VisitRecord(visit_record.visit_id, visit_record.visit_day, visit_record.department,
+                          visit_record.chief_complaint,
+                          tuple(note_record if type(note_record) is NoteRecord
+                                else NoteRecord(note_record.note_id, note_record.note_type)
+                                for note_record in visit_record.note_records))
+              for visit_record in patient_record.visit_records))
+
+def publish_statistics(statistics, previous=None, changed_keys=None):
+    """
+    Builds the StatisticsVersion of a StatisticsAggregates.
+
+    Args:
+        statistics (StatisticsAggregates): The aggregates, not changed while this runs.
+        previous (StatisticsVersion): The version last published; None copies every counter.
+        changed_keys (tuple): The combination, month and year keys that may
+            have changed since previous, as StatisticsAggregates.counter_keys returns them.
+    """
+    counters = (statistics.combination_patients, statistics.month_visits, statistics.month_patients,
+                statistics.year_patients)
+    combination_groups = statistics.combination_groups
+    if previous is None:
+        mappings = [ShardedMapping.from_items(counter.items()) for counter in counters]
+        combination_groups = tuple(combination_groups)
+    else:
+        combination_keys, month_keys, year_keys = changed_keys
+        mappings = [mapping.updated({key: counter.get(key) for key in keys}) for mapping, counter, keys in zip(
+            previous[4:], counters, (combination_keys, month_keys, month_keys, year_keys))]
+        # Combinations are only ever appended, so an unchanged length means unchanged groups.
+        if len(previous.combination_groups) == len(combination_groups):
+            combination_groups = previous.combination_groups
+        else:
+            combination_groups = tuple(combination_groups)
+    return StatisticsVersion(statistics.generation, statistics.total_patients, statistics.total_visits,
+                             combination_groups, *mappings)
+
+class HospitalVersion:
+    """
+    The records, visit counts and key statistics of a hospital as of one publish, readable from any thread.
+
+    Records are frozen copies, and the patients, the visits per day and the
+    statistics counters are ShardedMappings, so publishing the next version
+    changes nothing a reader of this one can see and readers take no lock.
+    Results derived on first use are kept on the version; readers racing
+    to derive one compute the same value.
+    """
+    __slots__ = ('generation', 'patient_records', 'day_counts', 'statistics', '_key_statistics', '_day_sums')
+
+    def __init__(self, generation, patient_records, day_counts, statistics):
+        self.generation = generation
+        self.patient_records = patient_records
+        self.day_counts = day_counts
+        self.statistics = statistics
+        self._key_statistics = None
+        self._day_sums = None
+
+    def get_patient_record(self, patient_id):
+        """
+        Returns the frozen record of a patient, or None if the patient is unknown.
+        """
+        return self.patient_records.get(patient_id)
+
+    def retrieve_patient_record(self, patient_id, renderer='text', file=None, stream=None):
+        """
+        Writes a patient's record, visits and notes, as Hospital.retrieve_patient_record does.
+
+        Returns:
+            bool: Whether the patient was found.
+        """
+        return write_patient_record(self.patient_records.get(patient_id), renderer, file, stream)
+
+    def count_visits_on_date(self, date):
+        return self.day_counts.get(date.toordinal(), 0)
+
+    def count_visits_between(self, start_date, end_date):
+        day_sums = self._day_sums
+        if day_sums is None:
+            days = []
+            prefix_sums = [0]
+            for day, count in sorted(self.day_counts.items()):
+                days.append(day)
+                prefix_sums.append(prefix_sums[-1] + count)
+            day_sums = self._day_sums = (days, prefix_sums)
+        days, prefix_sums = day_sums
+        start = bisect_left(days, start_date.toordinal())
+        end = bisect_right(days, end_date.toordinal())
+        if start >= end:
+            return 0
+        return prefix_sums[end] - prefix_sums[start]
+
+    def key_statistics(self):
+        """
+        Returns the key statistics of this version, projected on first use.
+        """
+        key_statistics = self._key_statistics
+        if key_statistics is None:
+            key_statistics = self._key_statistics = project_key_statistics(self.statistics)
+        return key_statistics
\ No newline at end of file
@@ -0,0 +1,380 @@
+# instrumentation.py
+import atexit
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+
+# Upper bounds of the latency histogram buckets in seconds, 1-2.5-5 per decade.
+LATENCY_BUCKETS = tuple(float(f"{mantissa}e{exponent}") for exponent in range(-6, 2) for mantissa in (1, 2.5, 5))
+DEFAULT_EXPORT_INTERVAL = 10.0
+DEFAULT_SAMPLE_INTERVAL = 0.001
+# Profile files with these extensions get sampled stacks in the folded
+# format flamegraph.pl and speedscope read; others get cProfile statistics.
+FOLDED_EXTENSIONS = ('.folded', '.collapsed')
+PROMETHEUS_EXTENSIONS = ('.prom', '.txt')
+
+class Histogram:
+    """
+    Counts observations into fixed buckets, as a Prometheus histogram does.
+    """
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'buckets': dict(zip([*map(str, self.bounds), '+Inf'], self.counts)),
+                'sum': self.total, 'count': self.count}
+
+class Metrics:
+    """
+    Call counts, failures, latency histograms and rows processed per instrumented operation.
+
+    Result cache lookups are counted per cache and outcome alongside.
+    Observations take a lock, so exporting from another thread sees a
+    consistent view.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.calls = Counter()
+        self.failures = Counter()
+        self.rows = Counter()
+        self.latency = {}
+        self.cache_events = Counter()
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds, rows=None, failed=False):
+        """
+        Records one call of an operation.
+
+        Args:
+            name (str): The operation name.
+            seconds (float): How long the call took.
+            rows (int): Rows the call processed, if it reports any.
+            failed (bool): Whether the call raised.
+        """
+        with self.lock:
+            self.calls[name] += 1
+            if failed:
+                self.failures[name] += 1
+            if rows is not None:
+                self.rows[name] += rows
+            histogram = self.latency.get(name)
+            if histogram is None:
+                histogram = self.latency[name] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_cache(self, cache, event):
+        """
+        Records one result cache event.
+
+        Args:
+            cache (str): The cached query name.
+            event (str): 'hits', 'misses', 'stale', 'expired' or 'evicted'.
+        """
+        with self.lock:
+            self.cache_events[cache, event] += 1
+
+    def timed(self, name):
+        """
+        Returns a context manager that records the enclosed block as one call of an operation.
+        """
+        return _TimedBlock(self, name)
+
+    def to_dict(self):
+        """
+        Returns the metrics as a JSON-ready dict, one entry per operation.
+        """
+        with self.lock:
+            operations = {name: {'calls': self.calls[name], 'failures': self.failures[name],
+                                 'rows': self.rows.get(name), 'latency_seconds': histogram.to_dict()}
+                          for name, histogram in sorted(self.latency.items())}
+            caches = {}
+            for (cache, event), count in sorted(self.cache_events.items()):
+                caches.setdefault(cache, {})[event] = count
+        for events in caches.values():
+            lookups = events.get('hits', 0) + events.get('misses', 0)
+            events['hit_ratio'] = events.get('hits', 0) / lookups if lookups else None
+        return {'started': self.started, 'exported': time.time(), 'operations': operations, 'caches': caches}
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            names = sorted(self.latency)
+            lines = ['# HELP hospital_calls_total Calls of an instrumented operation.',
+                     '# TYPE hospital_calls_total counter']
+            lines += [f'hospital_calls_total{{operation="{name}"}} {self.calls[name]}' for name in names]
+            lines += ['# HELP hospital_failures_total Calls of an instrumented operation that raised.',
+                      '# TYPE hospital_failures_total counter']
+            lines += [f'hospital_failures_total{{operation="{name}"}} {self.failures[name]}' for name in names]
+            lines += ['# HELP hospital_rows_total Rows processed by an instrumented operation.',
+                      '# TYPE hospital_rows_total counter']
+            lines += [f'hospital_rows_total{{operation="{name}"}} {self.rows[name]}' for name in names
+                      if name in self.rows]
+            lines += ['# HELP hospital_latency_seconds Latency of an instrumented operation.',
+                      '# TYPE hospital_latency_seconds histogram']
+            for name in names:
+                histogram = self.latency[name]
+                cumulative = 0
+                for bound, count in zip([*map(repr, histogram.bounds), '+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'hospital_latency_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'hospital_latency_seconds_sum{{operation="{name}"}} {histogram.total}')
+                lines.append(f'hospital_latency_seconds_count{{operation="{name}"}} {histogram.count}')
+            lines += ['# HELP hospital_cache_events_total Result cache lookups and evictions by outcome.',
+                      '# TYPE hospital_cache_events_total counter']
+            lines += [f'hospital_cache_events_total{{cache="{cache}",event="{event}"}} {count}'
+                      for (cache, event), count in sorted(self.cache_events.items())]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_path):
+        """
+        Writes the metrics to a file, as Prometheus text for .prom and .txt files and as JSON otherwise.
+
+        The file is written next to its final path and renamed into place,
+        so a scraper never reads a partial export.
+        """
+        if file_path.endswith(PROMETHEUS_EXTENSIONS):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2) + '\n'
+        temp_file = f"{file_path}.tmp"
+        with open(temp_file, 'w') as file:
+            file.write(content)
+        os.replace(temp_file, file_path)
+
+class _TimedBlock:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, failed=exc_type is not None)
+        return False
+
+# (owner, attribute, operation name, rows function) of every instrumentable method.
+_INSTRUMENTED_METHODS = []
+# (owner, attribute, original function) of the wrappers currently installed.
+_INSTALLED = []
+_active_metrics = None
+
+def instrument(owner, names, prefix, rows=None):
+    """
+    Registers methods of a class to be timed while instrumentation is enabled.
+
+    Nothing is wrapped until enable is called, so registered methods cost
+    nothing extra while instrumentation is off. Only methods the class
+    defines itself are registered, so an inherited method is timed once.
+
+    Args:
+        owner (type): The class defining the methods.
+        names (iterable): The method names.
+        prefix (str): Prefix of the operation names, as in 'hospital.query'.
+        rows (dict): Functions by method name giving the rows a call processed from its result.
+    """
+    rows = rows or {}
+    for name in names:
+        if name in owner.__dict__:
+            _INSTRUMENTED_METHODS.append((owner, name, f"{prefix}.{name}", rows.get(name)))
+
+def _timed_method(function, name, metrics, rows):
+    observe = metrics.observe
+    perf_counter = time.perf_counter
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start_time = perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            observe(name, perf_counter() - start_time, failed=True)
+            raise
+        observe(name, perf_counter() - start_time, rows(result) if rows is not None else None)
+        return result
+    return wrapper
+
+def enable(metrics=None):
+    """
+    Starts recording every registered method into a metrics object.
+
+    Args:
+        metrics (Metrics): Where to record, a new Metrics by default.
+
+    Returns:
+        Metrics: The metrics being recorded into.
+    """
+    global _active_metrics
+    disable()
+    _active_metrics = metrics or Metrics()
+    for owner, attribute, name, rows in _INSTRUMENTED_METHODS:
+        function = owner.__dict__[attribute]
+        setattr(owner, attribute, _timed_method(function, name, _active_metrics, rows))
+        _INSTALLED.append((owner, attribute, function))
+    return _active_metrics
+
+def disable():
+    """
+    Stops recording and puts the original methods back.
+    """
+    global _active_metrics
+    while _INSTALLED:
+        owner, attribute, function = _INSTALLED.pop()
+        setattr(owner, attribute, function)
+    _active_metrics = None
+
+def active_metrics():
+    """
+    Returns the metrics being recorded into, or None when instrumentation is off.
+    """
+    return _active_metrics
+
+def timed(name):
+    """
+    Returns a context manager recording the enclosed block as one call of an operation.
+
+    While instrumentation is off this is a shared no-op context manager.
+    """
+    return _NO_OP if _active_metrics is None else _active_metrics.timed(name)
+
+_NO_OP = nullcontext()
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval from a background thread.
+
+    The counts are written in the folded format, one semicolon-separated
+    stack and its sample count per line, which flamegraph.pl and speedscope
+    turn into a flame graph. Samples are wall-clock, so time spent waiting
+    for input shows up too.
+    """
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.counts[';'.join(stack)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def write(self, file_path):
+        with open(file_path, 'w') as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+class _PeriodicExporter:
+    def __init__(self, metrics, file_path, interval):
+        self.metrics = metrics
+        self.file_path = file_path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-exporter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.metrics.write(self.file_path)
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.metrics.write(self.file_path)
+
+class InstrumentationSession:
+    """
+    The instrumentation of one program run: metrics exported to a file and an optional profile.
+
+    Metrics are written every interval seconds and once more when the
+    session stops, which start_session arranges to happen at exit.
+
+    Args:
+        metrics_file (str): Where to export metrics; None leaves instrumentation off.
+        metrics_interval (float): Seconds between exports.
+        profile_file (str): Where to write a profile of the calling thread, as
+            folded stacks for .folded and .collapsed files and as cProfile
+            statistics, readable with pstats or snakeviz, otherwise.
+    """
+    def __init__(self, metrics_file=None, metrics_interval=DEFAULT_EXPORT_INTERVAL, profile_file=None):
+        self.metrics = None
+        self.exporter = None
+        self.profiler = None
+        self.sampler = None
+        self.profile_file = profile_file
+        if metrics_file:
+            self.metrics = enable()
+            self.exporter = _PeriodicExporter(self.metrics, metrics_file, metrics_interval)
+        if profile_file and profile_file.endswith(FOLDED_EXTENSIONS):
+            self.sampler = StackSampler()
+            self.sampler.start()
+        elif profile_file:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        """
+        Writes the final metrics and the profile and turns instrumentation off.
+        """
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_file)
+            self.profiler = None
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.write(self.profile_file)
+            self.sampler = None
+        if self.exporter is not None:
+            self.exporter.stop()
+            self.exporter = None
+            disable()
+
+def start_session(metrics_file=None, metrics_interval=DEFAULT_EXPORT_INTERVAL, profile_file=None):
+    """
+    Starts an InstrumentationSession that stops itself when the program exits.
+
+    Returns:
+        InstrumentationSession: The session, or None if neither a metrics nor a profile file is given.
+    """
+    if not metrics_file and not profile_file:
+        return None
+    session = InstrumentationSession(metrics_file, metrics_interval, profile_file)
+    atexit.register(session.stop)
+    return session
\ No newline at end of file
@@ -0,0 +1,420 @@
+# lazy_hospital.py
+import csv
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from operator import itemgetter
+
+from analytics import STATISTICS_DIMENSIONS, StatisticsColumns, age_bin
+from hospital_management import HOSPITAL_METHOD_ROWS, HOSPITAL_METHODS, Hospital
+from instrumentation import instrument
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import PATIENT_COLUMNS, VisitMerger, gc_paused, parse_visit_day
+
+DEFAULT_HYDRATED_PATIENTS = 1024
+# Bytes read per pread when fetching a row; longer rows take more reads.
+_ROW_READ_SIZE = 512
+
+def _split_row(line):
+    # Rows without quotes are split directly; csv handles the rest.
+    text = line.decode('utf-8').rstrip('\r\n')
+    if '"' in text:
+        return next(csv.reader([text]))
+    return text.split(',')
+
+class _LazyPatientRecords(Mapping):
+    """
+    Read-only mapping from patient ID to PatientRecord, hydrating file-backed patients on access.
+    """
+    def __init__(self, hospital):
+        self._hospital = hospital
+
+    def __getitem__(self, patient_id):
+        patient_record = self._hospital.get_patient_record(patient_id)
+        if patient_record is None:
+            raise KeyError(patient_id)
+        return patient_record
+
+    def get(self, patient_id, default=None):
+        patient_record = self._hospital.get_patient_record(patient_id)
+        return default if patient_record is None else patient_record
+
+    def __contains__(self, patient_id):
+        return patient_id in self._hospital._file_patients or patient_id in self._hospital.resident_records
+
+    def __iter__(self):
+        yield from self._hospital._file_patients
+        yield from self._hospital.resident_records
+
+    def __len__(self):
+        return len(self._hospital._file_patients) + len(self._hospital.resident_records)
+
+class LazyHospital(Hospital):
+    """
+    Hospital that keeps only row offsets and aggregates in memory and parses patients from the file on demand.
+
+    index_patient_file makes one pass over the patient CSV, recording the
+    byte offset, visit day and patient of the first row of every visit in
+    typed arrays, with each patient's visits chained newest first, then
+    fills the visit date index and the key statistics aggregates. Later
+    rows of a visit only chain their offsets to it as notes. No record
+    objects are built. A patient's records are parsed from its rows when
+    first read and kept in a bounded LRU of hydrated patients, guarded by a
+    lock so readers on several threads can share it.
+
+    Patients added afterwards, and file-backed patients as soon as a visit
+    or note is added to them, become resident records held in memory like
+    those of Hospital. The query indexes are built by a second pass on the
+    first query and maintained from then on.
+
+    Args:
+        hydrated_patients (int): How many file-backed patients to keep parsed.
+    """
+    def __init__(self, hydrated_patients=DEFAULT_HYDRATED_PATIENTS):
+        super().__init__()
+        self.hydrated_patients = hydrated_patients
+        self.patient_data_file = None
+        self.resident_records = {}
+        self.patient_records = _LazyPatientRecords(self)
+        self._hydrated = OrderedDict()
+        self._hydrated_lock = threading.Lock()
+        self._fd = None
+        self._project = None
+        self._indexes_built = False
+
+        self._file_patients = {}
+        self._patient_ids = []
+        self._patient_last_rows = array('i')
+        self._patient_combinations = array('i')
+
+        # One entry per visit, keyed by the visit's first row in the file.
+        self._row_offsets = array('q')
+        self._row_days = array('i')
+        self._row_patients = array('i')
+        self._row_previous = array('i')
+        self._row_notes = array('i')
+        # The later rows of each visit, chained in file order.
+        self._note_offsets = array('q')
+        self._note_next = array('i')
+
+    def index_patient_file(self, file_path, merger=None):
+        """
+        Indexes the rows of a patient CSV file without parsing visits or notes into records.
+
+        Args:
+            file_path (str): Path to the CSV file containing patient data.
+            merger (VisitMerger): Attaches the rows of a visit to its first row
+                and collects conflicting rows, a new one by default.
+
+        Returns:
+            int: The number of rows indexed.
+        """
+        if self.patient_data_file is not None:
+            raise ValueError(f"{self.patient_data_file} is already indexed.")
+        file_patients = self._file_patients
+        patient_ids = self._patient_ids
+        patient_last_rows = self._patient_last_rows
+        patient_combinations = self._patient_combinations
+        row_offsets = self._row_offsets
+        row_days = self._row_days
+        row_patients = self._row_patients
+        row_previous = self._row_previous
+        row_notes = self._row_notes
+        note_offsets = self._note_offsets
+        note_next = self._note_next
+        # The last note row chained to each visit with several rows.
+        note_tails = {}
+        merger = merger if merger is not None else VisitMerger()
+        find_visit = merger.find
+        # Groups of every patient in the file; the aggregates and the date
+        # index are updated once, after the last row.
+        patient_groups = []
+        day_counts = Counter()
+
+        with open(file_path, 'rb') as file, gc_paused():
+            header_line = file.readline()
+            header = _split_row(header_line)
+            self._project = itemgetter(*[header.index(column) for column in PATIENT_COLUMNS])
+            patient_id_column = header.index('Patient_ID')
+            visit_id_column = header.index('Visit_ID')
+            visit_time_column = header.index('Visit_time')
+            department_column = header.index('Visit_department')
+            chief_complaint_column = header.index('Chief_complaint')
+            note_id_column = header.index('Note_ID')
+            offset = len(header_line)
+            rows = 0
+            for line in file:
+                fields = line.decode('utf-8').rstrip('\r\n').split(',') if b'"' not in line else _split_row(line)
+                patient_id = fields[patient_id_column]
+                visit_id = fields[visit_id_column]
+                visit_day = parse_visit_day(fields[visit_time_column])
+                entry = find_visit(patient_id, visit_id)
+                if entry is not None:
+                    if merger.merge_note(rows, patient_id, visit_id, entry, visit_day, fields[department_column],
+                                         fields[chief_complaint_column], fields[note_id_column]):
+                        visit_row = entry[1]
+                        note = len(note_offsets)
+                        note_offsets.append(offset)
+                        note_next.append(-1)
+                        tail = note_tails.get(visit_row)
+                        if tail is None:
+                            row_notes[visit_row] = note
+                        else:
+                            note_next[tail] = note
+                        note_tails[visit_row] = note
+                    rows += 1
+                    offset += len(line)
+                    continue
+                row = len(row_offsets)
+                number = file_patients.get(patient_id)
+                if number is None:
+                    (patient_id, gender, race, age, ethnicity, insurance, zip_code) = self._project(fields)[:7]
+                    number = file_patients[patient_id] = len(patient_ids)
+                    patient_ids.append(patient_id)
+                    patient_last_rows.append(-1)
+                    patient_groups.append((insurance, age_bin(int(age)), race, gender, ethnicity))
+                day_counts[visit_day] += 1
+                row_offsets.append(offset)
+                row_days.append(visit_day)
+                row_patients.append(number)
+                row_previous.append(patient_last_rows[number])
+                row_notes.append(-1)
+                patient_last_rows[number] = row
+                merger.add_visit(patient_id, visit_id, number, row, visit_day, fields[department_column],
+                                 fields[chief_complaint_column], fields[note_id_column])
+                rows += 1
+                offset += len(line)
+            self.statistics.add_patients([(groups, [row_days[row] for row in self._patient_rows(number)])
+                                          for number, groups in enumerate(patient_groups)])
+            combinations = self.statistics.combinations
+            patient_combinations.extend(combinations[groups] for groups in patient_groups)
+            self.visit_date_index.add_days(day_counts)
+        self.patient_data_file = file_path
+        self._fd = os.open(file_path, os.O_RDONLY)
+        # Visits added later get keys after the file rows.
+        self._next_visit_key = len(row_offsets)
+        return rows
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _patient_rows(self, number):
+        rows = []
+        row = self._patient_last_rows[number]
+        while row >= 0:
+            rows.append(row)
+            row = self._row_previous[row]
+        return rows
+
+    def _read_line(self, offset):
+        # pread keeps concurrent readers from racing on a shared file position.
+        data = chunk = os.pread(self._fd, _ROW_READ_SIZE, offset)
+        while b'\n' not in chunk and len(chunk) == _ROW_READ_SIZE:
+            chunk = os.pread(self._fd, _ROW_READ_SIZE, offset + len(data))
+            data += chunk
+        return self._project(_split_row(data.split(b'\n', 1)[0]))
+
+    def _read_row(self, row):
+        return self._read_line(self._row_offsets[row])
+
+    def _read_visit(self, row):
+        # The visit of a row with the notes of all of its rows; later rows
+        # only contribute their note.
+        (patient_id, gender, race, age, ethnicity, insurance, zip_code,
+         visit_id, visit_time, department, chief_complaint, note_id, note_type) = self._read_row(row)
+        note_records = [NoteRecord(note_id, note_type)]
+        note = self._row_notes[row]
+        while note >= 0:
+            note_id, note_type = self._read_line(self._note_offsets[note])[11:]
+            note_records.append(NoteRecord(note_id, note_type))
+            note = self._note_next[note]
+        return ((patient_id, gender, race, age, ethnicity, insurance, zip_code),
+                VisitRecord(visit_id, self._row_days[row], department, chief_complaint, note_records))
+
+    def _parse_patient(self, rows):
+        # rows are in file order, which is the order of the patient's visits.
+        patient_record = None
+        for row in rows:
+            patient_fields, visit_record = self._read_visit(row)
+            if patient_record is None:
+                (patient_id, gender, race, age, ethnicity, insurance, zip_code) = patient_fields
+                patient_record = PatientRecord(patient_id, gender, race, int(age), ethnicity, insurance, zip_code)
+            patient_record.add_visit_record(visit_record)
+        return patient_record
+
+    def _hydrate(self, patient_id):
+        with self._hydrated_lock:
+            patient_record = self._hydrated.get(patient_id)
+            if patient_record is not None:
+                self._hydrated.move_to_end(patient_id)
+                return patient_record
+            number = self._file_patients.get(patient_id)
+        if number is None:
+            return None
+        # Parsed outside the lock, so readers of other patients do not wait on the file.
+        patient_record = self._parse_patient(self._patient_rows(number)[::-1])
+        with self._hydrated_lock:
+            if self._file_patients.get(patient_id) != number:
+                # Pinned or removed meanwhile, so no longer cached here.
+                return patient_record
+            # A reader racing on the same patient keeps the record cached first.
+            patient_record = self._hydrated.setdefault(patient_id, patient_record)
+            self._hydrated.move_to_end(patient_id)
+            if len(self._hydrated) > self.hydrated_patients:
+                self._hydrated.popitem(last=False)
+        return patient_record
+
+    def _pin(self, patient_record):
+        # Makes a file-backed patient resident before it is modified, keeping
+        # the file rows as the keys of its existing visits.
+        patient_id = patient_record.patient_id
+        with self._hydrated_lock:
+            number = self._file_patients.pop(patient_id, None)
+            self._hydrated.pop(patient_id, None)
+        if number is None:
+            return
+        rows = self._patient_rows(number)[::-1]
+        self.resident_records[patient_id] = patient_record
+        self._patient_visit_keys[patient_id] = rows
+        for row, visit_record in zip(rows, patient_record.visit_records):
+            self._visit_entries[row] = (patient_record, visit_record)
+
+    def get_patient_record(self, patient_id):
+        """
+        Returns the record of a patient, parsing it from the file if it is not in memory.
+        """
+        patient_record = self.resident_records.get(patient_id)
+        if patient_record is not None:
+            return patient_record
+        return self._hydrate(patient_id)
+
+    def add_visit_record(self, patient_record, visit_record):
+        self._pin(patient_record)
+        return super().add_visit_record(patient_record, visit_record)
+
+    def add_note_record(self, patient_record, visit_record, note_record):
+        self._pin(patient_record)
+        super().add_note_record(patient_record, visit_record, note_record)
+
+    # Visits and notes are only posted once the query indexes exist.
+    def _index_visit(self, patient_record, visit_record, visit_day):
+        key = self._visit_key(patient_record, visit_record)
+        if self._indexes_built:
+            self.visit_indexes.add_visit(key, patient_record, visit_record, visit_day)
+
+    def _index_note(self, patient_record, visit_record, note_record):
+        if self._indexes_built:
+            super()._index_note(patient_record, visit_record, note_record)
+
+    def _store_patient(self, patient_record):
+        patient_id = patient_record.patient_id
+        self.resident_records[patient_id] = patient_record
+        self._patient_visit_keys[patient_id] = []
+        entries = [(self._visit_key(patient_record, visit_record), patient_record, visit_record,
+                    visit_record.visit_day) for visit_record in patient_record.visit_records]
+        visit_days = [entry[3] for entry in entries]
+        return self._statistics_groups(patient_record), visit_days, entries if self._indexes_built else []
+
+    def _stored_patient(self, patient_id):
+        groups, visit_days, entries = super()._stored_patient(patient_id)
+        return groups, visit_days, entries if self._indexes_built else []
+
+    def _forget_patient(self, patient_id):
+        number = self._file_patients.get(patient_id)
+        if number is not None:
+            patient_record = self._hydrate(patient_id) if self._indexes_built else None
+            with self._hydrated_lock:
+                del self._file_patients[patient_id]
+                self._hydrated.pop(patient_id, None)
+            rows = self._patient_rows(number)[::-1]
+            visit_days = [self._row_days[row] for row in rows]
+            groups = self.statistics.combination_groups[self._patient_combinations[number]]
+            entries = []
+            if patient_record is not None:
+                entries = [(row, patient_record, visit_record, visit_record.visit_day)
+                           for row, visit_record in zip(rows, patient_record.visit_records)]
+            return groups, visit_days, entries
+        patient_record = self.resident_records.pop(patient_id)
+        entries = []
+        for key in self._patient_visit_keys.pop(patient_id, ()):
+            patient_record, visit_record = self._visit_entries.pop(key)
+            entries.append((key, patient_record, visit_record, visit_record.visit_day))
+        visit_days = [visit_record.visit_day for visit_record in patient_record.visit_records]
+        return self._statistics_groups(patient_record), visit_days, entries if self._indexes_built else []
+
+    def _build_visit_indexes(self):
+        # A second pass over the file posts the rows of file-backed patients;
+        # resident visits are posted from their records.
+        file_patients = self._file_patients
+        patient_ids = self._patient_ids
+        with gc_paused():
+            for row, number in enumerate(self._row_patients):
+                if file_patients.get(patient_ids[number]) != number:
+                    continue
+                (patient_id, gender, race, age, ethnicity, insurance, zip_code), visit_record = self._read_visit(row)
+                patient_record = PatientRecord(patient_id, gender, race, int(age), ethnicity, insurance, zip_code)
+                self.visit_indexes.add_visit(row, patient_record, visit_record, visit_record.visit_day)
+            for key in sorted(self._visit_entries):
+                patient_record, visit_record = self._visit_entries[key]
+                self.visit_indexes.add_visit(key, patient_record, visit_record, visit_record.visit_day)
+        self._indexes_built = True
+
+    def query(self, *args, **kwargs):
+        if not self._indexes_built:
+            self._build_visit_indexes()
+        return super().query(*args, **kwargs)
+
+    def _file_row_is_live(self, row):
+        number = self._row_patients[row]
+        return self._file_patients.get(self._patient_ids[number]) == number
+
+    def _visit_entry(self, key):
+        entry = self._visit_entries.get(key)
+        if entry is not None:
+            return entry
+        number = self._row_patients[key]
+        patient_record = self._hydrate(self._patient_ids[number])
+        rows = self._patient_rows(number)[::-1]
+        return patient_record, patient_record.visit_records[bisect_left(rows, key)]
+
+    def _visit_day(self, key):
+        if key < len(self._row_days):
+            return self._row_days[key]
+        return self._visit_entries[key][1].visit_day
+
+    def _all_visit_entries(self):
+        entries = [self._visit_entry(row) for row in range(len(self._row_offsets))
+                   if row in self._visit_entries or self._file_row_is_live(row)]
+        entries.extend(self._visit_entries[key] for key in sorted(self._visit_entries)
+                       if key >= len(self._row_offsets))
+        return entries
+
+    def statistics_columns(self):
+        # File-backed patients come from the row arrays, so nothing is parsed.
+        columns = {dimension: [] for dimension in STATISTICS_DIMENSIONS}
+        visit_patients = []
+        visit_days = []
+        combination_groups = self.statistics.combination_groups
+        position = 0
+        for number in self._file_patients.values():
+            for dimension, group in zip(STATISTICS_DIMENSIONS, combination_groups[self._patient_combinations[number]]):
+                columns[dimension].append(group)
+            for row in self._patient_rows(number)[::-1]:
+                visit_patients.append(position)
+                visit_days.append(self._row_days[row])
+            position += 1
+        for patient_record in self.resident_records.values():
+            for dimension, group in zip(STATISTICS_DIMENSIONS, self._statistics_groups(patient_record)):
+                columns[dimension].append(group)
+            for visit_record in patient_record.visit_records:
+                visit_patients.append(position)
+                visit_days.append(visit_record.visit_day)
+            position += 1
+        return StatisticsColumns(columns, {}, visit_patients, visit_days, None)
+
+instrument(LazyHospital, HOSPITAL_METHODS, 'hospital', HOSPITAL_METHOD_ROWS)
\ No newline at end of file
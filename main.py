@@ -1,12 +1,126 @@
 # main.py
+import argparse
+import os
 import sys
+from datetime import date
 
+from batch_mode import BatchRunner
+from columnar_dataset import is_columnar_dataset
 from healthcare_system import HealthcareSystem
+from instrumentation import DEFAULT_EXPORT_INTERVAL, start_session
+from result_cache import DEFAULT_RESULT_CACHE_SIZE, DEFAULT_RESULT_CACHE_TTL
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python main.py <PA3_credentials.txt> <PA3_patients.csv>")
-        sys.exit(1)
+def add_load_arguments(parser):
+    """
+    Adds the data file arguments and loading options shared by the entry points.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument('credentials_file')
+    parser.add_argument('--credentials-index', metavar='PATH',
+                        help="Where to keep the hashed credential index, by default the credentials file "
+                             "plus '.index'.")
+    parser.add_argument('patient_data_file',
+                        help="The patient CSV file, or a dataset directory written by --export-dataset.")
+    parser.add_argument('--load-mode', choices=['dict', 'chunked', 'parallel', 'lazy'], default='dict',
+                        help="How to parse the patient CSV file; 'lazy' indexes it and parses patients on demand, "
+                             "and cannot be combined with --snapshot or --backend columnar.")
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help="Binary snapshot to start from, rebuilt when the source files change.")
+    parser.add_argument('--first-date', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help="Only load the visits of a dataset directory on or after this date, and their patients.")
+    parser.add_argument('--last-date', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help="Only load the visits of a dataset directory on or before this date, and their patients.")
+    parser.add_argument('--department', action='append', metavar='NAME',
+                        help="Only load the visits of a dataset directory in this department, and their patients; "
+                             "may be repeated.")
+    parser.add_argument('--backend', choices=['objects', 'columnar'], default='objects',
+                        help="Keep records as objects or in typed column arrays.")
+    parser.add_argument('--log', metavar='PATH',
+                        help="Write-ahead log that keeps mutations across restarts, replayed at startup.")
+    parser.add_argument('--result-cache-size', type=int, default=DEFAULT_RESULT_CACHE_SIZE, metavar='N',
+                        help="How many key statistics results and reports to keep cached; 0 turns the cache off.")
+    parser.add_argument('--result-cache-ttl', type=float, default=DEFAULT_RESULT_CACHE_TTL, metavar='SECONDS',
+                        help="Seconds a cached result is served for, even if the data it depends on is unchanged.")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="Record call counts, latencies and rows per operation and export them to PATH, "
+                             "as Prometheus text for .prom and .txt files and as JSON otherwise.")
+    parser.add_argument('--metrics-interval', type=float, default=DEFAULT_EXPORT_INTERVAL, metavar='SECONDS',
+                        help="Seconds between metrics exports.")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Profile the session into PATH, as folded stacks for flame graphs for .folded "
+                             "files and as cProfile statistics otherwise.")
+
+def load_system(args):
+    """
+    Builds the HealthcareSystem described by the parsed load arguments, starting instrumentation first if asked.
+    """
+    dataset_filter = {name: value for name, value in (('first_date', args.first_date), ('last_date', args.last_date),
+                                                      ('departments', args.department)) if value is not None}
+    if dataset_filter and not is_columnar_dataset(args.patient_data_file):
+        sys.exit("--first-date, --last-date and --department only apply to dataset directories.")
+    if args.load_mode == 'lazy' and (args.snapshot or args.backend != 'objects'):
+        sys.exit("--load-mode lazy cannot be combined with --snapshot or --backend columnar.")
+    start_session(args.metrics, args.metrics_interval, args.profile)
+    healthcare_system = HealthcareSystem(args.credentials_file, args.patient_data_file,
+                                         load_mode=args.load_mode, snapshot_file=args.snapshot,
+                                         backend=args.backend, log_file=args.log,
+                                         result_cache_size=args.result_cache_size,
+                                         result_cache_ttl=args.result_cache_ttl,
+                                         credentials_index_file=args.credentials_index,
+                                         dataset_filter=dataset_filter)
+    conflicts = healthcare_system.load_conflicts
+    if conflicts:
+        first = conflicts[0]
+        print(f"Warning: {len(conflicts)} values in {args.patient_data_file} disagree with the first row of their "
+              f"visit and were ignored, the first at data row {first.row}: {first.column} of visit "
+              f"{first.visit_id} is {first.found!r}, expected {first.kept!r}.", file=sys.stderr)
+    return healthcare_system
 
-    healthcare_system = HealthcareSystem(sys.argv[1], sys.argv[2])
-    healthcare_system.start_program()
\ No newline at end of file
+def parse_args():
+    parser = argparse.ArgumentParser(usage="python main.py <PA3_credentials.txt> <PA3_patients.csv> [options]")
+    add_load_arguments(parser)
+    parser.add_argument('--batch', metavar='PATH',
+                        help="Run the script or JSONL operations in PATH ('-' for stdin) instead of the menus.")
+    parser.add_argument('--output', metavar='PATH',
+                        help="Write batch results as JSONL to PATH instead of stdout.")
+    parser.add_argument('--username', help="Username for batch mode.")
+    parser.add_argument('--password',
+                        help="Password for batch mode, defaults to the HOSPITAL_PASSWORD environment variable.")
+    parser.add_argument('--export-dataset', metavar='DIR',
+                        help="Write the loaded records to DIR as .npy columns partitioned by visit year and exit.")
+    return parser.parse_args()
+
+def run_batch(healthcare_system, args):
+    password = args.password if args.password is not None else os.environ.get('HOSPITAL_PASSWORD')
+    if args.username is None or password is None:
+        sys.exit("Batch mode needs --username and --password or HOSPITAL_PASSWORD.")
+    user = healthcare_system.authenticate_user(args.username, password)
+    if user is None:
+        sys.exit("Invalid username or password.")
+    runner = BatchRunner(healthcare_system, user)
+    input_file = sys.stdin if args.batch == '-' else open(args.batch, 'r')
+    output_file = open(args.output, 'w', buffering=1 << 20) if args.output else sys.stdout
+    try:
+        operations, failures = runner.run(input_file, output_file)
+    finally:
+        healthcare_system.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    print(f"{operations} operations, {failures} failed.", file=sys.stderr)
+
+if __name__ == "__main__":
+    args = parse_args()
+    healthcare_system = load_system(args)
+    if args.export_dataset:
+        manifest = healthcare_system.hospital.export_dataset(args.export_dataset)
+        print(f"{manifest['patients']['rows']} patients, {manifest['visits']} visits and {manifest['notes']} notes "
+              f"in {len(manifest['partitions'])} partitions written to {args.export_dataset}.", file=sys.stderr)
+        healthcare_system.close()
+    elif args.batch:
+        run_batch(healthcare_system, args)
+    else:
+        healthcare_system.start_program()
\ No newline at end of file
@@ -0,0 +1,113 @@
+# models.py
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+
+intern = sys.intern
+
+@dataclass(slots=True, eq=False, init=False)
+class NoteRecord:
+    """
+    A note or observation made during a patient's visit.
+    """
+    note_id: str
+    note_type: str
+
+    def __init__(self, note_id, note_type):
+        self.note_id = note_id
+        self.note_type = intern(note_type)
+
+@dataclass(slots=True, eq=False, init=False)
+class VisitRecord:
+    """
+    A patient's visit to the hospital.
+
+    The visit day is stored as a proleptic Gregorian ordinal; a date or
+    datetime passed in its place is converted. Department and chief
+    complaint are interned, as a few dozen values repeat across every visit.
+    """
+    visit_id: str
+    visit_day: int
+    department: str
+    chief_complaint: str
+    note_records: list
+
+    def __init__(self, visit_id, visit_day, department, chief_complaint, note_records=None):
+        self.visit_id = visit_id
+        self.visit_day = visit_day if type(visit_day) is int else visit_day.toordinal()
+        self.department = intern(department)
+        self.chief_complaint = intern(chief_complaint)
+        self.note_records = [] if note_records is None else note_records
+
+    @property
+    def visit_time(self):
+        """
+        The visit day as a datetime at midnight.
+        """
+        return datetime.fromordinal(self.visit_day)
+
+    @property
+    def visit_date(self):
+        """
+        The visit day as a date.
+        """
+        return date.fromordinal(self.visit_day)
+
+    def add_note_record(self, note_record):
+        """
+        Adds a new note record to the visit record.
+
+        Args:
+            note_record (NoteRecord): The note record to be added.
+        """
+        self.note_records.append(note_record)
+
+@dataclass(slots=True, eq=False, init=False)
+class PatientRecord:
+    """
+    A patient's demographic information and visits.
+
+    Demographic values and zip codes are interned, so patients sharing a
+    value share one string.
+    """
+    patient_id: str
+    gender: str
+    race: str
+    age: int
+    ethnicity: str
+    insurance: str
+    zip_code: str
+    visit_records: list
+
+    def __init__(self, patient_id, gender, race, age, ethnicity, insurance, zip_code, visit_records=None):
+        self.patient_id = patient_id
+        self.gender = intern(gender)
+        self.race = intern(race)
+        self.age = age
+        self.ethnicity = intern(ethnicity)
+        self.insurance = intern(insurance)
+        self.zip_code = intern(zip_code)
+        self.visit_records = [] if visit_records is None else visit_records
+
+    @classmethod
+    def from_profile(cls, patient_id, gender, ethnicity, race, age, insurance_provider, zip_code):
+        """
+        Builds a patient record from the argument order of the former PatientProfile class.
+        """
+        return cls(patient_id, gender, race, age, ethnicity, insurance_provider, zip_code)
+
+    @property
+    def insurance_provider(self):
+        """
+        The insurance, under the name the former PatientProfile class used.
+        """
+        return self.insurance
+
+    def add_visit_record(self, visit_record):
+        """
+        Adds a new visit record to the patient's profile.
+
+        Args:
+            visit_record (VisitRecord): The visit record to be added.
+        """
+        self.visit_records.append(visit_record)
\ No newline at end of file
@@ -0,0 +1,399 @@
+# patient_loader.py
+import csv
+import gc
+import io
+import os
+import sys
+import threading
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date
+from functools import lru_cache
+from itertools import accumulate, islice
+from operator import itemgetter
+
+# Columns of PA3_patients.csv in the order the loaders unpack them.
+PATIENT_COLUMNS = (
+    'Patient_ID', 'Gender', 'Race', 'Age', 'Ethnicity', 'Insurance', 'Zip_code',
+    'Visit_ID', 'Visit_time', 'Visit_department', 'Chief_complaint',
+    'Note_ID', 'Note_type',
+)
+
+DEFAULT_CHUNK_SIZE = 65536
+
+LoadStats = namedtuple('LoadStats', ['rows', 'seconds', 'rows_per_second'])
+
+# A row repeating a patient's Visit_ID with a different value in one of the
+# visit columns. row is the position of the data row in the file, from 0.
+VisitConflict = namedtuple('VisitConflict', ['row', 'patient_id', 'visit_id', 'column', 'kept', 'found'])
+
+# Result of parsing one byte range, merged as a sequential load merges it.
+# patients holds a (patient_id, gender, race, age, ethnicity, insurance,
+# zip_code, visits) tuple per patient in order of first appearance, each visit
+# a (visit_id, visit_day, department, chief_complaint, notes) tuple with a list
+# of (note_id, note_type) pairs. row_patients and row_visits hold the patient
+# slot and the position in its visits of every row, and conflicts the rows
+# contradicting the first row of their visit within the range. Rows count from
+# the start of the range.
+RangePartial = namedtuple('RangePartial', [
+    'rows', 'patients', 'row_patients', 'row_visits', 'conflicts', 'duplicate_rows',
+])
+
+@lru_cache(maxsize=65536)
+def parse_visit_day(date_str):
+    """
+    Parses a 'YYYY-M-D' visit date, with or without zero padding.
+
+    The patient files only hold a few thousand distinct dates, so results are
+    cached and most rows never reach the parser at all.
+
+    Args:
+        date_str (str): The Visit_time value from the CSV file.
+
+    Returns:
+        int: The proleptic Gregorian ordinal of the visit day.
+    """
+    year, month, day = date_str.split('-')
+    return date(int(year), int(month), int(day)).toordinal()
+
+def read_row_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads a patient CSV file in chunks of tuples ordered like PATIENT_COLUMNS.
+
+    Columns are picked by their position in the header row, so no per-row
+    dict is built.
+
+    Args:
+        file (file): An open text file positioned at the header row.
+        chunk_size (int): The maximum number of rows per chunk.
+
+    Yields:
+        list: The projected rows of the next chunk.
+    """
+    reader = csv.reader(file)
+    header = next(reader)
+    project = itemgetter(*[header.index(column) for column in PATIENT_COLUMNS])
+    while True:
+        chunk = list(map(project, islice(reader, chunk_size)))
+        if not chunk:
+            return
+        yield chunk
+
+def split_byte_ranges(file_path, parts):
+    """
+    Splits the data rows of a patient CSV file into byte ranges on line boundaries.
+
+    Rows must not contain quoted line breaks, which holds for PA3_patients.csv.
+
+    Args:
+        file_path (str): Path to the CSV file containing patient data.
+        parts (int): The number of ranges to aim for.
+
+    Returns:
+        tuple: The header row and a list of (start, end) byte offsets.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        header_line = file.readline()
+        header = next(csv.reader([header_line.decode('utf-8')]))
+        bounds = [file.tell()]
+        for part in range(1, parts):
+            target = bounds[0] + (size - bounds[0]) * part // parts
+            if target <= bounds[-1]:
+                continue
+            # Finish the line containing the byte before the target.
+            file.seek(target - 1)
+            file.readline()
+            if file.tell() > bounds[-1]:
+                bounds.append(file.tell())
+        if bounds[-1] < size:
+            bounds.append(size)
+    return header, list(zip(bounds, bounds[1:]))
+
+def parse_byte_range(file_path, header, start, end):
+    """
+    Parses one byte range of a patient CSV file into merged patients.
+
+    Runs in a worker process, which attaches every row to its visit like the
+    sequential loaders do, so the parent only has to join the few patients
+    and visits that continue across ranges. Categorical values are interned,
+    so each pickles once per range.
+
+    Args:
+        file_path (str): Path to the CSV file containing patient data.
+        header (list): The header row of the file.
+        start (int): The offset of the first byte of the range.
+        end (int): The offset just past the last byte of the range.
+
+    Returns:
+        RangePartial: The patients of the range in order of first appearance
+            and their visits in order of first row.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    project = itemgetter(*[header.index(column) for column in PATIENT_COLUMNS])
+    intern = sys.intern
+    merger = VisitMerger()
+    find_visit = merger.find
+    patients = []
+    patient_slots = {}
+    row_patients = array('i')
+    row_visits = array('i')
+    with gc_paused():
+        for row, (patient_id, gender, race, age, ethnicity, insurance, zip_code,
+                  visit_id, visit_time, department, chief_complaint,
+                  note_id, note_type) in enumerate(map(project, csv.reader(io.StringIO(text, newline='')))):
+            visit_day = parse_visit_day(visit_time)
+            entry = find_visit(patient_id, visit_id)
+            if entry is not None:
+                slot, position = entry[0], entry[1]
+                if merger.merge_note(row, patient_id, visit_id, entry, visit_day, department,
+                                     chief_complaint, note_id):
+                    patients[slot][7][position][4].append((note_id, intern(note_type)))
+            else:
+                slot = patient_slots.get(patient_id)
+                if slot is None:
+                    slot = patient_slots[patient_id] = len(patients)
+                    patients.append((patient_id, intern(gender), intern(race), int(age), intern(ethnicity),
+                                     intern(insurance), intern(zip_code), []))
+                visits = patients[slot][7]
+                position = len(visits)
+                department = intern(department)
+                chief_complaint = intern(chief_complaint)
+                visits.append((visit_id, visit_day, department, chief_complaint, [(note_id, intern(note_type))]))
+                merger.add_visit(patient_id, visit_id, slot, position, visit_day, department, chief_complaint,
+                                 note_id)
+            row_patients.append(slot)
+            row_visits.append(position)
+    return RangePartial(len(row_patients), patients, row_patients, row_visits, merger.conflicts,
+                        merger.duplicate_rows)
+
+def merge_range_patients(results, merger):
+    """
+    Yields the patients of parsed byte ranges in file order, joined across ranges.
+
+    A patient with rows in several ranges is yielded once, where it first
+    appears, with the visits of every range. A visit continuing from an
+    earlier range keeps its first row's values and only adds the notes it
+    does not already have, and its rows are checked against that first row
+    again, so once every patient is yielded merger holds the same conflicts
+    and duplicate rows as after a sequential load.
+
+    Args:
+        results (list): The RangePartial of every range, in file order.
+        merger (VisitMerger): Receives the conflicts and duplicate rows.
+
+    Yields:
+        tuple: (patient_id, gender, race, age, ethnicity, insurance, zip_code,
+            visits) with visits as in RangePartial.
+    """
+    first_rows = list(accumulate((result.rows for result in results[:-1]), initial=0))
+    seen = set()
+    spanning = set()
+    for result in results:
+        patient_ids = [patient[0] for patient in result.patients]
+        spanning.update(seen.intersection(patient_ids))
+        seen.update(patient_ids)
+    parts = {}
+    for number, result in enumerate(results):
+        for slot, patient in enumerate(result.patients):
+            if patient[0] in spanning:
+                parts.setdefault(patient[0], []).append((number, slot))
+    # Visits whose conflicts within a later range were checked against a
+    # different first row, as (range number, patient ID, visit ID).
+    rechecked = set()
+    conflicts = []
+    range_rows = {}
+    for number, result in enumerate(results):
+        for patient in result.patients:
+            patient_parts = parts.get(patient[0])
+            if patient_parts is None:
+                yield patient
+            elif patient_parts[0][0] == number:
+                yield patient[:7] + (_join_visits(results, patient_parts, first_rows, range_rows, rechecked, conflicts,
+                                                   merger),)
+        merger.duplicate_rows += result.duplicate_rows
+        first_row = first_rows[number]
+        conflicts.extend(conflict._replace(row=conflict.row + first_row) for conflict in result.conflicts
+                         if not rechecked or (number, conflict.patient_id, conflict.visit_id) not in rechecked)
+    conflicts.sort(key=itemgetter(0))
+    merger.conflicts.extend(conflicts)
+
+def _join_visits(results, patient_parts, first_rows, range_rows, rechecked, conflicts, merger):
+    # The visits of a patient from each range holding its rows, merged in file order.
+    number, slot = patient_parts[0]
+    patient_id = results[number].patients[slot][0]
+    visits = list(results[number].patients[slot][7])
+    positions = {visit[0]: position for position, visit in enumerate(visits)}
+    for number, slot in patient_parts[1:]:
+        result = results[number]
+        for position, visit in enumerate(result.patients[slot][7]):
+            visit_id = visit[0]
+            kept = positions.get(visit_id)
+            if kept is None:
+                positions[visit_id] = len(visits)
+                visits.append(visit)
+                continue
+            first = visits[kept]
+            notes = list(first[4])
+            note_ids = {note_id for note_id, _ in notes}
+            for note in visit[4]:
+                if note[0] in note_ids:
+                    merger.duplicate_rows += 1
+                else:
+                    note_ids.add(note[0])
+                    notes.append(note)
+            visits[kept] = first[:4] + (notes,)
+            if visit[1:4] != first[1:4]:
+                rechecked.add((number, patient_id, visit_id))
+                if number not in range_rows:
+                    range_rows[number] = _group_range_rows(result)
+                visit_rows, found = range_rows[number]
+                conflicts.extend(_recheck_rows(first_rows[number], patient_id, visit_rows[slot, position],
+                                               found.get((patient_id, visit_id), {}), first, visit))
+    return visits
+
+def _group_range_rows(result):
+    # The rows of every visit of a range, and the values its conflicts found
+    # by (patient ID, visit ID) and then (row, column).
+    visit_rows = {}
+    for row, visit in enumerate(zip(result.row_patients, result.row_visits)):
+        visit_rows.setdefault(visit, []).append(row)
+    found = {}
+    for conflict in result.conflicts:
+        found.setdefault((conflict.patient_id, conflict.visit_id), {})[conflict.row, conflict.column] = conflict.found
+    return visit_rows, found
+
+def _recheck_rows(first_row, patient_id, rows, found, first, visit):
+    # Conflicts of the rows of a continuing visit with the visit's first row
+    # in an earlier range. A row holds the values of the visit's first row in
+    # its own range, except where the range recorded a conflict.
+    columns = (('Visit_time', date.fromordinal(first[1]).isoformat(), date.fromordinal(visit[1]).isoformat()),
+               ('Visit_department', first[2], visit[2]),
+               ('Chief_complaint', first[3], visit[3]))
+    for row in rows:
+        for column, kept, value in columns:
+            value = found.get((row, column), value)
+            if value != kept:
+                yield VisitConflict(first_row + row, patient_id, first[0], column, kept, value)
+
+class VisitMerger:
+    """
+    Attaches each note row to its visit during a single pass over a patient file.
+
+    Every row of the file is one note. Visits are kept in a hash index keyed
+    by patient and Visit_ID, so a row of a visit already seen only adds its
+    note to that visit. A row disagreeing with the first row of its visit on
+    the visit day, department or chief complaint is recorded as a
+    VisitConflict and the first row's values are kept; a row repeating a note
+    of its visit is skipped and counted as a duplicate.
+    """
+    def __init__(self):
+        self.visits = {}
+        self.conflicts = []
+        self.duplicate_rows = 0
+
+    def add_visit(self, patient_id, visit_id, patient, visit, visit_day, department, chief_complaint, note_id):
+        """
+        Records a visit started by the current row.
+
+        Args:
+            patient_id (str): The Patient_ID of the row.
+            visit_id (str): The Visit_ID of the row.
+            patient: The patient as held by the hospital, handed back by find.
+            visit: The visit as held by the hospital, handed back by find.
+            visit_day (int): The day ordinal of the visit.
+            department (str): The department of the visit.
+            chief_complaint (str): The chief complaint of the visit.
+            note_id (str): The Note_ID of the row.
+        """
+        self.visits[patient_id, visit_id] = [patient, visit, visit_day, department, chief_complaint, note_id]
+
+    def find(self, patient_id, visit_id):
+        """
+        Returns the [patient, visit, ...] entry of a visit seen earlier in the file, or None.
+        """
+        return self.visits.get((patient_id, visit_id))
+
+    def merge_note(self, row, patient_id, visit_id, entry, visit_day, department, chief_complaint, note_id):
+        """
+        Checks a row of an already seen visit against the visit's first row.
+
+        Args:
+            row (int): The position of the data row in the file.
+            patient_id (str): The Patient_ID of the row.
+            visit_id (str): The Visit_ID of the row.
+            entry (list): The entry returned by find.
+            visit_day (int): The day ordinal of the row.
+            department (str): The department of the row.
+            chief_complaint (str): The chief complaint of the row.
+            note_id (str): The Note_ID of the row.
+
+        Returns:
+            bool: Whether the row's note should be added to the visit, False
+                for a row repeating one of the visit's notes.
+        """
+        if entry[2] != visit_day:
+            self.conflicts.append(VisitConflict(row, patient_id, visit_id, 'Visit_time',
+                                                date.fromordinal(entry[2]).isoformat(),
+                                                date.fromordinal(visit_day).isoformat()))
+        if entry[3] != department:
+            self.conflicts.append(VisitConflict(row, patient_id, visit_id, 'Visit_department', entry[3], department))
+        if entry[4] != chief_complaint:
+            self.conflicts.append(VisitConflict(row, patient_id, visit_id, 'Chief_complaint', entry[4], chief_complaint))
+        # A visit's single Note_ID is kept as is, and a set is made once it has several.
+        note_ids = entry[5]
+        if type(note_ids) is set:
+            if note_id in note_ids:
+                self.duplicate_rows += 1
+                return False
+            note_ids.add(note_id)
+        elif note_ids == note_id:
+            self.duplicate_rows += 1
+            return False
+        else:
+            entry[5] = {note_ids, note_id}
+        return True
+
+def make_load_stats(rows, seconds):
+    """
+    Builds the LoadStats reported by the loaders.
+
+    Args:
+        rows (int): The number of CSV rows loaded.
+        seconds (float): The wall time spent loading them.
+    """
+    rows_per_second = rows / seconds if seconds > 0 else float('inf')
+    return LoadStats(rows, seconds, rows_per_second)
+
+# How many gc_paused blocks are running on any thread, and whether the
+# collector was enabled when the first of them started.
+_gc_pause_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+@contextmanager
+def gc_paused():
+    """
+    Pauses the cyclic garbage collector while a loader allocates records.
+
+    Loading creates millions of acyclic objects, and every generation-0
+    collection would walk them again for nothing. Pauses nest and may
+    overlap across threads: the collector is disabled by the first to start
+    and restored only when the last one ends.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_pause_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_pause_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
\ No newline at end of file
@@ -0,0 +1,244 @@
+# query_index.py
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from heapq import merge
+
+# Visit attributes with a secondary index. zip_code and insurance are patient
+# attributes posted under each of the patient's visits; note_type posts a
+# visit once per distinct type among its notes.
+INDEXED_FIELDS = ('department', 'chief_complaint', 'zip_code', 'insurance', 'note_type', 'visit_date')
+# Visit keys are never reused, so over a long-running process they outgrow 32
+# bits; posting lists hold them as 64-bit integers.
+KEY_TYPECODE = 'q'
+
+# matches holds (patient_record, visit_record) pairs in visit key order, and
+# indexes_used the indexes consulted, smallest posting list first.
+QueryResult = namedtuple('QueryResult', ['matches', 'indexes_used'])
+
+class VisitIndexes:
+    """
+    Secondary indexes from visit attributes to sorted arrays of visit keys.
+
+    Visit keys are integers handed out by the hospital in increasing order,
+    so postings usually grow by appending. Visit dates are indexed per day,
+    using the hospital's VisitDateIndex for the sorted list of days and for
+    range size estimates.
+    """
+    def __init__(self, visit_date_index):
+        self.visit_date_index = visit_date_index
+        self.postings = {field: {} for field in INDEXED_FIELDS}
+
+    def _post(self, field, value, key):
+        postings = self.postings[field].get(value)
+        if postings is None:
+            self.postings[field][value] = array(KEY_TYPECODE, [key])
+        elif postings[-1] < key:
+            postings.append(key)
+        else:
+            position = bisect_left(postings, key)
+            if position == len(postings) or postings[position] != key:
+                postings.insert(position, key)
+
+    def _unpost(self, field, value, key):
+        postings = self.postings[field][value]
+        position = bisect_left(postings, key)
+        if position < len(postings) and postings[position] == key:
+            del postings[position]
+            if not postings:
+                del self.postings[field][value]
+
+    def add_visit(self, key, patient_record, visit_record, visit_day):
+        """
+        Indexes a visit under all of its attributes.
+
+        Args:
+            key (int): The visit key assigned by the hospital.
+            patient_record (PatientRecord): The patient the visit belongs to.
+            visit_record (VisitRecord): The visit to index.
+            visit_day (int): The day ordinal of the visit.
+        """
+        self._post('department', visit_record.department, key)
+        self._post('chief_complaint', visit_record.chief_complaint, key)
+        self._post('zip_code', patient_record.zip_code, key)
+        self._post('insurance', patient_record.insurance, key)
+        self._post('visit_date', visit_day, key)
+        for note_record in visit_record.note_records:
+            self._post('note_type', note_record.note_type, key)
+
+    def add_note(self, key, note_record):
+        """
+        Indexes a note added to an already indexed visit.
+
+        Args:
+            key (int): The visit key of the note's visit.
+            note_record (NoteRecord): The added note.
+        """
+        self._post('note_type', note_record.note_type, key)
+
+    def remove_visit(self, key, patient_record, visit_record, visit_day):
+        """
+        Removes a visit from every index it was added to.
+
+        Args:
+            key (int): The visit key assigned by the hospital.
+            patient_record (PatientRecord): The patient the visit belongs to.
+            visit_record (VisitRecord): The visit to remove.
+            visit_day (int): The day ordinal of the visit.
+        """
+        self._unpost('department', visit_record.department, key)
+        self._unpost('chief_complaint', visit_record.chief_complaint, key)
+        self._unpost('zip_code', patient_record.zip_code, key)
+        self._unpost('insurance', patient_record.insurance, key)
+        self._unpost('visit_date', visit_day, key)
+        for note_type in {note_record.note_type for note_record in visit_record.note_records}:
+            self._unpost('note_type', note_type, key)
+
+    @staticmethod
+    def _visit_postings(entries):
+        # The keys of a batch of visits per field and value, in entry order.
+        department, chief_complaint, zip_code, insurance, visit_date, note_type = (defaultdict(list) for _ in range(6))
+        for key, patient_record, visit_record, visit_day in entries:
+            department[visit_record.department].append(key)
+            chief_complaint[visit_record.chief_complaint].append(key)
+            zip_code[patient_record.zip_code].append(key)
+            insurance[patient_record.insurance].append(key)
+            visit_date[visit_day].append(key)
+            note_records = visit_record.note_records
+            if len(note_records) == 1:
+                note_type[note_records[0].note_type].append(key)
+            else:
+                for value in {note_record.note_type for note_record in note_records}:
+                    note_type[value].append(key)
+        return {'department': department, 'chief_complaint': chief_complaint, 'zip_code': zip_code,
+                'insurance': insurance, 'visit_date': visit_date, 'note_type': note_type}
+
+    def add_visits(self, entries):
+        """
+        Indexes a batch of visits, extending each posting list once.
+
+        Args:
+            entries (list): (key, patient_record, visit_record, visit_day) of
+                every visit, as given to add_visit.
+        """
+        self.add_postings(self._visit_postings(entries))
+
+    def add_postings(self, postings):
+        """
+        Indexes a batch of visits already grouped by field and value, extending each posting list once.
+
+        Args:
+            postings (dict): For each of INDEXED_FIELDS, the keys of the
+                batch's visits per value of the field.
+        """
+        for field, batches in postings.items():
+            field_postings = self.postings[field]
+            for value, keys in batches.items():
+                keys.sort()
+                postings = field_postings.get(value)
+                if postings is None:
+                    field_postings[value] = array(KEY_TYPECODE, keys)
+                elif postings[-1] < keys[0]:
+                    postings.extend(keys)
+                else:
+                    field_postings[value] = array(KEY_TYPECODE, sorted(set(postings).union(keys)))
+
+    def remove_visits(self, entries):
+        """
+        Removes a batch of visits from every index, rewriting each posting list once.
+
+        The kept runs between removed keys are copied as array slices, so a
+        long posting list is copied once rather than shifted per removal.
+
+        Args:
+            entries (list): (key, patient_record, visit_record, visit_day) of
+                every visit, as given to remove_visit.
+        """
+        for field, batches in self._visit_postings(entries).items():
+            field_postings = self.postings[field]
+            for value, keys in batches.items():
+                if len(keys) == 1:
+                    self._unpost(field, value, keys[0])
+                    continue
+                postings = field_postings[value]
+                kept = array(KEY_TYPECODE)
+                start = 0
+                for key in sorted(keys):
+                    position = bisect_left(postings, key, start)
+                    kept += postings[start:position]
+                    start = position + (position < len(postings) and postings[position] == key)
+                kept += postings[start:]
+                if kept:
+                    field_postings[value] = kept
+                else:
+                    del field_postings[value]
+
+    def renumber(self, key_map):
+        """
+        Replaces every visit key with its new key, for a hospital that renumbered its visits.
+
+        Args:
+            key_map (Sequence): The new key by old key. It must keep the order
+                of the keys it maps, so posting lists stay sorted.
+        """
+        for field_postings in self.postings.values():
+            for value, postings in field_postings.items():
+                field_postings[value] = array(KEY_TYPECODE, map(key_map.__getitem__, postings))
+
+    def _day_range(self, first_day, last_day):
+        days = self.visit_date_index.days
+        return days[bisect_left(days, first_day):bisect_right(days, last_day)]
+
+    def search(self, predicates, first_day=None, last_day=None, day_of=None):
+        """
+        Finds the keys of visits matching every predicate.
+
+        Predicates are ordered by the size of their posting lists. The
+        smallest one is materialized and every other one only filters those
+        candidates: equality predicates by binary search in their postings,
+        a date range by looking up each candidate's day.
+
+        Args:
+            predicates (dict): Field name to required value, for INDEXED_FIELDS.
+            first_day (int): The first day ordinal of a date range, or None.
+            last_day (int): The last day ordinal of a date range, or None.
+            day_of (callable): Returns the day ordinal of a visit key.
+
+        Returns:
+            tuple: The sorted matching keys and the names of the indexes used.
+        """
+        plan = []
+        for field, value in predicates.items():
+            postings = self.postings[field].get(value)
+            if postings is None:
+                return [], [field]
+            plan.append((len(postings), field, postings))
+        if first_day is not None or last_day is not None:
+            days = self.visit_date_index.days
+            if not days:
+                return [], ['visit_date']
+            first_day = days[0] if first_day is None else first_day
+            last_day = days[-1] if last_day is None else last_day
+            plan.append((self.visit_date_index.count_between(first_day, last_day), 'visit_date', None))
+        plan.sort(key=lambda step: step[0])
+
+        size, field, postings = plan[0]
+        if postings is None:
+            by_day = self.postings['visit_date']
+            candidates = list(merge(*[by_day[day] for day in self._day_range(first_day, last_day)]))
+        else:
+            candidates = list(postings)
+        indexes_used = [field]
+        for size, field, postings in plan[1:]:
+            if not candidates:
+                break
+            if postings is None:
+                candidates = [key for key in candidates if first_day <= day_of(key) <= last_day]
+            else:
+                candidates = [key for key in candidates if _contains(postings, key)]
+            indexes_used.append(field)
+        return candidates, indexes_used
+
+def _contains(postings, key):
+    position = bisect_left(postings, key)
+    return position < len(postings) and postings[position] == key
\ No newline at end of file
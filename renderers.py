@@ -0,0 +1,210 @@
+# renderers.py
+import csv
+import io
+import json
+import sys
+from datetime import date
+
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import PATIENT_COLUMNS
+
+# Streaming writes are batched into pieces of about this many characters.
+STREAM_BUFFER_CHARS = 1 << 16
+# Patients with more visits than this are streamed unless told otherwise.
+STREAM_VISIT_THRESHOLD = 1000
+
+def patient_record_fields(patient_record):
+    """
+    Converts a patient record's own fields to a JSON-ready dict, without its visits.
+
+    Args:
+        patient_record (PatientRecord): The patient to convert.
+    """
+    return {
+        'patient_id': patient_record.patient_id,
+        'gender': patient_record.gender,
+        'race': patient_record.race,
+        'age': patient_record.age,
+        'ethnicity': patient_record.ethnicity,
+        'insurance': patient_record.insurance,
+        'zip_code': patient_record.zip_code,
+    }
+
+def visit_record_fields(visit_record):
+    """
+    Converts a visit record and its notes to a JSON-ready dict.
+
+    Args:
+        visit_record (VisitRecord): The visit to convert.
+    """
+    return {
+        'visit_id': visit_record.visit_id,
+        'visit_time': visit_record.visit_date.isoformat(),
+        'department': visit_record.department,
+        'chief_complaint': visit_record.chief_complaint,
+        'notes': [{'note_id': note_record.note_id, 'note_type': note_record.note_type}
+                  for note_record in visit_record.note_records],
+    }
+
+def patient_record_to_dict(patient_record):
+    """
+    Converts a patient record and its visits and notes to JSON-ready dicts.
+
+    Args:
+        patient_record (PatientRecord): The patient to convert.
+    """
+    fields = patient_record_fields(patient_record)
+    fields['visits'] = [visit_record_fields(visit_record) for visit_record in patient_record.visit_records]
+    return fields
+
+def patient_record_from_dict(fields):
+    """
+    Builds a patient record and its visits and notes from the dicts of patient_record_to_dict.
+
+    Args:
+        fields (dict): The patient, with an optional list of visits.
+
+    Raises:
+        KeyError, TypeError, ValueError: If a field is missing or malformed.
+    """
+    visit_records = [VisitRecord(visit['visit_id'], date.fromisoformat(visit['visit_time']), visit['department'],
+                                 visit['chief_complaint'],
+                                 [NoteRecord(note['note_id'], note['note_type']) for note in visit.get('notes', ())])
+                     for visit in fields.get('visits', ())]
+    return PatientRecord(fields['patient_id'], fields['gender'], fields['race'], fields['age'], fields['ethnicity'],
+                         fields['insurance'], fields['zip_code'], visit_records)
+
+class PatientRenderer:
+    """
+    Renders a patient record as text pieces, one for the patient and one per visit.
+
+    Subclasses implement render_chunks. render builds the whole output in
+    one string, and write either sends that string in a single write or, when
+    streaming, sends the pieces in bounded batches so the full output is
+    never held in memory.
+    """
+    def render_chunks(self, patient_record):
+        raise NotImplementedError
+
+    def render(self, patient_record):
+        """
+        Renders a patient record into one string.
+
+        Args:
+            patient_record (PatientRecord): The patient to render.
+        """
+        return ''.join(self.render_chunks(patient_record))
+
+    def write(self, patient_record, file=None, stream=None):
+        """
+        Writes a rendered patient record to a file.
+
+        Args:
+            patient_record (PatientRecord): The patient to render.
+            file (file): The text stream to write to, defaults to stdout.
+            stream (bool): Whether to write in batches instead of one string.
+                Defaults to streaming only patients with more than
+                STREAM_VISIT_THRESHOLD visits.
+        """
+        file = file if file is not None else sys.stdout
+        if stream is None:
+            stream = len(patient_record.visit_records) > STREAM_VISIT_THRESHOLD
+        if not stream:
+            file.write(self.render(patient_record))
+            return
+        pending = []
+        pending_chars = 0
+        for chunk in self.render_chunks(patient_record):
+            pending.append(chunk)
+            pending_chars += len(chunk)
+            if pending_chars >= STREAM_BUFFER_CHARS:
+                file.write(''.join(pending))
+                pending.clear()
+                pending_chars = 0
+        if pending:
+            file.write(''.join(pending))
+
+class TextRenderer(PatientRenderer):
+    """
+    The indented text listing the clinician and nurse menu prints.
+    """
+    def render_chunks(self, patient_record):
+        yield (f"Patient ID: {patient_record.patient_id}\n"
+               f"Gender: {patient_record.gender}\n"
+               f"Race: {patient_record.race}\n"
+               f"Age: {patient_record.age}\n"
+               f"Ethnicity: {patient_record.ethnicity}\n"
+               f"Insurance: {patient_record.insurance}\n"
+               f"Zip code: {patient_record.zip_code}\n"
+               "Visit records:\n")
+        for visit_record in patient_record.visit_records:
+            lines = [f"  Visit ID: {visit_record.visit_id}\n"
+                     f"  Visit time: {visit_record.visit_time}\n"
+                     f"  Department: {visit_record.department}\n"
+                     f"  Chief complaint: {visit_record.chief_complaint}\n"
+                     "  Note records:\n"]
+            for note_record in visit_record.note_records:
+                lines.append(f"    Note ID: {note_record.note_id}\n    Note type: {note_record.note_type}\n")
+            yield ''.join(lines)
+
+class JsonRenderer(PatientRenderer):
+    """
+    One JSON object per patient, with its visits and notes nested.
+    """
+    def render_chunks(self, patient_record):
+        # The patient fields, then the visits one by one, so a long history
+        # is never encoded in one piece.
+        yield json.dumps(patient_record_fields(patient_record))[:-1] + ', "visits": ['
+        separator = ''
+        for visit_record in patient_record.visit_records:
+            yield separator + json.dumps(visit_record_fields(visit_record))
+            separator = ', '
+        yield ']}\n'
+
+class CsvRenderer(PatientRenderer):
+    """
+    One row per note in the column layout of the patient CSV file, with a header row.
+    """
+    def render_chunks(self, patient_record):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(PATIENT_COLUMNS)
+        patient_fields = [patient_record.patient_id, patient_record.gender, patient_record.race, patient_record.age,
+                          patient_record.ethnicity, patient_record.insurance, patient_record.zip_code]
+        for visit_record in patient_record.visit_records:
+            visit_fields = patient_fields + [visit_record.visit_id, visit_record.visit_date.isoformat(),
+                                             visit_record.department, visit_record.chief_complaint]
+            note_records = visit_record.note_records
+            if note_records:
+                writer.writerows(visit_fields + [note_record.note_id, note_record.note_type]
+                                 for note_record in note_records)
+            else:
+                writer.writerow(visit_fields + ['', ''])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+# Renderers selectable by name.
+RENDERERS = {'text': TextRenderer, 'json': JsonRenderer, 'csv': CsvRenderer}
+
+def write_patient_record(patient_record, renderer='text', file=None, stream=None):
+    """
+    Writes a patient's record, visits and notes with one of the RENDERERS, or a not-found line.
+
+    Args:
+        patient_record (PatientRecord): The patient, or None if the patient is unknown.
+        renderer (str): 'text', 'json' or 'csv'.
+        file (file): The text stream to write to, defaults to stdout.
+        stream (bool): Whether to write in batches rather than one string,
+            by default only for very long visit histories.
+
+    Returns:
+        bool: Whether the patient was found.
+    """
+    file = file if file is not None else sys.stdout
+    if patient_record is None:
+        file.write("Patient not found.\n")
+        return False
+    RENDERERS[renderer]().write(patient_record, file, stream)
+    return True
\ No newline at end of file
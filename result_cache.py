@@ -0,0 +1,91 @@
+# result_cache.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from instrumentation import active_metrics
+
+DEFAULT_RESULT_CACHE_SIZE = 64
+DEFAULT_RESULT_CACHE_TTL = 300.0
+
+# Counts of every lookup outcome since the cache was created: stale entries
+# were computed at an older generation, expired ones outlived the TTL.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'stale', 'expired', 'evicted', 'size', 'max_size', 'ttl'])
+
+class ResultCache:
+    """
+    Remembers query results in a bounded LRU, each valid only at the generation it was computed at.
+
+    The caller passes the current generation of the data a result depends
+    on with every lookup, so an entry is recomputed exactly when that data
+    changed, and entries for unchanged data survive other mutations. The
+    TTL bounds how long a result is served even when no generation moved.
+    Results are shared, not copied, so callers must not modify them.
+
+    Args:
+        max_size (int): How many results to keep; 0 turns the cache off.
+        ttl (float): Seconds a result is served for; None keeps it until evicted.
+    """
+    def __init__(self, max_size=DEFAULT_RESULT_CACHE_SIZE, ttl=DEFAULT_RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.counts = dict.fromkeys(('hits', 'misses', 'stale', 'expired', 'evicted'), 0)
+        self.lock = threading.Lock()
+
+    def _count(self, name, event):
+        self.counts[event] += 1
+        metrics = active_metrics()
+        if metrics is not None:
+            metrics.observe_cache(name, event)
+
+    def get(self, key, generation, compute, *args):
+        """
+        Returns the cached result for a key, computing and caching it if missing, stale or expired.
+
+        Args:
+            key (tuple): The query name followed by its parameters.
+            generation: The current generation of the data the result depends on.
+            compute (callable): Computes the result from args.
+            *args: Passed to compute.
+        """
+        name = key[0]
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, entry_generation, expires = entry
+                if entry_generation != generation:
+                    del self.entries[key]
+                    self._count(name, 'stale')
+                elif expires is not None and now >= expires:
+                    del self.entries[key]
+                    self._count(name, 'expired')
+                else:
+                    self.entries.move_to_end(key)
+                    self._count(name, 'hits')
+                    return result
+            self._count(name, 'misses')
+        result = compute(*args)
+        if self.max_size > 0:
+            with self.lock:
+                self.entries[key] = (result, generation, None if self.ttl is None else now + self.ttl)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    evicted_key, _ = self.entries.popitem(last=False)
+                    self._count(evicted_key[0], 'evicted')
+        return result
+
+    def clear(self):
+        """
+        Drops every cached result, keeping the counts.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        """
+        Returns a CacheInfo with the lookup counts and the current size.
+        """
+        with self.lock:
+            return CacheInfo(size=len(self.entries), max_size=self.max_size, ttl=self.ttl, **self.counts)
\ No newline at end of file
@@ -0,0 +1,183 @@
+# server.py
+import argparse
+import asyncio
+import json
+
+from batch_mode import MUTATING_ACTIONS, VERSIONED_ACTIONS, BatchError, BatchRunner, check_operation, parse_operation
+from lazy_hospital import LazyHospital
+from main import add_load_arguments, load_system
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+class HospitalServer:
+    """
+    Serves a loaded HealthcareSystem to many clients over newline-delimited JSON.
+
+    Every connection first sends a login operation. After that, each line is
+    an operation as accepted by batch mode, and each gets one JSON response
+    line echoing its "id". Operations run on the loop's default executor, so
+    a slow one leaves the loop free to serve other connections. Mutations
+    are queued to a single writer task, so they are applied one at a time,
+    and the system publishes a HospitalVersion after each. Retrievals, visit
+    counts and key statistics read the version current when they start,
+    without a lock, so they run in parallel with each other and with the
+    writer and never see a half-applied change. Queries need the live
+    hospital's indexes and take the system's write lock instead, as every
+    read of a lazy hospital does, since publishing would parse it whole.
+    Lines are parsed and type-checked before they are queued, and whatever
+    an operation raises fails only its own request.
+    """
+    def __init__(self, healthcare_system):
+        self.healthcare_system = healthcare_system
+        self.mutations = asyncio.Queue()
+        self.writer_task = None
+        self.read_versions = not isinstance(healthcare_system.hospital, LazyHospital)
+        if self.read_versions:
+            # Published before serving, so every mutation publishes the next version.
+            healthcare_system.current_version()
+
+    async def _run_writer(self):
+        # Mutations queued while the writer was busy form one group: the
+        # write-ahead log is synced once for all of them before any is
+        # acknowledged, and if the sync fails none of them is.
+        done = []
+        loop = asyncio.get_running_loop()
+        while True:
+            runner, operation, future = await self.mutations.get()
+            try:
+                done.append((future, await loop.run_in_executor(None, runner.run_operation, operation), None))
+            except Exception as error:
+                done.append((future, None, error))
+            if not self.mutations.empty():
+                continue
+            sync_error = None
+            if self.healthcare_system.write_ahead_log is not None:
+                try:
+                    await loop.run_in_executor(None, self.healthcare_system.write_ahead_log.sync)
+                except OSError as error:
+                    sync_error = error
+            for future, result, error in done:
+                if future.cancelled():
+                    continue
+                error = error or sync_error
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            done.clear()
+
+    async def execute(self, runner, operation):
+        """
+        Runs an operation for a logged-in connection.
+
+        Args:
+            runner (BatchRunner): The runner holding the connection's user.
+            operation (dict): The parsed operation.
+
+        Returns:
+            The JSON-ready result of the operation.
+        """
+        if operation['op'] in MUTATING_ACTIONS:
+            future = asyncio.get_running_loop().create_future()
+            await self.mutations.put((runner, operation, future))
+            return await future
+        loop = asyncio.get_running_loop()
+        if self.read_versions and operation['op'] in VERSIONED_ACTIONS:
+            return await loop.run_in_executor(None, runner.run_operation, operation)
+        return await loop.run_in_executor(None, self._run_locked, runner, operation)
+
+    def _run_locked(self, runner, operation):
+        with self.healthcare_system.write_lock:
+            return runner.run_operation(operation)
+
+    def _login(self, operation):
+        username = operation.get('username')
+        password = operation.get('password')
+        if username is None or password is None:
+            raise BatchError("login needs a username and password.")
+        user = self.healthcare_system.credentials_manager.validate_user(username, password)
+        if user is None:
+            raise BatchError("Invalid username or password.")
+        return BatchRunner(self.healthcare_system, user, read_versions=self.read_versions)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves one client connection until it disconnects or sends 'stop'.
+        """
+        runner = None
+        try:
+            async for line in reader:
+                line = line.decode('utf-8').strip()
+                if not line:
+                    continue
+                response = {}
+                try:
+                    operation = parse_operation(line)
+                    if 'id' in operation:
+                        response['id'] = operation['id']
+                    response['op'] = operation['op']
+                    check_operation(operation)
+                    if operation['op'] == 'stop':
+                        break
+                    if operation['op'] == 'login':
+                        runner = self._login(operation)
+                        value = {'username': runner.user.username, 'role': runner.user.role}
+                    elif runner is None:
+                        raise BatchError("Not logged in.")
+                    else:
+                        value = await self.execute(runner, operation)
+                    response['ok'] = True
+                    response['result'] = value
+                except BatchError as error:
+                    response['ok'] = False
+                    response['error'] = str(error)
+                except Exception as error:
+                    response['ok'] = False
+                    response['error'] = f"{type(error).__name__}: {error}"
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Dropped connections and request lines over the stream limit.
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        """
+        Listens on a TCP port, or on a Unix socket when unix_path is given, until cancelled.
+
+        Args:
+            host (str): The interface to bind.
+            port (int): The TCP port to bind.
+            unix_path (str): Path of a Unix socket to listen on instead.
+        """
+        self.writer_task = asyncio.create_task(self._run_writer())
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Serving on {addresses}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.writer_task.cancel()
+            self.healthcare_system.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(usage="python server.py <PA3_credentials.txt> <PA3_patients.csv> [options]")
+    add_load_arguments(parser)
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Interface to listen on.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="TCP port to listen on.")
+    parser.add_argument('--unix', metavar='PATH', help="Listen on a Unix socket instead of TCP.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = HospitalServer(load_system(args))
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
@@ -0,0 +1,222 @@
+# snapshot.py
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from hospital_management import Hospital
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import gc_paused
+from source_files import source_fingerprint, source_is_current
+
+SNAPSHOT_MAGIC = b'HSNAPSHT'
+SNAPSHOT_VERSION = 2
+
+# Magic, format version and manifest length.
+_HEADER = struct.Struct('<8sII')
+_ALIGNMENT = 8
+
+class _ColumnWriter:
+    """
+    Collects the column blobs of a snapshot and their manifest entries.
+    """
+    def __init__(self):
+        self.columns = {}
+        self.blobs = []
+        self.offset = 0
+
+    def _add_blob(self, name, data, entry):
+        padding = -self.offset % _ALIGNMENT
+        if padding:
+            self.blobs.append(b'\0' * padding)
+            self.offset += padding
+        entry.update(offset=self.offset, length=len(data))
+        self.columns[name] = entry
+        self.blobs.append(data)
+        self.offset += len(data)
+
+    def add_ints(self, name, values):
+        self._add_blob(name, array('i', values).tobytes(), {'kind': 'ints'})
+
+    def add_text(self, name, values):
+        self._add_blob(name, '\0'.join(values).encode('utf-8'), {'kind': 'text', 'count': len(values)})
+
+    def add_codes(self, name, values):
+        codes = {}
+        for value in values:
+            codes.setdefault(value, len(codes))
+        self._add_blob(name, array('i', [codes[value] for value in values]).tobytes(),
+                       {'kind': 'codes', 'dictionary': list(codes)})
+
+class _ColumnReader:
+    """
+    Decodes the columns of a memory-mapped snapshot.
+    """
+    def __init__(self, buffer, data_start, columns):
+        self.buffer = buffer
+        self.data_start = data_start
+        self.columns = columns
+
+    def _view(self, name):
+        entry = self.columns[name]
+        start = self.data_start + entry['offset']
+        return entry, self.buffer[start:start + entry['length']]
+
+    def ints(self, name):
+        return self._view(name)[1].cast('i')
+
+    def text(self, name):
+        entry, view = self._view(name)
+        if entry['count'] == 0:
+            return []
+        return str(view, 'utf-8').split('\0')
+
+    def codes(self, name):
+        entry, view = self._view(name)
+        dictionary = entry['dictionary']
+        return [dictionary[code] for code in view.cast('i')]
+
+def write_snapshot(snapshot_file, hospital, patient_data_file, metadata=None):
+    """
+    Writes the loaded hospital as a columnar binary snapshot.
+
+    The file is written next to its final path and renamed into place, so a
+    reader never sees a partial snapshot.
+
+    Args:
+        snapshot_file (str): Path of the snapshot to write.
+        hospital (Hospital): The loaded hospital.
+        patient_data_file (str): The patient CSV the hospital was loaded from.
+        metadata (dict): JSON-serializable values stored with the snapshot,
+            see read_snapshot_metadata.
+    """
+    patients = list(hospital.patient_records.values())
+    visits = [visit_record for patient_record in patients for visit_record in patient_record.visit_records]
+    notes = [note_record for visit_record in visits for note_record in visit_record.note_records]
+
+    writer = _ColumnWriter()
+    writer.add_text('patient_id', [p.patient_id for p in patients])
+    writer.add_codes('gender', [p.gender for p in patients])
+    writer.add_codes('race', [p.race for p in patients])
+    writer.add_ints('age', [p.age for p in patients])
+    writer.add_codes('ethnicity', [p.ethnicity for p in patients])
+    writer.add_codes('insurance', [p.insurance for p in patients])
+    writer.add_codes('zip_code', [p.zip_code for p in patients])
+    writer.add_ints('visit_count', [len(p.visit_records) for p in patients])
+    writer.add_text('visit_id', [v.visit_id for v in visits])
+    writer.add_ints('visit_day', [v.visit_day for v in visits])
+    writer.add_codes('department', [v.department for v in visits])
+    writer.add_codes('chief_complaint', [v.chief_complaint for v in visits])
+    writer.add_ints('note_count', [len(v.note_records) for v in visits])
+    writer.add_text('note_id', [n.note_id for n in notes])
+    writer.add_codes('note_type', [n.note_type for n in notes])
+
+    manifest = json.dumps({
+        'sources': {
+            'patients': source_fingerprint(patient_data_file),
+        },
+        'columns': writer.columns,
+        'metadata': metadata or {},
+    }).encode('utf-8')
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(manifest)) + manifest
+    header += b'\0' * (-len(header) % _ALIGNMENT)
+
+    temp_file = f"{snapshot_file}.tmp"
+    with open(temp_file, 'wb') as file:
+        file.write(header)
+        file.writelines(writer.blobs)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, snapshot_file)
+
+def read_snapshot(snapshot_file, patient_data_file, hospital=None):
+    """
+    Memory-maps a snapshot and rebuilds the hospital from it.
+
+    Args:
+        snapshot_file (str): Path of the snapshot to read.
+        patient_data_file (str): The patient CSV the snapshot must match.
+        hospital (Hospital): An empty hospital to fill, defaults to a new Hospital.
+
+    Returns:
+        tuple: The Hospital and the number of notes read, or None if the
+            snapshot is missing, from another format version or stale.
+    """
+    try:
+        file = open(snapshot_file, 'rb')
+    except FileNotFoundError:
+        return None
+    with file:
+        if os.fstat(file.fileno()).st_size < _HEADER.size:
+            return None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return _read_mapped_snapshot(buffer, patient_data_file, hospital)
+
+def read_snapshot_metadata(snapshot_file):
+    """
+    Reads the metadata stored with a snapshot without loading its columns.
+
+    Args:
+        snapshot_file (str): Path of the snapshot to read.
+
+    Returns:
+        dict: The metadata given to write_snapshot, or None if the snapshot
+            is missing or from another format version.
+    """
+    try:
+        with open(snapshot_file, 'rb') as file:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            magic, version, manifest_length = _HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                return None
+            return json.loads(file.read(manifest_length)).get('metadata', {})
+    except FileNotFoundError:
+        return None
+
+def _read_mapped_snapshot(buffer, patient_data_file, hospital):
+    magic, version, manifest_length = _HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    manifest = json.loads(buffer[_HEADER.size:_HEADER.size + manifest_length])
+    sources = manifest['sources']
+    if not source_is_current(sources['patients'], patient_data_file):
+        return None
+    data_start = _HEADER.size + manifest_length
+    data_start += -data_start % _ALIGNMENT
+    with memoryview(buffer) as view:
+        reader = _ColumnReader(view, data_start, manifest['columns'])
+        hospital = hospital if hospital is not None else Hospital()
+        with gc_paused(), hospital.loading():
+            _read_hospital(reader, hospital)
+    return hospital, manifest['columns']['note_id']['count']
+
+def _read_hospital(reader, hospital):
+    visit_ids = reader.text('visit_id')
+    departments = reader.codes('department')
+    chief_complaints = reader.codes('chief_complaint')
+    note_counts = reader.ints('note_count')
+    note_ids = reader.text('note_id')
+    note_types = reader.codes('note_type')
+    visit_records = []
+    note_index = 0
+    for visit_index, visit_day in enumerate(reader.ints('visit_day')):
+        visit_record = VisitRecord(visit_ids[visit_index], visit_day, departments[visit_index], chief_complaints[visit_index])
+        note_end = note_index + note_counts[visit_index]
+        for note_id, note_type in zip(note_ids[note_index:note_end], note_types[note_index:note_end]):
+            visit_record.add_note_record(NoteRecord(note_id, note_type))
+        note_index = note_end
+        visit_records.append(visit_record)
+
+    visit_index = 0
+    for patient_id, gender, race, age, ethnicity, insurance, zip_code, visit_count in zip(
+            reader.text('patient_id'), reader.codes('gender'), reader.codes('race'), reader.ints('age'),
+            reader.codes('ethnicity'), reader.codes('insurance'), reader.codes('zip_code'),
+            reader.ints('visit_count')):
+        patient_record = PatientRecord(patient_id, gender, race, age, ethnicity, insurance, zip_code)
+        patient_record.visit_records = visit_records[visit_index:visit_index + visit_count]
+        visit_index += visit_count
+        hospital.add_patient_record(patient_record)
+    return hospital
\ No newline at end of file
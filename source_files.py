@@ -0,0 +1,56 @@
+# source_files.py
+import hashlib
+import os
+
+def _source_paths(file_path):
+    # A directory, such as a columnar dataset, stands for every file in it.
+    if not os.path.isdir(file_path):
+        return [file_path]
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(file_path) for name in names)
+
+def source_fingerprint(file_path, with_hash=True):
+    """
+    Describes a source file or directory so a derived file can tell whether it is still current.
+
+    Args:
+        file_path (str): Path to the source file or directory.
+        with_hash (bool): Whether to include the SHA-256 of the contents.
+
+    Returns:
+        dict: The size, modification time and optionally hash of the file,
+            or the total size, latest modification time and hash of the
+            names and contents of the files in the directory.
+    """
+    paths = _source_paths(file_path)
+    stats = [os.stat(path) for path in paths]
+    fingerprint = {'size': sum(stat.st_size for stat in stats),
+                   'mtime_ns': max((stat.st_mtime_ns for stat in stats), default=0)}
+    if with_hash:
+        digest = hashlib.sha256()
+        for path in paths:
+            if path != file_path:
+                digest.update(os.path.relpath(path, file_path).encode('utf-8') + b'\0')
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+def source_is_current(fingerprint, file_path):
+    """
+    Checks a source file against the fingerprint taken when a derived file was written.
+
+    Args:
+        fingerprint (dict): The result of source_fingerprint at write time.
+        file_path (str): Path to the source file.
+
+    Returns:
+        bool: True if the file still has the same contents.
+    """
+    current = source_fingerprint(file_path, with_hash=False)
+    if current['size'] != fingerprint['size']:
+        return False
+    if current['mtime_ns'] == fingerprint['mtime_ns']:
+        return True
+    # Touched but possibly unchanged, so fall back to the content hash.
+    return source_fingerprint(file_path)['sha256'] == fingerprint['sha256']
\ No newline at end of file
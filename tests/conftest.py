@@ -0,0 +1,57 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+sys.path.insert(0, os.path.join(REPOSITORY_DIR, 'benchmarks'))
+
+from generate_data import write_credentials_file, write_patient_file
+from healthcare_system import HealthcareSystem
+from lazy_hospital import LazyHospital
+
+SAMPLE_PATIENT_FILE = os.path.join(REPOSITORY_DIR, 'PA3_patients.csv')
+# Rows of the generated patient file; enough for patients with visits in several months and years.
+GENERATED_ROWS = 3000
+# (backend, load mode) of every Hospital implementation.
+BACKENDS = {'objects': ('objects', 'chunked'), 'columnar': ('columnar', 'chunked'), 'lazy': ('objects', 'lazy')}
+
+@pytest.fixture(scope='session')
+def credentials_file(tmp_path_factory):
+    file_path = str(tmp_path_factory.mktemp('credentials') / 'credentials.txt')
+    write_credentials_file(file_path, 1)
+    return file_path
+
+@pytest.fixture(scope='session')
+def generated_patient_file(tmp_path_factory):
+    file_path = str(tmp_path_factory.mktemp('patients') / 'patients.csv')
+    write_patient_file(file_path, GENERATED_ROWS)
+    return file_path
+
+@pytest.fixture(params=['sample', 'generated'])
+def patient_file(request):
+    if request.param == 'sample':
+        return SAMPLE_PATIENT_FILE
+    return request.getfixturevalue('generated_patient_file')
+
+@pytest.fixture
+def make_system(credentials_file):
+    """
+    Returns a function building a HealthcareSystem over a patient file with one of BACKENDS.
+    """
+    systems = []
+
+    def make(patient_file, backend='objects', **kwargs):
+        hospital_backend, load_mode = BACKENDS[backend]
+        kwargs.setdefault('load_mode', load_mode)
+        system = HealthcareSystem(credentials_file, patient_file, backend=hospital_backend, **kwargs)
+        systems.append(system)
+        return system
+
+    yield make
+    for system in systems:
+        system.close()
+        if isinstance(system.hospital, LazyHospital):
+            system.hospital.close()
\ No newline at end of file
@@ -0,0 +1,79 @@
+# tests/test_batch_mode.py
+import io
+import json
+
+import pytest
+
+from batch_mode import BatchRunner
+from conftest import SAMPLE_PATIENT_FILE
+from credentials_manage import Credential, UserProfile
+
+NURSE = UserProfile(Credential('nurse', None, 'nurse'))
+
+# Lines with arguments of the wrong type, each failing on its own.
+MALFORMED_LINES = [
+    '{"op": "add_patient", "patient_id": "typed-1", "gender": "Male", "race": "White", "age": [1], '
+    '"ethnicity": "Other", "insurance": "None", "zip_code": "53001"}',
+    '{"op": "add_patient", "patient_id": 5, "gender": "Male", "race": "White", "age": 40, '
+    '"ethnicity": "Other", "insurance": "None", "zip_code": "53001"}',
+    '{"op": "add_patient", "patient_id": "typed-2", "gender": "Male", "race": "White", "age": true, '
+    '"ethnicity": "Other", "insurance": "None", "zip_code": "53001"}',
+    '{"op": "add_patient", "patient_id": "typed-3", "gender": "Male", "race": "White", "age": "-4", '
+    '"ethnicity": "Other", "insurance": "None", "zip_code": "53001"}',
+    '{"op": "add_patient", "patient_id": "typed-5", "gender": "Male", "race": "White", "age": 40000000000, '
+    '"ethnicity": "Other", "insurance": "None", "zip_code": "53001"}',
+    '{"op": "remove_patient", "patient_id": ["x"]}',
+    '{"op": "retrieve_patient", "patient_id": 7}',
+    '{"op": "remove_patients", "patient_ids": [["x"]]}',
+    '{"op": "add_patients", "patients": [["x"]]}',
+    '{"op": "retrieve_patient", "patient_id": "x", "format": ["text"]}',
+    '{"op": "query", "department": ["Surgery"]}',
+    '{"op": "count_visits", "date": 20200131}',
+    '{"op": ["count_visits"]}',
+    '{"op": "add_patients", "file": 3}',
+]
+
+def run_batch(system, lines, user=NURSE):
+    output = io.StringIO()
+    counts = BatchRunner(system, user).run(io.StringIO('\n'.join(lines) + '\n'), output)
+    return counts, [json.loads(line) for line in output.getvalue().splitlines()]
+
+def test_malformed_arguments_fail_their_own_line(make_system, tmp_path):
+    system = make_system(SAMPLE_PATIENT_FILE, log_file=str(tmp_path / 'hospital.wal'))
+    patients = len(system.hospital.patient_records)
+    lines = MALFORMED_LINES + ['add_patient typed-4 Male White 40 Other None 53001']
+    (operations, failures), results = run_batch(system, lines)
+    assert (operations, failures) == (len(lines), len(MALFORMED_LINES))
+    assert [result['ok'] for result in results] == [False] * len(MALFORMED_LINES) + [True]
+    assert all(result['error'] for result in results[:-1])
+    assert len(system.hospital.patient_records) == patients + 1
+    assert all(isinstance(patient_id, str) for patient_id in system.hospital.patient_records)
+    assert system.hospital.patient_records['typed-4'].age == 40
+    # Nothing malformed reached the write-ahead log, so it still compacts.
+    system.compact_write_ahead_log()
+    assert 'typed-4' in system.hospital.patient_records
+
+def test_unexpected_errors_fail_their_own_line(make_system, monkeypatch):
+    system = make_system(SAMPLE_PATIENT_FILE)
+
+    def broken_query(**criteria):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(system.hospital, 'query', broken_query)
+    (operations, failures), results = run_batch(system, ['query department=Surgery', 'count_visits 2020-01-31'])
+    assert (operations, failures) == (2, 1)
+    assert results[0]['error'] == "RuntimeError: index unavailable"
+    assert results[1]['ok']
+
+def test_results_are_written_when_reading_fails(make_system):
+    system = make_system(SAMPLE_PATIENT_FILE)
+
+    def failing_input():
+        yield 'count_visits 2020-01-31\n'
+        yield 'count_visits 2020-02-01\n'
+        raise OSError("input went away")
+
+    output = io.StringIO()
+    with pytest.raises(OSError):
+        BatchRunner(system, NURSE).run(failing_input(), output)
+    assert [json.loads(line)['line'] for line in output.getvalue().splitlines()] == [1, 2]
\ No newline at end of file
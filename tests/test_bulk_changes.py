@@ -0,0 +1,76 @@
+# tests/test_bulk_changes.py
+import json
+
+import pytest
+
+from analytics import check_aggregates
+from conftest import BACKENDS, SAMPLE_PATIENT_FILE
+from hospital_management import BatchValidationError
+from renderers import patient_record_to_dict
+from test_columnar import hospital_state
+from test_query import assert_queries_match
+from test_statistics import FIRST_DAY, make_patient
+
+def system_state(system):
+    hospital = system.hospital
+    return (hospital_state(hospital), tuple(hospital.key_statistics()),
+            sorted(hospital.visit_date_index.day_counts.items()),
+            [sorted((patient_record.patient_id, visit_record.visit_id) for patient_record, visit_record
+                    in hospital.query(department=department).matches) for department in ('Surgery', 'Cardiology')])
+
+def new_patients(tag, count):
+    return [make_patient(f"{tag}-{number}", [FIRST_DAY + number, FIRST_DAY + 40 * number], age=number * 7)
+            for number in range(count)]
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_bulk_changes_match_single_changes(make_system, patient_file, backend):
+    system = make_system(patient_file, backend)
+    expected = make_system(patient_file, backend)
+    patient_ids = list(system.hospital.patient_records)[::3]
+    assert system.add_patient_records(new_patients('bulk', 40)) == 40
+    assert system.remove_patient_records(patient_ids) == len(patient_ids)
+    for patient_record in new_patients('bulk', 40):
+        expected.hospital.add_patient_record(patient_record)
+    for patient_id in patient_ids:
+        expected.hospital.remove_patient_record(patient_id)
+    assert system_state(system) == system_state(expected)
+    assert check_aggregates(system.hospital.statistics, system.hospital.statistics_columns()) == []
+    assert_queries_match(system.hospital)
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_invalid_batches_change_nothing(make_system, tmp_path, backend):
+    system = make_system(SAMPLE_PATIENT_FILE, backend, log_file=str(tmp_path / 'hospital.wal'))
+    patient_ids = list(system.hospital.patient_records)
+    system.hospital.query(department='Surgery')
+    before = system_state(system)
+    log_size = system.write_ahead_log.size
+
+    invalid = new_patients('invalid', 10)
+    invalid[3].age = -1
+    invalid[5].visit_records.append(invalid[5].visit_records[0])
+    # Beyond the 32-bit ages and the date ordinals the backends store.
+    invalid[7].age = 1 << 40
+    invalid[8].visit_records[1].visit_day = 1 << 40
+    invalid.append(invalid[0])
+    invalid.append(make_patient(patient_ids[0], [FIRST_DAY]))
+    with pytest.raises(BatchValidationError) as error:
+        system.add_patient_records(invalid)
+    assert len(error.value.problems) == 6
+    with pytest.raises(BatchValidationError) as error:
+        system.remove_patient_records([patient_ids[1], 'no-such-patient', patient_ids[2], patient_ids[1]])
+    assert len(error.value.problems) == 2
+
+    # A file with one unreadable line is rejected as a whole too.
+    patient_file = tmp_path / 'patients.jsonl'
+    lines = [json.dumps(patient_record_to_dict(patient_record)) for patient_record in new_patients('file', 5)]
+    patient_file.write_text('\n'.join(lines[:2] + ['{"patient_id": "broken"'] + lines[2:]) + '\n')
+    with pytest.raises(BatchValidationError):
+        system.add_patient_records(str(patient_file))
+
+    assert system_state(system) == before
+    assert system.write_ahead_log.size == log_size
+    assert 'invalid-1' not in system.hospital.patient_records
+    # The valid lines of the file still load once the broken one is gone.
+    patient_file.write_text('\n'.join(lines) + '\n')
+    assert system.add_patient_records(str(patient_file)) == 5
+    assert system.write_ahead_log.size > log_size
\ No newline at end of file
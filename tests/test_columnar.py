@@ -0,0 +1,111 @@
+# tests/test_columnar.py
+import pytest
+
+import columnar_hospital
+from analytics import check_aggregates
+from models import NoteRecord, PatientRecord, VisitRecord
+from test_query import assert_queries_match
+
+def hospital_state(hospital):
+    return [(patient_record.patient_id, patient_record.gender, patient_record.age, patient_record.zip_code,
+             [(visit_record.visit_id, visit_record.visit_day, visit_record.department,
+               [(note_record.note_id, note_record.note_type) for note_record in visit_record.note_records])
+              for visit_record in patient_record.visit_records])
+            for patient_record in hospital.patient_records.values()]
+
+def make_patient(patient_id, visit_day, visits=3):
+    return PatientRecord(patient_id, 'Female', 'Asian', 52, 'Hispanic', 'Medicare', '53001',
+                         [VisitRecord(f"{patient_id}-{number}", visit_day + number, 'Surgery', 'injury',
+                                      [NoteRecord(f"{patient_id}-{number}-note", 'progress note')])
+                          for number in range(visits)])
+
+def change(hospital, patient_ids, visit_day, tag):
+    # Reads patients, appends to them and removes most of them in between.
+    for number, patient_id in enumerate(patient_ids[:40]):
+        patient_record = hospital.patient_records[patient_id]
+        assert len(patient_record.visit_records) >= 1
+        visit_record = hospital.add_visit_record(patient_record, VisitRecord(f"{tag}-late-{number}", visit_day + number,
+                                                                             'Radiology', 'fatigue'))
+        hospital.add_note_record(patient_record, visit_record, NoteRecord(f"{tag}-late-{number}-note", 'discharge note'))
+        hospital.add_note_record(patient_record, patient_record.visit_records[0],
+                                 NoteRecord(f"{tag}-early-{number}-note", 'oncology note'))
+    hospital.remove_patient_records(patient_ids[40::2])
+    for patient_id in patient_ids[41::4]:
+        hospital.remove_patient_record(patient_id)
+    hospital.add_patient_records([make_patient(f"{tag}-new-{number}", visit_day) for number in range(30)])
+    hospital.add_patient_record(make_patient(patient_ids[0], visit_day, visits=2))
+    patient_record = hospital.patient_records[f"{tag}-new-3"]
+    hospital.add_visit_record(patient_record, VisitRecord(f"{tag}-new-3-late", visit_day + 90, 'Surgery', 'infection'))
+
+@pytest.fixture
+def small_compactions(monkeypatch):
+    monkeypatch.setattr(columnar_hospital, 'COMPACT_MIN_DEAD_ROWS', 16)
+
+def test_reads_after_appends_reuse_the_offset_tables(make_system, generated_patient_file):
+    hospital = make_system(generated_patient_file, 'columnar').hospital
+    patient_ids = list(hospital.patient_records)
+    hospital_state(hospital)
+    built = hospital._visit_offsets, hospital._note_offsets
+    for number, patient_id in enumerate(patient_ids[:20]):
+        patient_record = hospital.patient_records[patient_id]
+        visit_records = patient_record.visit_records
+        visit_record = hospital.add_visit_record(patient_record, VisitRecord(f"added-{number}", 738000, 'Surgery',
+                                                                             'injury'))
+        hospital.add_note_record(patient_record, visit_records[0], NoteRecord(f"added-{number}-note", 'admission note'))
+        visit_ids = [visit.visit_id for visit in patient_record.visit_records]
+        assert visit_ids == [visit.visit_id for visit in visit_records] + [f"added-{number}"]
+        assert visit_record.note_records == []
+        assert patient_record.visit_records[0].note_records[-1].note_id == f"added-{number}-note"
+    assert (hospital._visit_offsets, hospital._note_offsets) == built
+
+def test_removed_rows_are_reclaimed(make_system, generated_patient_file, small_compactions):
+    hospital = make_system(generated_patient_file, 'columnar').hospital
+    expected = make_system(generated_patient_file, 'objects').hospital
+    patient_ids = list(hospital.patient_records)
+    visit_day = hospital.patient_records[patient_ids[0]].visit_records[0].visit_day
+    rows = len(hospital._visit_days)
+    for each in (hospital, expected):
+        change(each, patient_ids, visit_day, 'first')
+    assert hospital_state(hospital) == hospital_state(expected)
+    # Without reclaiming, rows are only ever appended.
+    assert len(hospital._visit_days) < rows
+    assert check_aggregates(hospital.statistics, hospital.statistics_columns()) == []
+    assert_queries_match(hospital)
+    for each in (hospital, expected):
+        change(each, list(each.patient_records)[100:], visit_day + 1000, 'second')
+    assert hospital_state(hospital) == hospital_state(expected)
+    assert_queries_match(hospital)
+
+def test_no_rows_are_reclaimed_inside_a_load(make_system, generated_patient_file, small_compactions):
+    hospital = make_system(generated_patient_file, 'columnar').hospital
+    patient_ids = list(hospital.patient_records)
+    with hospital.loading():
+        visit_records = hospital.patient_records[patient_ids[-1]].visit_records
+        hospital.remove_patient_records(patient_ids[:200])
+        assert len(hospital._patient_ids) > len(hospital.patient_records)
+        assert [visit.visit_id for visit in visit_records] == [
+            visit.visit_id for visit in hospital.patient_records[patient_ids[-1]].visit_records]
+    assert len(hospital._patient_ids) == len(hospital.patient_records)
+    assert_queries_match(hospital)
+def test_patients_the_columns_cannot_hold_leave_no_rows(make_system, generated_patient_file):
+    hospital = make_system(generated_patient_file, 'columnar').hospital
+    visit_day = next(iter(hospital.patient_records.values())).visit_records[0].visit_day
+    old_patient = make_patient('old', visit_day)
+    old_patient.age = 40000
+    hospital.add_patient_record(old_patient)
+    assert hospital.patient_records['old'].age == 40000
+    state = hospital_state(hospital)
+    statistics = tuple(hospital.key_statistics())
+    too_old = make_patient('too-old', visit_day)
+    too_old.age = 1 << 40
+    far_visit = make_patient('far-visit', visit_day)
+    far_visit.visit_records[-1].visit_day = 1 << 40
+    for patient_record in (too_old, far_visit):
+        with pytest.raises(OverflowError):
+            hospital.add_patient_record(patient_record)
+    with pytest.raises(OverflowError):
+        hospital.add_visit_record(hospital.patient_records['old'], VisitRecord('far', 1 << 40, 'Surgery', 'injury'))
+    assert 'too-old' not in hospital.patient_records and 'far-visit' not in hospital.patient_records
+    assert hospital_state(hospital) == state
+    assert tuple(hospital.key_statistics()) == statistics
+    assert check_aggregates(hospital.statistics, hospital.statistics_columns()) == []
\ No newline at end of file
@@ -0,0 +1,130 @@
+# tests/test_columnar_dataset.py
+import argparse
+import os
+from datetime import date
+
+import pytest
+
+import columnar_dataset
+from columnar_dataset import read_dataset_manifest, read_npy, write_npy
+from conftest import SAMPLE_PATIENT_FILE
+from main import add_load_arguments, load_system
+from test_columnar import hospital_state
+
+def filtered_state(hospital, first_date=None, last_date=None, departments=None):
+    # The state of the patients with matching visits, keeping only those visits.
+    state = []
+    for patient_id, gender, age, zip_code, visits in hospital_state(hospital):
+        visits = [visit for visit in visits
+                  if (first_date is None or visit[1] >= first_date.toordinal())
+                  and (last_date is None or visit[1] <= last_date.toordinal())
+                  and (departments is None or visit[2] in departments)]
+        if visits:
+            state.append((patient_id, gender, age, zip_code, visits))
+    return state
+
+@pytest.fixture
+def dataset(make_system, generated_patient_file, tmp_path):
+    system = make_system(generated_patient_file, load_mode='chunked')
+    directory = str(tmp_path / 'dataset')
+    system.hospital.export_dataset(directory, metadata={'source': 'generated'})
+    return system.hospital, directory
+
+def test_npy_columns_round_trip(tmp_path):
+    columns = {'<i4': [0, -1, 2 ** 31 - 1, -2 ** 31], '<i8': [2 ** 40, -3], '<M8[D]': [-719162, 0, 18000],
+               '<U': ['', 'é', 'visit-42', 'a\tb']}
+    for dtype, values in columns.items():
+        file_path = str(tmp_path / 'column.npy')
+        write_npy(file_path, dtype, values)
+        assert list(read_npy(file_path)) == values
+    write_npy(str(tmp_path / 'empty.npy'), '<U', [])
+    assert read_npy(str(tmp_path / 'empty.npy')) == []
+    (tmp_path / 'other.npy').write_bytes(b'not numpy')
+    with pytest.raises(ValueError):
+        read_npy(str(tmp_path / 'other.npy'))
+
+def test_numpy_reads_the_columns(dataset):
+    numpy = pytest.importorskip('numpy')
+    hospital, directory = dataset
+    manifest = read_dataset_manifest(directory)
+    patient_ids = numpy.load(os.path.join(directory, 'patients', 'patient_id.npy'))
+    assert list(patient_ids) == list(hospital.patient_records)
+    partition = manifest['partitions'][0]
+    visit_dates = numpy.load(os.path.join(directory, partition['path'], 'visit_date.npy'))
+    assert visit_dates.dtype == numpy.dtype('datetime64[D]')
+    assert str(visit_dates.min()) == partition['first_date'] and str(visit_dates.max()) == partition['last_date']
+
+@pytest.mark.parametrize('backend', ['objects', 'columnar'])
+def test_datasets_round_trip(make_system, dataset, backend):
+    hospital, directory = dataset
+    manifest = read_dataset_manifest(directory)
+    assert manifest['metadata'] == {'source': 'generated'}
+    assert [entry['year'] for entry in manifest['partitions']] == sorted(
+        {date.fromordinal(visit[1]).year for patient in hospital_state(hospital) for visit in patient[4]})
+    system = make_system(directory, backend)
+    assert hospital_state(system.hospital) == hospital_state(hospital)
+    assert tuple(system.hospital.key_statistics()) == tuple(hospital.key_statistics())
+    assert system.load_stats.rows == manifest['notes']
+
+def test_predicates_skip_partitions(make_system, dataset, monkeypatch):
+    hospital, directory = dataset
+    partitions = read_dataset_manifest(directory)['partitions']
+    middle = partitions[len(partitions) // 2]
+    department = hospital_state(hospital)[0][4][0][2]
+    opened = []
+    read = columnar_dataset.read_npy
+    monkeypatch.setattr(columnar_dataset, 'read_npy', lambda file_path: opened.append(file_path) or read(file_path))
+    first_date = date.fromisoformat(middle['first_date'])
+    last_date = date(middle['year'], 12, 31)
+    for dataset_filter in ({'first_date': first_date, 'last_date': last_date},
+                           {'first_date': first_date, 'departments': [department]},
+                           {'last_date': date.fromisoformat(partitions[0]['last_date'])}):
+        opened.clear()
+        system = make_system(directory, dataset_filter=dataset_filter)
+        assert hospital_state(system.hospital) == filtered_state(hospital, **dataset_filter)
+        years = {int(path.split('year=')[1].split(os.sep)[0]) for path in opened if 'year=' in path}
+        if 'last_date' in dataset_filter and 'first_date' in dataset_filter:
+            assert years == {middle['year']}
+        assert all(year <= dataset_filter.get('last_date', date.max).year for year in years)
+        assert all(year >= dataset_filter.get('first_date', date.min).year for year in years)
+
+def test_filters_only_apply_to_datasets(make_system, dataset, tmp_path):
+    hospital, directory = dataset
+    with pytest.raises(ValueError):
+        make_system(SAMPLE_PATIENT_FILE, dataset_filter={'departments': ['Surgery']})
+    # A snapshot of a filtered load is rebuilt for a load with another filter.
+    snapshot_file = str(tmp_path / 'hospital.snapshot')
+    filtered = make_system(directory, snapshot_file=snapshot_file, dataset_filter={'departments': ['Surgery']})
+    assert hospital_state(filtered.hospital) == filtered_state(hospital, departments=['Surgery'])
+    assert hospital_state(make_system(directory, snapshot_file=snapshot_file).hospital) == hospital_state(hospital)
+    assert hospital_state(make_system(directory, snapshot_file=snapshot_file,
+                                      dataset_filter={'departments': ['Surgery']}).hospital) == \
+        hospital_state(filtered.hospital)
+
+def test_the_cli_passes_the_filter(dataset, credentials_file):
+    hospital, directory = dataset
+    parser = argparse.ArgumentParser()
+    add_load_arguments(parser)
+    args = parser.parse_args([credentials_file, directory, '--first-date', '2015-01-01', '--department', 'Surgery',
+                              '--department', 'Radiology'])
+    system = load_system(args)
+    try:
+        assert hospital_state(system.hospital) == filtered_state(hospital, date(2015, 1, 1),
+                                                                 departments=['Surgery', 'Radiology'])
+    finally:
+        system.close()
+    with pytest.raises(SystemExit):
+        load_system(parser.parse_args([credentials_file, SAMPLE_PATIENT_FILE, '--last-date', '2015-01-01']))
+
+def test_duplicate_patients_are_rejected(make_system, dataset):
+    hospital, directory = dataset
+    system = make_system(directory)
+    state = hospital_state(system.hospital)
+    with pytest.raises(ValueError, match='already loaded'):
+        system.hospital.import_dataset(directory)
+    assert hospital_state(system.hospital) == state
+    patient_ids_file = os.path.join(directory, 'patients', 'patient_id.npy')
+    patient_ids = read_npy(patient_ids_file)
+    write_npy(patient_ids_file, '<U', patient_ids[:1] * 2 + patient_ids[2:])
+    with pytest.raises(ValueError, match=patient_ids[0]):
+        make_system(directory)
\ No newline at end of file
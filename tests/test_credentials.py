@@ -0,0 +1,96 @@
+# tests/test_credentials.py
+import os
+import stat
+
+import credentials_manage
+from credentials_manage import Credential, CredentialIndex, CredentialManager, read_credentials
+
+# Few iterations, as the tests count hashes rather than time them.
+ITERATIONS = 10
+
+def write_credentials(file_path, users):
+    with open(file_path, 'w', newline='') as file:
+        file.write(",username,password,role\n")
+        file.writelines(f"{index},{username},{password},{role}\n"
+                        for index, (username, password, role) in enumerate(users))
+
+def count_hashes(monkeypatch):
+    calls = []
+    hash_password = credentials_manage.hash_password
+
+    def counted(password, salt, iterations=credentials_manage.DEFAULT_HASH_ITERATIONS):
+        calls.append(password)
+        return hash_password(password, salt, iterations)
+
+    monkeypatch.setattr(credentials_manage, 'hash_password', counted)
+    return calls
+
+def test_rebuild_only_hashes_changed_passwords(tmp_path, monkeypatch):
+    credentials_file = str(tmp_path / 'credentials.txt')
+    users = [(f"user{number}", f"secret{number}", 'nurse') for number in range(20)]
+    write_credentials(credentials_file, users)
+    CredentialManager(credentials_file, iterations=ITERATIONS)
+    salt = CredentialIndex(f"{credentials_file}.index").lookup('user3').salt
+
+    users[3] = ('user3', 'secret3', 'admin')
+    users[4] = ('user4', 'changed', 'nurse')
+    users.append(('user20', 'secret20', 'clinician'))
+    write_credentials(credentials_file, users)
+    hashed = count_hashes(monkeypatch)
+    manager = CredentialManager(credentials_file, iterations=ITERATIONS)
+    assert sorted(hashed) == ['changed', 'secret20']
+    assert manager.index.lookup('user3').salt == salt
+    assert manager.validate_user('user3', 'secret3').role == 'admin'
+    assert manager.validate_user('user4', 'secret4') is None
+    assert manager.validate_user('user4', 'changed').role == 'nurse'
+    assert manager.validate_user('user20', 'secret20').role == 'clinician'
+
+    # Another iteration count hashes everyone again, as does a lost digest key.
+    hashed.clear()
+    CredentialManager(credentials_file, iterations=ITERATIONS + 1)
+    assert len(hashed) == len(users)
+    hashed.clear()
+    os.remove(f"{credentials_file}.index.key")
+    write_credentials(credentials_file, users[1:])
+    CredentialManager(credentials_file, iterations=ITERATIONS + 1)
+    assert len(hashed) == len(users) - 1
+
+def test_index_location_is_configurable(tmp_path):
+    credentials_file = str(tmp_path / 'credentials.txt')
+    index_file = str(tmp_path / 'private' / 'credentials.index')
+    os.mkdir(tmp_path / 'private')
+    write_credentials(credentials_file, [('user1', 'secret1', 'nurse')])
+    manager = CredentialManager(credentials_file, index_file=index_file, iterations=ITERATIONS)
+    assert manager.validate_user('user1', 'secret1').role == 'nurse'
+    assert sorted(os.listdir(tmp_path)) == ['credentials.txt', 'private']
+    assert stat.S_IMODE(os.stat(f"{index_file}.key").st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(index_file).st_mode) == 0o600
+
+def test_only_an_exact_header_row_is_skipped(tmp_path):
+    credentials_file = tmp_path / 'credentials.txt'
+    credentials_file.write_text("username,secret1,nurse\nuser2,secret2,admin\n")
+    assert list(read_credentials(str(credentials_file))) == [Credential('username', 'secret1', 'nurse'),
+                                                             Credential('user2', 'secret2', 'admin')]
+    credentials_file.write_text("username,password,role\nuser1,secret1,nurse\n")
+    assert list(read_credentials(str(credentials_file))) == [Credential('user1', 'secret1', 'nurse')]
+
+def test_a_changed_file_drops_remembered_logins(tmp_path, monkeypatch):
+    credentials_file = str(tmp_path / 'credentials.txt')
+    write_credentials(credentials_file, [('user1', 'secret1', 'nurse'), ('user2', 'secret2', 'admin')])
+    manager = CredentialManager(credentials_file, iterations=ITERATIONS)
+    assert manager.validate_user('user1', 'secret1').role == 'nurse'
+    assert manager.validate_user('user2', 'secret2').role == 'admin'
+    hashed = count_hashes(monkeypatch)
+    assert manager.validate_user('user1', 'secret1').role == 'nurse' and hashed == []
+
+    write_credentials(credentials_file, [('user1', 'changed', 'nurse')])
+    assert manager.validate_user('user1', 'secret1') is None
+    assert manager.validate_user('user2', 'secret2') is None
+    assert manager.validate_user('user1', 'changed').role == 'nurse'
+    assert manager.sessions.keys() == {'user1'}
+    # Touching the file without changing it keeps the index and the logins.
+    index = manager.index
+    os.utime(credentials_file, ns=(0, 0))
+    hashed.clear()
+    assert manager.validate_user('user1', 'changed').role == 'nurse'
+    assert manager.index is index and hashed == []
\ No newline at end of file
@@ -0,0 +1,165 @@
+# tests/test_hospital_versions.py
+import gc
+import random
+import threading
+from datetime import date
+
+import pytest
+
+from conftest import BACKENDS
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import gc_paused
+from renderers import patient_record_to_dict
+from write_ahead_log import note_added, patient_added, patient_removed, visit_added
+
+FIRST_DAY = date(2000, 1, 1).toordinal()
+LAST_DAY = date(2023, 1, 1).toordinal()
+
+def random_patient(rng, patient_id):
+    patient_record = PatientRecord(patient_id, rng.choice(['Male', 'Female']), rng.choice(['White', 'Asian']),
+                                   rng.randint(1, 95), 'Hispanic', rng.choice(['Medicare', 'Private']), '53001')
+    for number in range(rng.randint(0, 4)):
+        visit_record = VisitRecord(f"{patient_id}-{number}", rng.randint(FIRST_DAY, LAST_DAY), 'Surgery', 'injury')
+        for note_number in range(rng.randint(0, 3)):
+            visit_record.add_note_record(NoteRecord(f"{patient_id}-{number}-{note_number}", 'progress note'))
+        patient_record.add_visit_record(visit_record)
+    return patient_record
+
+def mutate(system, rng, step):
+    # One random mutation of any kind the system logs and publishes.
+    patient_ids = list(system.hospital.patient_records)
+    choice = rng.random()
+    if choice < 0.3:
+        system.apply_mutation(patient_added(random_patient(rng, f"added-{step}")))
+    elif choice < 0.45:
+        system.apply_mutation(patient_removed(rng.choice(patient_ids)))
+    elif choice < 0.55:
+        system.add_patient_records([random_patient(rng, f"bulk-{step}-{number}") for number in range(3)])
+    elif choice < 0.65:
+        system.remove_patient_records(rng.sample(patient_ids, 3))
+    elif choice < 0.75:
+        system.apply_mutation(patient_added(random_patient(rng, rng.choice(patient_ids))))
+    elif choice < 0.9:
+        system.apply_mutation(visit_added(rng.choice(patient_ids), VisitRecord(
+            f"late-{step}", rng.randint(FIRST_DAY, LAST_DAY), 'Radiology', 'cough', [NoteRecord(f"late-{step}", 'x')])))
+    else:
+        patient_id = rng.choice([patient_id for patient_id in patient_ids
+                                 if system.hospital.patient_records[patient_id].visit_records])
+        visit_id = system.hospital.patient_records[patient_id].visit_records[0].visit_id
+        system.apply_mutation(note_added(patient_id, visit_id, NoteRecord(f"note-{step}", 'discharge note')))
+
+def records(patient_records):
+    return {patient_id: patient_record_to_dict(patient_record)
+            for patient_id, patient_record in patient_records.items()}
+
+def assert_version_matches(system, check_records=True):
+    hospital = system.hospital
+    version = system.current_version()
+    assert dict(version.day_counts.items()) == hospital.visit_date_index.day_counts
+    assert version.key_statistics() == hospital.statistics.to_key_statistics()
+    assert len(version.patient_records) == len(hospital.patient_records)
+    start_date, end_date = date(2005, 1, 1), date(2015, 1, 1)
+    assert version.count_visits_between(start_date, end_date) == hospital.count_visits_between(start_date, end_date)
+    if check_records:
+        assert records(version.patient_records) == records(hospital.patient_records)
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_versions_follow_every_mutation(make_system, patient_file, backend):
+    system = make_system(patient_file, backend, publish_versions=True)
+    assert_version_matches(system)
+    first = system.current_version()
+    first_statistics = first.key_statistics()
+    first_records = records(first.patient_records)
+    rng = random.Random(5)
+    for step in range(80):
+        mutate(system, rng, step)
+        if step % 8 == 0:
+            assert_version_matches(system, check_records=False)
+    assert_version_matches(system)
+    # The first version still shows the hospital as it was published.
+    assert first.key_statistics() is first_statistics
+    assert records(first.patient_records) == first_records
+    assert system.current_version().generation > first.generation
+
+def test_published_records_are_frozen(make_system, patient_file):
+    system = make_system(patient_file, publish_versions=True)
+    patient_record = next(iter(system.current_version().patient_records.values()))
+    with pytest.raises(AttributeError):
+        patient_record.visit_records.append(None)
+
+def test_readers_see_consistent_versions(make_system, patient_file):
+    system = make_system(patient_file, publish_versions=True)
+    done = threading.Event()
+    inconsistent = []
+
+    def read():
+        # Every version a reader picks up must agree with itself.
+        while not done.is_set():
+            version = system.current_version()
+            key_statistics = version.key_statistics()
+            if (key_statistics.total_patients != len(version.patient_records)
+                    or key_statistics.total_visits != sum(version.day_counts.values())):
+                inconsistent.append(version.generation)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        rng = random.Random(7)
+        for step in range(200):
+            mutate(system, rng, step)
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    assert inconsistent == []
+
+def test_reports_are_cached_per_version(make_system, patient_file, capsys):
+    system = make_system(patient_file, publish_versions=True, result_cache_size=8)
+    cache = system.hospital.result_cache
+    first = system.current_version()
+    system.generate_key_statistics()
+    first_report = capsys.readouterr().out
+    mutate(system, random.Random(3), 0)
+    second = system.current_version()
+    system.generate_key_statistics()
+    second_report = capsys.readouterr().out
+    assert ('key_statistics_report', 'year', first.generation) in cache.entries
+    assert ('key_statistics_report', 'year', second.generation) in cache.entries
+    # A reader still on the first version finds its report without evicting the newer one.
+    hits = cache.info().hits
+    for version, report in ((first, first_report), (second, second_report), (first, first_report)):
+        system.hospital.version = version
+        system.generate_key_statistics()
+        assert capsys.readouterr().out == report
+    assert cache.info().hits == hits + 3 and cache.info().stale == 0
+
+def test_gc_pauses_nest_across_threads():
+    assert gc.isenabled()
+    entered = threading.Event()
+    release = threading.Event()
+
+    def pause():
+        with gc_paused():
+            entered.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=pause)
+    with gc_paused():
+        with gc_paused():
+            assert not gc.isenabled()
+        assert not gc.isenabled()
+        thread.start()
+        entered.wait(10)
+    # The other thread's pause outlives this one, so the collector stays off until it ends.
+    assert not gc.isenabled()
+    release.set()
+    thread.join()
+    assert gc.isenabled()
+    gc.disable()
+    try:
+        with gc_paused():
+            pass
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
\ No newline at end of file
@@ -0,0 +1,110 @@
+# tests/test_instrumentation.py
+import json
+import pstats
+from datetime import datetime
+
+import pytest
+
+import instrumentation
+from conftest import SAMPLE_PATIENT_FILE
+from healthcare_system import HealthcareSystem
+from hospital_management import Hospital
+from instrumentation import Histogram, Metrics, start_session
+
+@pytest.fixture
+def metrics():
+    metrics = instrumentation.enable()
+    yield metrics
+    instrumentation.disable()
+
+def prometheus_samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+def test_disabled_instrumentation_leaves_the_methods_alone():
+    query = Hospital.__dict__['query']
+    load_patient_data = HealthcareSystem.__dict__['load_patient_data']
+    assert instrumentation.active_metrics() is None
+    assert instrumentation.timed('action.anything') is instrumentation.timed('action.other')
+    instrumentation.enable()
+    assert Hospital.__dict__['query'] is not query
+    instrumentation.disable()
+    assert (Hospital.__dict__['query'], HealthcareSystem.__dict__['load_patient_data']) == (query, load_patient_data)
+
+def test_calls_rows_and_failures_are_recorded(make_system, metrics):
+    system = make_system(SAMPLE_PATIENT_FILE, load_mode='chunked')
+    hospital = system.hospital
+    matches = len(hospital.query(department='Surgery').matches)
+    hospital.count_visits_on_date(datetime(2020, 1, 1))
+    hospital.count_visits_on_date(datetime(2020, 1, 2))
+    with pytest.raises(KeyError):
+        hospital.remove_patient_record('no-such-patient')
+    with instrumentation.timed('action.test'):
+        pass
+    operations = metrics.to_dict()['operations']
+    assert operations['system.load_patient_data']['rows'] == system.load_stats.rows
+    assert operations['hospital.query']['rows'] == matches
+    assert operations['hospital.count_visits_on_date']['calls'] == 2
+    assert operations['hospital.count_visits_on_date']['rows'] is None
+    assert operations['hospital.remove_patient_record']['failures'] == 1
+    assert operations['action.test']['latency_seconds']['count'] == 1
+
+def test_exports_agree(tmp_path, metrics):
+    for seconds in (2e-6, 0.003, 0.003, 7.0, 1000.0):
+        metrics.observe('hospital.query', seconds, rows=3)
+    metrics.observe('hospital.query', 0.01, failed=True)
+    metrics.observe_cache('key_statistics', 'hits')
+    metrics.observe_cache('key_statistics', 'misses')
+    metrics.observe_cache('key_statistics', 'hits')
+    json_file, prometheus_file = str(tmp_path / 'metrics.json'), str(tmp_path / 'metrics.prom')
+    metrics.write(json_file)
+    metrics.write(prometheus_file)
+    with open(json_file) as file:
+        exported = json.load(file)
+    query = exported['operations']['hospital.query']
+    assert (query['calls'], query['failures'], query['rows']) == (6, 1, 15)
+    assert query['latency_seconds']['buckets']['0.005'] == 2
+    assert query['latency_seconds']['buckets']['+Inf'] == 1
+    assert exported['caches']['key_statistics'] == {'hits': 2, 'misses': 1, 'hit_ratio': 2 / 3}
+    with open(prometheus_file) as file:
+        samples = prometheus_samples(file.read())
+    assert samples['hospital_calls_total{operation="hospital.query"}'] == 6
+    assert samples['hospital_failures_total{operation="hospital.query"}'] == 1
+    assert samples['hospital_rows_total{operation="hospital.query"}'] == 15
+    buckets = [value for name, value in samples.items() if name.startswith('hospital_latency_seconds_bucket')]
+    assert buckets == sorted(buckets) and buckets[-1] == 6
+    assert samples['hospital_latency_seconds_bucket{operation="hospital.query",le="0.005"}'] == 3
+    assert samples['hospital_latency_seconds_count{operation="hospital.query"}'] == 6
+    assert samples['hospital_cache_events_total{cache="key_statistics",event="hits"}'] == 2
+    assert not (tmp_path / 'metrics.prom.tmp').exists()
+
+def test_histogram_bucket_bounds_are_inclusive():
+    histogram = Histogram((1.0, 2.0))
+    for value in (0.5, 1.0, 1.5, 2.0, 3.0):
+        histogram.observe(value)
+    assert histogram.to_dict() == {'buckets': {'1.0': 2, '2.0': 2, '+Inf': 1}, 'sum': 8.0, 'count': 5}
+
+@pytest.mark.parametrize('profile_name', ['session.prof', 'session.folded'])
+def test_sessions_write_metrics_and_a_profile(make_system, tmp_path, profile_name):
+    metrics_file, profile_file = str(tmp_path / 'metrics.json'), str(tmp_path / profile_name)
+    session = start_session(metrics_file, 60.0, profile_file)
+    try:
+        assert isinstance(session.metrics, Metrics)
+        make_system(SAMPLE_PATIENT_FILE, load_mode='chunked').hospital.key_statistics()
+    finally:
+        session.stop()
+    assert instrumentation.active_metrics() is None
+    with open(metrics_file) as file:
+        assert json.load(file)['operations']['hospital.key_statistics']['calls'] == 1
+    if profile_name.endswith('.prof'):
+        assert pstats.Stats(profile_file).total_calls > 0
+    else:
+        with open(profile_file) as file:
+            for line in file:
+                stack, count = line.rsplit(' ', 1)
+                assert stack and int(count) > 0
+    assert start_session() is None
\ No newline at end of file
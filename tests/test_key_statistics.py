@@ -0,0 +1,57 @@
+# tests/test_key_statistics.py
+from datetime import date
+
+import pytest
+
+from analytics import STATISTICS_DIMENSIONS, TrendCount, age_bin, compute_key_statistics
+from conftest import BACKENDS
+
+def group_of(patient_record, dimension):
+    if dimension == 'age':
+        return age_bin(patient_record.age)
+    return getattr(patient_record, dimension)
+
+def period_labels(visit_day):
+    visit_date = date.fromordinal(visit_day)
+    return {'month': f"{visit_date.year:04d}-{visit_date.month:02d}", 'year': f"{visit_date.year:04d}"}
+
+def recount(hospital):
+    # The key statistics counted one patient and one visit at a time.
+    patients = {dimension: {} for dimension in STATISTICS_DIMENSIONS}
+    visits = {dimension: {'month': {}, 'year': {}} for dimension in STATISTICS_DIMENSIONS}
+    visitors = {dimension: {'month': {}, 'year': {}} for dimension in STATISTICS_DIMENSIONS}
+    total_visits = 0
+    for patient_record in hospital.patient_records.values():
+        for dimension in STATISTICS_DIMENSIONS:
+            group = group_of(patient_record, dimension)
+            patients[dimension][group] = patients[dimension].get(group, 0) + 1
+        for visit_record in patient_record.visit_records:
+            total_visits += 1
+            for period, label in period_labels(visit_record.visit_day).items():
+                for dimension in STATISTICS_DIMENSIONS:
+                    key = label, group_of(patient_record, dimension)
+                    visits[dimension][period][key] = visits[dimension][period].get(key, 0) + 1
+                    visitors[dimension][period].setdefault(key, set()).add(patient_record.patient_id)
+    trends = {dimension: {period: {} for period in ('month', 'year')} for dimension in STATISTICS_DIMENSIONS}
+    for dimension in STATISTICS_DIMENSIONS:
+        for period, counts in visits[dimension].items():
+            for (label, group), count in counts.items():
+                trends[dimension][period].setdefault(label, {})[group] = TrendCount(
+                    count, len(visitors[dimension][period][label, group]))
+    return len(hospital.patient_records), total_visits, patients, trends
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_key_statistics_match_a_recount(make_system, patient_file, backend):
+    hospital = make_system(patient_file, backend).hospital
+    expected = recount(hospital)
+    assert tuple(hospital.key_statistics()) == expected
+    assert tuple(compute_key_statistics(hospital.statistics_columns())) == expected
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_key_statistics_follow_removals(make_system, patient_file, backend):
+    hospital = make_system(patient_file, backend).hospital
+    hospital.key_statistics()
+    hospital.remove_patient_records(list(hospital.patient_records)[::3])
+    expected = recount(hospital)
+    assert tuple(hospital.key_statistics()) == expected
+    assert tuple(compute_key_statistics(hospital.statistics_columns())) == expected
\ No newline at end of file
@@ -0,0 +1,107 @@
+# tests/test_lazy_hospital.py
+import argparse
+import random
+import threading
+
+import pytest
+
+from main import add_load_arguments, load_system
+from models import NoteRecord, VisitRecord
+from renderers import patient_record_to_dict
+from test_columnar import hospital_state
+from test_query import make_patient
+from test_statistics import FIRST_DAY
+from write_ahead_log import patient_added
+
+def test_patients_are_parsed_on_demand_into_a_bounded_lru(make_system, generated_patient_file):
+    hospital = make_system(generated_patient_file, 'lazy').hospital
+    expected = make_system(generated_patient_file).hospital
+    assert len(hospital._hydrated) == 0 and hospital.resident_records == {}
+    assert len(hospital.patient_records) == len(expected.patient_records)
+    assert tuple(hospital.key_statistics()) == tuple(expected.key_statistics())
+    assert len(hospital._hydrated) == 0
+
+    hospital.hydrated_patients = 3
+    patient_ids = list(hospital.patient_records)[:5]
+    first = hospital.patient_records[patient_ids[0]]
+    assert hospital.patient_records[patient_ids[0]] is first
+    for patient_id in patient_ids[1:3]:
+        hospital.get_patient_record(patient_id)
+    # Reading the first patient again keeps it, so the fourth evicts the second.
+    hospital.get_patient_record(patient_ids[0])
+    hospital.get_patient_record(patient_ids[3])
+    assert list(hospital._hydrated) == [patient_ids[2], patient_ids[0], patient_ids[3]]
+    assert hospital.patient_records[patient_ids[0]] is first
+    assert hospital.get_patient_record('no-such-patient') is None
+    assert len(hospital._hydrated) == 3
+
+    # Reparsed patients match the eagerly loaded ones.
+    assert hospital_state(hospital) == hospital_state(expected)
+    assert len(hospital._hydrated) == 3
+
+def test_changed_patients_stay_resident(make_system, generated_patient_file):
+    hospital = make_system(generated_patient_file, 'lazy').hospital
+    hospital.hydrated_patients = 1
+    patient_ids = list(hospital.patient_records)[:3]
+    patient_record = hospital.patient_records[patient_ids[0]]
+    visit_day = patient_record.visit_records[0].visit_day
+    visit_record = hospital.add_visit_record(patient_record, VisitRecord('lazy-late', visit_day + 1, 'Surgery',
+                                                                         'injury'))
+    hospital.add_note_record(patient_record, visit_record, NoteRecord('lazy-late-note', 'progress note'))
+    assert patient_ids[0] in hospital.resident_records and patient_ids[0] not in hospital._hydrated
+    for patient_id in patient_ids[1:]:
+        hospital.get_patient_record(patient_id)
+    assert hospital.patient_records[patient_ids[0]] is patient_record
+    assert patient_record.visit_records[-1].note_records[-1].note_id == 'lazy-late-note'
+    assert len(hospital.patient_records) == len(set(hospital.patient_records))
+
+def test_concurrent_readers_share_the_lru(make_system, generated_patient_file):
+    hospital = make_system(generated_patient_file, 'lazy').hospital
+    expected = make_system(generated_patient_file).hospital
+    hospital.hydrated_patients = 8
+    patient_ids = list(expected.patient_records)[:40]
+    mismatched = []
+
+    def read(seed):
+        rng = random.Random(seed)
+        for _ in range(500):
+            patient_id = rng.choice(patient_ids)
+            if (patient_record_to_dict(hospital.get_patient_record(patient_id))
+                    != patient_record_to_dict(expected.patient_records[patient_id])):
+                mismatched.append(patient_id)
+
+    readers = [threading.Thread(target=read, args=(seed,)) for seed in range(4)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert mismatched == []
+    assert len(hospital._hydrated) == 8 and set(hospital._hydrated) <= set(patient_ids)
+
+def test_lazy_mode_rejects_what_would_load_every_record(make_system, generated_patient_file, credentials_file,
+                                                        tmp_path):
+    with pytest.raises(ValueError):
+        make_system(generated_patient_file, 'lazy', snapshot_file=str(tmp_path / 'hospital.snapshot'))
+    with pytest.raises(ValueError):
+        make_system(generated_patient_file, 'columnar', load_mode='lazy')
+    parser = argparse.ArgumentParser()
+    add_load_arguments(parser)
+    for options in (['--snapshot', str(tmp_path / 'hospital.snapshot')], ['--backend', 'columnar']):
+        with pytest.raises(SystemExit):
+            load_system(parser.parse_args([credentials_file, generated_patient_file, '--load-mode', 'lazy',
+                                           *options]))
+
+    # A lazy hospital never compacts its log, and a log compacted by another mode is rejected.
+    log_file = str(tmp_path / 'hospital.wal')
+    lazy = make_system(generated_patient_file, 'lazy', log_file=log_file, compact_bytes=1)
+    lazy.apply_mutation(patient_added(make_patient('lazy-logged', [FIRST_DAY])))
+    assert lazy.write_ahead_log.generation == 0
+    with pytest.raises(ValueError):
+        lazy.compact_write_ahead_log()
+    lazy.close()
+    compacting = make_system(generated_patient_file, log_file=log_file)
+    assert 'lazy-logged' in compacting.hospital.patient_records
+    compacting.compact_write_ahead_log()
+    compacting.close()
+    with pytest.raises(ValueError, match='compacted'):
+        make_system(generated_patient_file, 'lazy', log_file=log_file)
\ No newline at end of file
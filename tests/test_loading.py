@@ -0,0 +1,97 @@
+# tests/test_loading.py
+import csv
+import random
+from datetime import date
+
+import pytest
+
+from generate_data import PATIENT_FILE_COLUMNS, generate_patient_rows
+from patient_loader import PATIENT_COLUMNS, parse_visit_day, read_row_chunks
+
+# Generated rows before the repeated and contradicting rows are mixed in.
+MESSY_ROWS = 4000
+# Columns a contradicting row changes, by position in PATIENT_FILE_COLUMNS.
+VISIT_COLUMNS = {2: '2001-2-3', 3: 'Radiology', 10: 'bleeding'}
+
+def write_messy_patient_file(file_path, rows, seed):
+    # A patient file whose visits continue far from their first row, with
+    # rows repeating a note and rows contradicting their visit mixed in.
+    rng = random.Random(seed)
+    data = [row for row in generate_patient_rows(rows, seed, interleave=512)]
+    for row in rng.sample(data, rows // 10):
+        data.insert(rng.randrange(len(data)), list(row))
+    for row in rng.sample(data, rows // 10):
+        row = list(row)
+        for position in rng.sample(sorted(VISIT_COLUMNS), rng.randint(1, 3)):
+            row[position] = VISIT_COLUMNS[position]
+        row[11] = f"{row[11]}-{rng.randrange(3)}"
+        data.insert(rng.randrange(len(data)), row)
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([''] + list(PATIENT_FILE_COLUMNS))
+        writer.writerows([index] + row for index, row in enumerate(data))
+    return file_path
+
+def loaded_state(system):
+    # Everything a load mode decides, in the order it decided it.
+    patients = [(patient_record.patient_id, patient_record.gender, patient_record.race, patient_record.age,
+                 patient_record.ethnicity, patient_record.insurance, patient_record.zip_code,
+                 [(visit_record.visit_id, visit_record.visit_day, visit_record.department,
+                   visit_record.chief_complaint,
+                   [(note_record.note_id, note_record.note_type) for note_record in visit_record.note_records])
+                  for visit_record in patient_record.visit_records])
+                for patient_record in system.hospital.patient_records.values()]
+    return patients, system.load_conflicts, system.duplicate_rows
+
+@pytest.fixture(scope='module')
+def messy_patient_files(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('messy')
+    return (write_messy_patient_file(str(directory / 'empty.csv'), 0, 1),
+            write_messy_patient_file(str(directory / 'first.csv'), MESSY_ROWS, 1),
+            write_messy_patient_file(str(directory / 'second.csv'), MESSY_ROWS // 2, 1))
+
+def test_messy_file_has_conflicts_and_duplicates(make_system, messy_patient_files):
+    system = make_system(messy_patient_files[1], load_mode='chunked')
+    assert len(system.load_conflicts) > 100
+    assert system.duplicate_rows > 100
+
+@pytest.mark.parametrize('mode, workers', [('dict', None), ('parallel', 1), ('parallel', 3), ('parallel', 16)])
+@pytest.mark.parametrize('backend', ['objects', 'columnar'])
+def test_load_modes_agree(make_system, messy_patient_files, backend, mode, workers):
+    empty_file, first_file, second_file = messy_patient_files
+    expected = make_system(empty_file, backend, load_mode='chunked')
+    system = make_system(empty_file, backend, load_mode='chunked')
+    # The second file adds visits to patients the first one loaded.
+    for patient_file in (first_file, second_file):
+        expected.load_patient_data(patient_file, 'chunked')
+        system.load_patient_data(patient_file, mode, workers=workers)
+        assert loaded_state(system) == loaded_state(expected)
+def test_row_chunks_follow_the_header_order(tmp_path):
+    columns = list(reversed(PATIENT_COLUMNS)) + ['Extra']
+    rows = [[f"{column}-{number}" for column in columns] for number in range(5)]
+    file_path = tmp_path / 'reordered.csv'
+    with open(file_path, 'w', newline='') as file:
+        csv.writer(file).writerows([columns] + rows)
+    with open(file_path, newline='') as file:
+        chunks = list(read_row_chunks(file, 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row for chunk in chunks for row in chunk] == [
+        tuple(f"{column}-{number}" for column in PATIENT_COLUMNS) for number in range(5)]
+    with open(file_path, 'w', newline='') as file:
+        csv.writer(file).writerow(columns)
+    with open(file_path, newline='') as file:
+        assert list(read_row_chunks(file)) == []
+
+def test_visit_days_parse_with_and_without_padding():
+    assert parse_visit_day('2020-1-5') == parse_visit_day('2020-01-05') == date(2020, 1, 5).toordinal()
+    assert parse_visit_day('1999-12-31') + 1 == parse_visit_day('2000-1-1')
+
+@pytest.mark.parametrize('chunk_size', [1, 7, MESSY_ROWS, 10 * MESSY_ROWS])
+def test_chunk_sizes_load_the_same_records(make_system, messy_patient_files, chunk_size):
+    # Small chunks end inside visits and patients, so their rows are merged across chunks.
+    empty_file, first_file, _ = messy_patient_files
+    expected = make_system(first_file, load_mode='dict')
+    system = make_system(empty_file, load_mode='chunked')
+    stats = system.load_patient_data(first_file, 'chunked', chunk_size=chunk_size)
+    assert loaded_state(system) == loaded_state(expected)
+    assert stats.rows == expected.load_stats.rows
\ No newline at end of file
@@ -0,0 +1,46 @@
+# tests/test_models.py
+from datetime import date, datetime
+
+import pytest
+
+from models import NoteRecord, PatientRecord, VisitRecord
+
+def test_visit_days_are_stored_as_ordinals():
+    day = date(2020, 2, 29).toordinal()
+    for visit_day in (day, date(2020, 2, 29), datetime(2020, 2, 29, 13, 45)):
+        visit_record = VisitRecord('v1', visit_day, 'Surgery', 'injury')
+        assert visit_record.visit_day == day
+        assert visit_record.visit_date == date(2020, 2, 29)
+        assert visit_record.visit_time == datetime(2020, 2, 29)
+
+def test_repeated_values_share_one_string():
+    # Built at run time, so the compiler cannot share the constants.
+    first, second = (PatientRecord(f"p{number}", ''.join(['Fe', 'male']), ''.join(['As', 'ian']), 40,
+                                   ''.join(['His', 'panic']), ''.join(['Medi', 'care']), ''.join(['530', '01']))
+                     for number in range(2))
+    for name in ('gender', 'race', 'ethnicity', 'insurance', 'zip_code'):
+        assert getattr(first, name) is getattr(second, name)
+    visits = [VisitRecord(f"v{number}", 737000, ''.join(['Sur', 'gery']), ''.join(['inj', 'ury']),
+                          [NoteRecord(f"n{number}", ''.join(['progress', ' note']))]) for number in range(2)]
+    assert visits[0].department is visits[1].department
+    assert visits[0].chief_complaint is visits[1].chief_complaint
+    assert visits[0].note_records[0].note_type is visits[1].note_records[0].note_type
+
+def test_records_have_no_instance_dict():
+    for record in (NoteRecord('n1', 'progress note'), VisitRecord('v1', 737000, 'Surgery', 'injury'),
+                   PatientRecord('p1', 'Male', 'White', 33, 'Other', 'None', '53001')):
+        assert not hasattr(record, '__dict__')
+        with pytest.raises(AttributeError):
+            record.unknown_field = 1
+
+def test_former_profile_names_still_work():
+    patient_record = PatientRecord.from_profile('p1', 'Male', 'Other', 'White', 33, 'Medicaid', '53001')
+    assert (patient_record.gender, patient_record.ethnicity, patient_record.race, patient_record.age) == (
+        'Male', 'Other', 'White', 33)
+    assert patient_record.insurance == patient_record.insurance_provider == 'Medicaid'
+    visit_record = VisitRecord('v1', 737000, 'Surgery', 'injury')
+    patient_record.add_visit_record(visit_record)
+    visit_record.add_note_record(NoteRecord('n1', 'progress note'))
+    assert patient_record.visit_records[0].note_records[0].note_id == 'n1'
+    # Records compare by identity, as the hospital looks them up by object.
+    assert VisitRecord('v1', 737000, 'Surgery', 'injury') != VisitRecord('v1', 737000, 'Surgery', 'injury')
\ No newline at end of file
@@ -0,0 +1,101 @@
+# tests/test_query.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from analytics import check_aggregates
+from conftest import BACKENDS
+from models import NoteRecord, PatientRecord, VisitRecord
+
+def brute_force(hospital, department=None, chief_complaint=None, zip_code=None, insurance=None, note_type=None,
+                visit_date=None, start_date=None, end_date=None):
+    # The (patient ID, visit ID) of every matching visit, found by scanning all records.
+    matches = []
+    for patient_record in hospital.patient_records.values():
+        if zip_code is not None and patient_record.zip_code != zip_code:
+            continue
+        if insurance is not None and patient_record.insurance != insurance:
+            continue
+        for visit_record in patient_record.visit_records:
+            day = visit_record.visit_day
+            if ((department is not None and visit_record.department != department)
+                    or (chief_complaint is not None and visit_record.chief_complaint != chief_complaint)
+                    or (note_type is not None
+                        and all(note_record.note_type != note_type for note_record in visit_record.note_records))
+                    or (visit_date is not None and day != visit_date.toordinal())
+                    or (start_date is not None and day < start_date.toordinal())
+                    or (end_date is not None and day > end_date.toordinal())):
+                continue
+            matches.append((patient_record.patient_id, visit_record.visit_id))
+    return sorted(matches)
+
+def query_predicates(hospital):
+    # Predicates taken from the first visit, so every query has matches.
+    patient_record = next(iter(hospital.patient_records.values()))
+    visit_record = patient_record.visit_records[0]
+    visit_time = datetime.fromordinal(visit_record.visit_day)
+    return [
+        {},
+        {'department': visit_record.department},
+        {'department': visit_record.department, 'insurance': patient_record.insurance},
+        {'zip_code': patient_record.zip_code},
+        {'chief_complaint': visit_record.chief_complaint, 'note_type': visit_record.note_records[0].note_type},
+        {'visit_date': visit_time},
+        {'start_date': visit_time - timedelta(days=400), 'end_date': visit_time},
+        {'department': visit_record.department, 'start_date': visit_time},
+        {'department': 'No such department'},
+    ]
+
+def assert_queries_match(hospital):
+    for predicates in query_predicates(hospital):
+        result = hospital.query(**predicates)
+        found = sorted((patient_record.patient_id, visit_record.visit_id)
+                       for patient_record, visit_record in result.matches)
+        assert found == brute_force(hospital, **predicates), predicates
+
+def make_patient(patient_id, visit_days):
+    return PatientRecord(patient_id, 'Male', 'White', 33, 'Other', 'Medicaid', '53002',
+                         [VisitRecord(f"{patient_id}-{number}", day, 'Cardiology', 'chest pain',
+                                      [NoteRecord(f"{patient_id}-{number}-note", 'admission note')])
+                          for number, day in enumerate(visit_days)])
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_queries_match_a_scan(make_system, patient_file, backend):
+    assert_queries_match(make_system(patient_file, backend).hospital)
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_changes_inside_a_load_are_counted_and_indexed(make_system, patient_file, backend):
+    hospital = make_system(patient_file, backend).hospital
+    loaded_ids = list(hospital.patient_records)[:4]
+    day = hospital.patient_records[loaded_ids[0]].visit_records[0].visit_day
+    with hospital.loading():
+        for number in range(6):
+            hospital.add_patient_record(make_patient(f"load-{number}", [day, day + 35 * number]))
+        pending = hospital.patient_records['load-0']
+        visit_record = hospital.add_visit_record(pending, VisitRecord('load-0-late', day + 400, 'Surgery', 'injury'))
+        hospital.add_note_record(pending, visit_record, NoteRecord('load-0-late-note', 'progress note'))
+        loaded = hospital.patient_records[loaded_ids[0]]
+        visit_record = hospital.add_visit_record(loaded, VisitRecord('loaded-late', day + 1, 'Surgery', 'injury'))
+        hospital.add_note_record(loaded, visit_record, NoteRecord('loaded-late-note', 'oncology note'))
+        hospital.remove_patient_record('load-1')
+        hospital.add_patient_record(make_patient('load-2', [day + 2]))
+        hospital.add_patient_records([make_patient('load-bulk', [day])])
+        hospital.remove_patient_records(['load-3', loaded_ids[1]])
+        hospital.remove_patient_record(loaded_ids[2])
+    assert 'load-1' not in hospital.patient_records
+    assert check_aggregates(hospital.statistics, hospital.statistics_columns()) == []
+    assert hospital.count_visits_on_date(datetime.fromordinal(day)) == len(brute_force(
+        hospital, visit_date=datetime.fromordinal(day)))
+    assert_queries_match(hospital)
+def test_visit_keys_past_32_bits_stay_indexed(make_system, patient_file):
+    hospital = make_system(patient_file, 'objects').hospital
+    day = next(iter(hospital.patient_records.values())).visit_records[0].visit_day
+    # As if two billion visits had been added and removed since the load.
+    hospital._next_visit_key = (1 << 31) - 2
+    hospital.add_patient_record(make_patient('late-1', [day, day + 1, day + 2]))
+    hospital.add_patient_records([make_patient('late-2', [day, day + 3])])
+    hospital.add_visit_record(hospital.patient_records['late-1'], VisitRecord('late-1-3', day, 'Surgery', 'injury'))
+    assert hospital._next_visit_key > 1 << 31
+    assert_queries_match(hospital)
+    hospital.remove_patient_records(['late-1'])
+    assert_queries_match(hospital)
\ No newline at end of file
@@ -0,0 +1,91 @@
+# tests/test_renderers.py
+import csv
+import io
+import json
+
+import pytest
+
+import renderers
+from conftest import BACKENDS, SAMPLE_PATIENT_FILE
+from models import NoteRecord, PatientRecord, VisitRecord
+from patient_loader import PATIENT_COLUMNS
+from renderers import RENDERERS, patient_record_from_dict, patient_record_to_dict
+from test_columnar import hospital_state
+
+class CountedWrites(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(len(text))
+        return super().write(text)
+
+def long_patient(visits):
+    # The last visit has no notes, which the CSV renderer writes as one row with empty note columns.
+    return PatientRecord('long', 'Female', 'Asian', 61, 'Hispanic', 'Medicare', '53001',
+                         [VisitRecord(f"long-{number}", 737000 + number, 'Surgery', 'injury, "left" knee',
+                                      [NoteRecord(f"long-{number}-{note}", 'progress note') for note in range(2)]
+                                      if number < visits - 1 else [])
+                          for number in range(visits)])
+
+def test_text_lists_every_field(make_system):
+    hospital = make_system(SAMPLE_PATIENT_FILE).hospital
+    patient_record = next(iter(hospital.patient_records.values()))
+    output = io.StringIO()
+    assert hospital.retrieve_patient_record(patient_record.patient_id, file=output)
+    text = output.getvalue()
+    assert text.startswith(f"Patient ID: {patient_record.patient_id}\nGender: {patient_record.gender}\n")
+    assert text.count("  Visit ID: ") == len(patient_record.visit_records)
+    assert text.count("    Note ID: ") == sum(len(visit_record.note_records)
+                                              for visit_record in patient_record.visit_records)
+    output = io.StringIO()
+    assert not hospital.retrieve_patient_record('no-such-patient', 'json', file=output)
+    assert output.getvalue() == "Patient not found.\n"
+
+def test_json_round_trips():
+    patient_record = long_patient(5)
+    text = RENDERERS['json']().render(patient_record)
+    assert text.endswith('\n') and text.count('\n') == 1
+    fields = json.loads(text)
+    assert fields == patient_record_to_dict(patient_record)
+    assert patient_record_to_dict(patient_record_from_dict(fields)) == fields
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_csv_output_loads_back(make_system, tmp_path, backend):
+    system = make_system(SAMPLE_PATIENT_FILE, backend)
+    patient_ids = list(system.hospital.patient_records)[:5]
+    csv_file = tmp_path / 'patients.csv'
+    with open(csv_file, 'w', newline='') as file:
+        for number, patient_id in enumerate(patient_ids):
+            output = io.StringIO()
+            system.hospital.retrieve_patient_record(patient_id, 'csv', file=output)
+            lines = output.getvalue().splitlines(keepends=True)
+            assert next(csv.reader(lines[:1])) == list(PATIENT_COLUMNS)
+            file.writelines(lines if number == 0 else lines[1:])
+    loaded = make_system(str(csv_file), backend)
+    assert hospital_state(loaded.hospital) == [state for state in hospital_state(system.hospital)
+                                               if state[0] in patient_ids]
+
+@pytest.mark.parametrize('renderer', list(RENDERERS))
+def test_long_histories_are_streamed_in_bounded_writes(monkeypatch, renderer):
+    monkeypatch.setattr(renderers, 'STREAM_BUFFER_CHARS', 4096)
+    patient_record = long_patient(renderers.STREAM_VISIT_THRESHOLD + 1)
+    expected = RENDERERS[renderer]().render(patient_record)
+    output = CountedWrites()
+    RENDERERS[renderer]().write(patient_record, output)
+    assert output.getvalue() == expected
+    assert len(output.writes) > 10
+    # Every batch but the last reaches the buffer size and overshoots it by at most one visit.
+    assert all(4096 <= size < 4096 + 1024 for size in output.writes[:-1])
+    for stream, writes in ((False, 1), (True, len(output.writes))):
+        output = CountedWrites()
+        RENDERERS[renderer]().write(patient_record, output, stream=stream)
+        assert (output.getvalue(), len(output.writes)) == (expected, writes)
+
+@pytest.mark.parametrize('renderer', list(RENDERERS))
+def test_short_histories_are_written_once(renderer):
+    patient_record = long_patient(3)
+    output = CountedWrites()
+    RENDERERS[renderer]().write(patient_record, output)
+    assert output.writes == [len(RENDERERS[renderer]().render(patient_record))]
\ No newline at end of file
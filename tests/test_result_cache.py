@@ -0,0 +1,97 @@
+# tests/test_result_cache.py
+import pytest
+
+import result_cache
+from conftest import BACKENDS, SAMPLE_PATIENT_FILE
+from models import VisitRecord
+from result_cache import ResultCache
+from test_query import make_patient
+from test_statistics import FIRST_DAY
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    return clock
+
+def counted(calls):
+    def compute(value):
+        calls.append(value)
+        return [value]
+    return compute
+
+def test_results_expire_after_the_ttl(clock):
+    cache = ResultCache(ttl=10.0)
+    calls = []
+    first = cache.get(('query', 1), 0, counted(calls), 'a')
+    clock.now += 9.9
+    assert cache.get(('query', 1), 0, counted(calls), 'b') is first
+    clock.now += 0.1
+    assert cache.get(('query', 1), 0, counted(calls), 'c') == ['c']
+    assert calls == ['a', 'c']
+    assert cache.info()[:5] == (1, 2, 0, 1, 0)
+    never = ResultCache(ttl=None)
+    never.get(('query',), 0, counted(calls), 'd')
+    clock.now += 10 ** 9
+    assert never.get(('query',), 0, counted(calls), 'e') == ['d']
+
+def test_generations_and_the_lru_bound_invalidate(clock):
+    cache = ResultCache(max_size=2)
+    calls = []
+    cache.get(('query', 1), 0, counted(calls), 'a')
+    assert cache.get(('query', 1), 1, counted(calls), 'b') == ['b']
+    assert cache.get(('query', 1), 1, counted(calls), 'c') == ['b']
+    cache.get(('query', 2), 1, counted(calls), 'd')
+    cache.get(('query', 1), 1, counted(calls), 'e')
+    # The second key was used least recently, so the third evicts it.
+    cache.get(('query', 3), 1, counted(calls), 'f')
+    assert list(cache.entries) == [('query', 1), ('query', 3)]
+    info = cache.info()
+    assert (info.hits, info.misses, info.stale, info.evicted, info.size) == (2, 4, 1, 1, 2)
+    cache.clear()
+    assert cache.info().size == 0 and cache.info().hits == 2
+    off = ResultCache(max_size=0)
+    off.get(('query',), 0, counted(calls), 'g')
+    assert off.get(('query',), 0, counted(calls), 'h') == ['h'] and off.info().size == 0
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_key_statistics_are_cached_until_the_hospital_changes(make_system, backend, clock):
+    system = make_system(SAMPLE_PATIENT_FILE, backend)
+    hospital = system.hospital
+    statistics = hospital.key_statistics()
+    assert hospital.key_statistics() is statistics
+    hits = hospital.result_cache.info().hits
+    hospital.add_patient_record(make_patient('cached-1', [FIRST_DAY]))
+    changed = hospital.key_statistics()
+    assert changed is not statistics and changed.total_patients == statistics.total_patients + 1
+    hospital.add_visit_record(hospital.patient_records['cached-1'], VisitRecord('cached-late', FIRST_DAY + 1,
+                                                                                'Surgery', 'injury'))
+    assert hospital.key_statistics().total_visits == changed.total_visits + 1
+    hospital.remove_patient_record('cached-1')
+    assert tuple(hospital.key_statistics()) == tuple(statistics)
+    assert hospital.result_cache.info().hits == hits
+    # Only the TTL expires an unchanged result.
+    statistics = hospital.key_statistics()
+    clock.now += result_cache.DEFAULT_RESULT_CACHE_TTL
+    assert hospital.key_statistics() is not statistics
+
+def test_reports_are_cached_per_period(make_system, capsys):
+    system = make_system(SAMPLE_PATIENT_FILE, result_cache_size=8)
+    for period in ('year', 'month', 'year'):
+        system.generate_key_statistics(period=period)
+    reports = capsys.readouterr().out
+    cache = system.hospital.result_cache
+    assert sorted(key for key in cache.entries) == [('key_statistics',), ('key_statistics_report', 'month'),
+                                                    ('key_statistics_report', 'year')]
+    assert cache.info().hits >= 3
+    system.hospital.add_patient_record(make_patient('report-1', [FIRST_DAY]))
+    system.generate_key_statistics(period='year')
+    assert capsys.readouterr().out != reports.split("Key statistics reports generated successfully.\n")[0]
+    assert cache.info().stale == 2
\ No newline at end of file
@@ -0,0 +1,155 @@
+# tests/test_server.py
+import asyncio
+import json
+import threading
+
+import pytest
+
+from conftest import SAMPLE_PATIENT_FILE
+from server import HospitalServer
+
+# Long enough for any request here, short enough that a stuck writer fails the test.
+RESPONSE_TIMEOUT = 10
+
+def add_patient(patient_id):
+    return {'op': 'add_patient', 'patient_id': patient_id, 'gender': 'Male', 'race': 'White', 'age': 40,
+            'ethnicity': 'Other', 'insurance': 'None', 'zip_code': '53001'}
+
+@pytest.fixture
+def nurse_credentials_file(tmp_path):
+    file_path = tmp_path / 'credentials.txt'
+    file_path.write_text(",username,password,role\n0,nurse1,secret,nurse\n")
+    return str(file_path)
+
+def serve_requests(system, tmp_path, requests, before_request=None):
+    # Sends each request on one connection and returns the responses.
+    server = HospitalServer(system)
+    socket_path = str(tmp_path / 'hospital.sock')
+
+    async def run():
+        server.writer_task = asyncio.create_task(server._run_writer())
+        listener = await asyncio.start_unix_server(server.handle_connection, path=socket_path)
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        responses = []
+        for number, request in enumerate([{'op': 'login', 'username': 'nurse1', 'password': 'secret'}] + requests):
+            if before_request is not None:
+                before_request(number)
+            writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            await writer.drain()
+            responses.append(json.loads(await asyncio.wait_for(reader.readline(), RESPONSE_TIMEOUT)))
+        # 'stop' makes the server close the connection, ending its handler.
+        writer.write(b'{"op": "stop"}\n')
+        assert await asyncio.wait_for(reader.read(), RESPONSE_TIMEOUT) == b''
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        server.writer_task.cancel()
+        return responses
+
+    return asyncio.run(run())
+
+def test_failing_mutations_leave_the_writer_running(make_system, nurse_credentials_file, tmp_path, monkeypatch):
+    system = make_system(SAMPLE_PATIENT_FILE)
+    system.credentials_manager = type(system.credentials_manager)(nurse_credentials_file)
+    apply_mutation = system.apply_mutation
+
+    def broken_mutation(entry):
+        raise RuntimeError("disk on fire")
+
+    def break_second_add(number):
+        monkeypatch.setattr(system, 'apply_mutation', broken_mutation if number == 3 else apply_mutation)
+
+    responses = serve_requests(system, tmp_path, [
+        {'op': 'remove_patient', 'patient_id': ['x'], 'id': 1},
+        add_patient('served-1'),
+        add_patient('served-2'),
+        {'op': 'remove_patients', 'patient_ids': ['served-1']},
+        add_patient('served-3'),
+    ], break_second_add)
+    assert responses[0]['ok']
+    assert [response['ok'] for response in responses[1:]] == [False, True, False, True, True]
+    assert (responses[1]['id'], responses[1]['error']) == (1, "patient_id must be text, not list.")
+    assert responses[3]['error'] == "RuntimeError: disk on fire"
+    assert 'served-3' in system.hospital.patient_records
+    assert 'served-1' not in system.hospital.patient_records
+
+def test_failed_log_sync_fails_its_group(make_system, nurse_credentials_file, tmp_path, monkeypatch):
+    system = make_system(SAMPLE_PATIENT_FILE, log_file=str(tmp_path / 'hospital.wal'))
+    system.credentials_manager = type(system.credentials_manager)(nurse_credentials_file)
+    write_ahead_log = system.write_ahead_log
+    sync = write_ahead_log.sync
+
+    def failed_sync():
+        raise OSError(28, "No space left on device")
+
+    def break_first_sync(number):
+        monkeypatch.setattr(write_ahead_log, 'sync', failed_sync if number == 1 else sync)
+
+    responses = serve_requests(system, tmp_path, [add_patient('synced-1'), add_patient('synced-2')],
+                               break_first_sync)
+    assert [response['ok'] for response in responses] == [True, False, True]
+    assert responses[1]['error'] == "OSError: [Errno 28] No space left on device"
+
+def test_reads_run_off_the_event_loop(make_system, nurse_credentials_file, tmp_path, monkeypatch):
+    system = make_system(SAMPLE_PATIENT_FILE)
+    system.credentials_manager = type(system.credentials_manager)(nurse_credentials_file)
+    patient_id = next(iter(system.hospital.patient_records))
+    server = HospitalServer(system)
+    socket_path = str(tmp_path / 'hospital.sock')
+    query_started = threading.Event()
+    release_query = threading.Event()
+    query = system.hospital.query
+
+    def stuck_query(**criteria):
+        query_started.set()
+        release_query.wait(RESPONSE_TIMEOUT)
+        return query(**criteria)
+
+    monkeypatch.setattr(system.hospital, 'query', stuck_query)
+
+    async def request(connection, operation):
+        reader, writer = connection
+        writer.write(json.dumps(operation).encode('utf-8') + b'\n')
+        await writer.drain()
+        return json.loads(await asyncio.wait_for(reader.readline(), RESPONSE_TIMEOUT))
+
+    async def run():
+        server.writer_task = asyncio.create_task(server._run_writer())
+        listener = await asyncio.start_unix_server(server.handle_connection, path=socket_path)
+        connections = [await asyncio.open_unix_connection(socket_path) for _ in range(2)]
+        for connection in connections:
+            assert (await request(connection, {'op': 'login', 'username': 'nurse1', 'password': 'secret'}))['ok']
+        stuck = asyncio.create_task(request(connections[0], {'op': 'query', 'department': 'Surgery'}))
+        await asyncio.get_running_loop().run_in_executor(None, query_started.wait, RESPONSE_TIMEOUT)
+        # The query holds the write lock, but versioned reads neither wait for it nor block the loop.
+        retrieved = await request(connections[1], {'op': 'retrieve_patient', 'patient_id': patient_id})
+        counted = await request(connections[1], {'op': 'count_visits', 'start_date': '1900-01-01',
+                                                 'end_date': '2100-01-01'})
+        added = asyncio.create_task(request(connections[1], add_patient('served-late')))
+        await asyncio.sleep(0.05)
+        assert not stuck.done() and not added.done()
+        release_query.set()
+        responses = [retrieved, counted, await stuck, await added]
+        for reader, writer in connections:
+            writer.close()
+        listener.close()
+        await listener.wait_closed()
+        server.writer_task.cancel()
+        return responses
+
+    retrieved, counted, queried, added = asyncio.run(run())
+    assert retrieved['ok'] and retrieved['result']['patient_id'] == patient_id
+    assert counted['result'] == sum(len(patient_record.visit_records)
+                                    for patient_record in system.hospital.patient_records.values())
+    assert queried['ok'] and added['ok']
+    assert system.current_version().get_patient_record('served-late') is not None
+
+def test_lazy_hospitals_are_read_under_the_lock(make_system, nurse_credentials_file, tmp_path):
+    system = make_system(SAMPLE_PATIENT_FILE, 'lazy')
+    system.credentials_manager = type(system.credentials_manager)(nurse_credentials_file)
+    patient_id = next(iter(system.hospital.patient_records))
+    responses = serve_requests(system, tmp_path, [{'op': 'retrieve_patient', 'patient_id': patient_id},
+                                                  add_patient('served-lazy')])
+    assert all(response['ok'] for response in responses)
+    assert responses[1]['result']['patient_id'] == patient_id
+    assert system.hospital.version is None and 'served-lazy' in system.hospital.patient_records
\ No newline at end of file
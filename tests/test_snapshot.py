@@ -0,0 +1,98 @@
+# tests/test_snapshot.py
+import os
+import shutil
+import struct
+
+import pytest
+
+from conftest import SAMPLE_PATIENT_FILE
+from healthcare_system import HealthcareSystem
+from snapshot import SNAPSHOT_VERSION, read_snapshot, read_snapshot_metadata
+from test_loading import loaded_state
+from test_query import assert_queries_match
+
+# The first data row of the sample file, and the same row with the age changed but not the length.
+FIRST_ROW = b'0,609360,151564,2010-12-18,Emergency department,Pacific Islanders,Male,Unknown,100,'
+CHANGED_ROW = FIRST_ROW.replace(b',100,', b',101,')
+
+@pytest.fixture
+def patient_copy(tmp_path):
+    return shutil.copy(SAMPLE_PATIENT_FILE, tmp_path / 'patients.csv')
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    return str(tmp_path / 'hospital.snapshot')
+
+@pytest.fixture
+def csv_loads(monkeypatch):
+    # Counts the loads that parse the patient CSV rather than read the snapshot.
+    loads = []
+    load_patient_data = HealthcareSystem.load_patient_data
+
+    def counted(system, file_path, *args, **kwargs):
+        loads.append(file_path)
+        return load_patient_data(system, file_path, *args, **kwargs)
+
+    monkeypatch.setattr(HealthcareSystem, 'load_patient_data', counted)
+    return loads
+
+def system_state(system):
+    return loaded_state(system)[0], tuple(system.hospital.key_statistics())
+
+@pytest.mark.parametrize('backend', ['objects', 'columnar'])
+def test_snapshots_round_trip(make_system, patient_copy, snapshot_file, csv_loads, backend):
+    built = make_system(patient_copy, backend, snapshot_file=snapshot_file)
+    assert len(csv_loads) == 1
+    assert read_snapshot_metadata(snapshot_file) == {'merged_visits': True}
+    loaded = make_system(patient_copy, backend, snapshot_file=snapshot_file)
+    assert len(csv_loads) == 1
+    assert isinstance(loaded.hospital, type(built.hospital))
+    assert system_state(loaded) == system_state(built)
+    assert loaded.load_stats.rows == sum(len(visit_record.note_records)
+                                         for patient_record in built.hospital.patient_records.values()
+                                         for visit_record in patient_record.visit_records)
+    assert_queries_match(loaded.hospital)
+
+def test_touched_but_unchanged_sources_keep_the_snapshot(make_system, patient_copy, snapshot_file, csv_loads):
+    built = make_system(patient_copy, snapshot_file=snapshot_file)
+    stat = os.stat(patient_copy)
+    os.utime(patient_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert system_state(make_system(patient_copy, snapshot_file=snapshot_file)) == system_state(built)
+    assert len(csv_loads) == 1
+
+@pytest.mark.parametrize('change', ['same size', 'appended row'])
+def test_stale_snapshots_are_rebuilt(make_system, patient_copy, snapshot_file, csv_loads, change):
+    make_system(patient_copy, snapshot_file=snapshot_file)
+    with open(patient_copy, 'rb') as file:
+        data = file.read()
+    assert data.count(FIRST_ROW) == 1
+    if change == 'same size':
+        data = data.replace(FIRST_ROW, CHANGED_ROW)
+    else:
+        data += b'9999,snapshot-new,snapshot-visit,2020-1-2,Surgery,White,Female,Other,30,53001,None,injury,' \
+                b'snapshot-note,progress note\r\n'
+    with open(patient_copy, 'wb') as file:
+        file.write(data)
+    assert read_snapshot(snapshot_file, patient_copy) is None
+
+    rebuilt = make_system(patient_copy, snapshot_file=snapshot_file)
+    assert len(csv_loads) == 2
+    assert system_state(rebuilt) == system_state(make_system(patient_copy))
+    if change == 'same size':
+        assert rebuilt.hospital.patient_records['609360'].age == 101
+    else:
+        assert 'snapshot-new' in rebuilt.hospital.patient_records
+    # The rebuilt snapshot is current again.
+    hospital, _ = read_snapshot(snapshot_file, patient_copy)
+    assert len(hospital.patient_records) == len(rebuilt.hospital.patient_records)
+
+def test_snapshots_of_other_versions_are_ignored(make_system, patient_copy, snapshot_file, csv_loads):
+    built = make_system(patient_copy, snapshot_file=snapshot_file)
+    with open(snapshot_file, 'r+b') as file:
+        file.seek(8)
+        file.write(struct.pack('<I', SNAPSHOT_VERSION + 1))
+    assert read_snapshot(snapshot_file, patient_copy) is None
+    assert read_snapshot_metadata(snapshot_file) is None
+    assert system_state(make_system(patient_copy, snapshot_file=snapshot_file)) == system_state(built)
+    assert len(csv_loads) == 2
+    assert read_snapshot_metadata(snapshot_file) == {'merged_visits': True}
\ No newline at end of file
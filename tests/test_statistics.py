@@ -0,0 +1,72 @@
+# tests/test_statistics.py
+from datetime import date
+
+import pytest
+
+from analytics import check_aggregates
+from conftest import BACKENDS, SAMPLE_PATIENT_FILE
+from models import NoteRecord, PatientRecord, VisitRecord
+
+FIRST_DAY = date(2019, 12, 30).toordinal()
+# Offsets from FIRST_DAY landing in the same month, the next month, the next year and the year after.
+DAY_OFFSETS = (0, 1, 3, 40, 400, 800)
+
+def make_visit(visit_id, visit_day):
+    return VisitRecord(visit_id, visit_day, 'Surgery', 'injury', [NoteRecord(f"{visit_id}-note", 'progress note')])
+
+def make_patient(patient_id, visit_days, age=40):
+    return PatientRecord(patient_id, 'Female', 'Asian', age, 'Hispanic', 'Medicare', '53001',
+                         [make_visit(f"{patient_id}-{number}", day) for number, day in enumerate(visit_days)])
+
+def assert_consistent(hospital):
+    assert check_aggregates(hospital.statistics, hospital.statistics_columns()) == []
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_loaded_aggregates_match_recount(make_system, patient_file, backend):
+    assert_consistent(make_system(patient_file, backend).hospital)
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_single_adds_and_removes(make_system, patient_file, backend):
+    hospital = make_system(patient_file, backend).hospital
+    patient_ids = list(hospital.patient_records)[:10]
+    for patient_id in patient_ids[:5]:
+        patient_record = hospital.patient_records[patient_id]
+        first_day = patient_record.visit_records[0].visit_day
+        for offset in DAY_OFFSETS:
+            visit_record = hospital.add_visit_record(patient_record, make_visit(f"{patient_id}-{offset}",
+                                                                                first_day + offset))
+            hospital.add_note_record(patient_record, visit_record, NoteRecord(f"{patient_id}-{offset}-extra",
+                                                                              'discharge note'))
+        assert_consistent(hospital)
+    hospital.add_patient_record(make_patient('added', [FIRST_DAY + offset for offset in DAY_OFFSETS]))
+    hospital.add_patient_record(make_patient('added', [FIRST_DAY], age=70))
+    for patient_id in patient_ids[3:]:
+        hospital.remove_patient_record(patient_id)
+    assert_consistent(hospital)
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_bulk_adds_and_removes(make_system, patient_file, backend):
+    hospital = make_system(patient_file, backend).hospital
+    patient_ids = list(hospital.patient_records)[:20]
+    hospital.add_patient_records([make_patient(f"bulk-{number}", [FIRST_DAY + offset
+                                                                  for offset in DAY_OFFSETS[number % 4:]], age=number * 7)
+                                  for number in range(12)])
+    assert_consistent(hospital)
+    hospital.remove_patient_records(patient_ids + [f"bulk-{number}" for number in range(0, 12, 3)])
+    assert_consistent(hospital)
+    patient_record = hospital.patient_records['bulk-1']
+    hospital.add_visit_record(patient_record, make_visit('bulk-1-late', FIRST_DAY + 2000))
+    assert_consistent(hospital)
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_visits_added_to_a_readded_patient(make_system, backend):
+    hospital = make_system(SAMPLE_PATIENT_FILE, backend).hospital
+    hospital.add_patient_record(make_patient('repeat', []))
+    for number in range(300):
+        hospital.add_visit_record(hospital.patient_records['repeat'], make_visit(f"repeat-{number}",
+                                                                                FIRST_DAY + number * 5))
+    assert_consistent(hospital)
+    hospital.remove_patient_record('repeat')
+    hospital.add_patient_record(make_patient('repeat', [FIRST_DAY + 2000]))
+    hospital.add_visit_record(hospital.patient_records['repeat'], make_visit('repeat-again', FIRST_DAY))
+    assert_consistent(hospital)
\ No newline at end of file
@@ -0,0 +1,63 @@
+# tests/test_visit_date_index.py
+import random
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from conftest import BACKENDS
+from hospital_management import VisitDateIndex
+from test_query import brute_force
+
+def assert_counts_match(index, visits):
+    visits = +visits
+    days = sorted(visits)
+    assert index.days == days
+    for day in range(days[0] - 2, days[-1] + 3) if days else range(3):
+        assert index.count_on(day) == visits[day]
+    bounds = days[:1] + days[len(days) // 2:len(days) // 2 + 1] + days[-1:]
+    for first_day in [0] + bounds + [day + 1 for day in bounds]:
+        for last_day in [first_day - 1, first_day] + bounds + [day - 1 for day in bounds] + [10 ** 7]:
+            expected = sum(count for day, count in visits.items() if first_day <= day <= last_day)
+            assert index.count_between(first_day, last_day) == expected
+
+def test_counts_follow_single_and_batch_changes():
+    randomizer = random.Random(7)
+    index = VisitDateIndex()
+    visits = Counter()
+    for _ in range(300):
+        day = 737000 + randomizer.randrange(60)
+        if visits[day] and randomizer.random() < 0.4:
+            count = randomizer.randint(1, visits[day])
+            index.remove(day, count)
+            visits[day] -= count
+        else:
+            count = randomizer.randint(1, 3)
+            index.add(day, count)
+            visits[day] += count
+        if randomizer.random() < 0.1:
+            assert_counts_match(index, visits)
+    batch = Counter(737000 + randomizer.randrange(90) for _ in range(200))
+    index.add_days(batch)
+    visits += batch
+    assert_counts_match(index, visits)
+    removed = Counter({day: count for day, count in visits.items() if day % 3 == 0})
+    removed[737001] = visits[737001] - 1
+    index.remove_days(removed)
+    visits -= removed
+    assert_counts_match(index, visits)
+    index.remove_days(dict(+visits))
+    assert_counts_match(index, Counter())
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_hospital_date_counts_match_a_scan(make_system, patient_file, backend):
+    hospital = make_system(patient_file, backend).hospital
+    days = sorted({visit_record.visit_day for patient_record in hospital.patient_records.values()
+                   for visit_record in patient_record.visit_records})
+    for day in days[::max(1, len(days) // 20)] + [days[0] - 1]:
+        visit_date = datetime.fromordinal(day)
+        assert hospital.count_visits_on_date(visit_date) == len(brute_force(hospital, visit_date=visit_date))
+    start_date, end_date = datetime.fromordinal(days[len(days) // 4]), datetime.fromordinal(days[-len(days) // 4])
+    assert hospital.count_visits_between(start_date, end_date) == len(brute_force(
+        hospital, start_date=start_date, end_date=end_date))
+    assert hospital.count_visits_between(end_date, start_date) == 0
\ No newline at end of file
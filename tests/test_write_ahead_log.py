@@ -0,0 +1,107 @@
+# tests/test_write_ahead_log.py
+import os
+import shutil
+
+import pytest
+
+from conftest import BACKENDS, SAMPLE_PATIENT_FILE
+from models import NoteRecord, VisitRecord
+from test_columnar import hospital_state, make_patient
+from write_ahead_log import note_added, patient_added, patient_removed, patients_removed, visit_added
+
+def log_entries(system, tag):
+    # One entry of every kind, against patients of the loaded sample.
+    patient_ids = list(system.hospital.patient_records)
+    visit_day = system.hospital.patient_records[patient_ids[0]].visit_records[0].visit_day
+    entries = []
+    for number in range(3):
+        patient_id = f"{tag}-{number}"
+        entries.append(patient_added(make_patient(patient_id, visit_day)))
+        entries.append(visit_added(patient_id, VisitRecord(f"{patient_id}-late", visit_day + 400, 'Radiology',
+                                                           'fatigue')))
+        entries.append(note_added(patient_id, f"{patient_id}-late", NoteRecord(f"{patient_id}-late-note",
+                                                                               'discharge note')))
+    entries.append(patient_removed(patient_ids[0]))
+    entries.append(patients_removed(patient_ids[1:3]))
+    return entries
+
+def system_state(system):
+    return hospital_state(system.hospital), tuple(system.hospital.key_statistics())
+
+@pytest.fixture
+def log_file(tmp_path):
+    return str(tmp_path / 'hospital.wal')
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_synced_entries_survive_a_crash(make_system, log_file, backend):
+    system = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    entries = log_entries(system, 'crash')
+    for entry in entries:
+        system.apply_mutation(entry)
+    system.write_ahead_log.sync()
+    # The first system is never closed, as if its process had died here.
+    recovered = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    assert recovered.replay_stats.rows == len(entries)
+    assert system_state(recovered) == system_state(system)
+
+@pytest.mark.parametrize('backend', ['objects', 'columnar'])
+def test_torn_tails_are_cut_off(make_system, log_file, tmp_path, backend):
+    system = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    expected = make_system(SAMPLE_PATIENT_FILE, backend)
+    entries = log_entries(system, 'torn')
+    for entry in entries[:-1]:
+        system.apply_mutation(entry)
+        expected.apply_mutation(entry)
+    good_size = system.write_ahead_log.size
+    system.apply_mutation(entries[-1])
+    system.close()
+    whole_log = str(tmp_path / 'whole.wal')
+    shutil.copy(log_file, whole_log)
+    # Cut the last entry inside its frame header, inside its payload and one byte short of its end.
+    for cut in (good_size + 3, good_size + 12, os.path.getsize(whole_log) - 1):
+        shutil.copy(whole_log, log_file)
+        with open(log_file, 'r+b') as file:
+            file.truncate(cut)
+        recovered = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+        assert recovered.replay_stats.rows == len(entries) - 1
+        assert os.path.getsize(log_file) == good_size
+        assert system_state(recovered) == system_state(expected)
+        # Entries appended after recovery follow the last good one.
+        recovered.apply_mutation(patient_removed('torn-1'))
+        state = system_state(recovered)
+        recovered.close()
+        assert system_state(make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)) == state
+
+@pytest.mark.parametrize('backend', ['objects', 'columnar'])
+def test_compaction_interrupted_before_the_log_reset(make_system, log_file, tmp_path, backend):
+    system = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    for entry in log_entries(system, 'compact'):
+        system.apply_mutation(entry)
+    system.write_ahead_log.sync()
+    old_log = str(tmp_path / 'old.wal')
+    shutil.copy(log_file, old_log)
+    system.compact_write_ahead_log()
+    state = system_state(system)
+    system.close()
+    # The base file was written but the log still holds the entries folded into it.
+    shutil.copy(old_log, log_file)
+    recovered = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    assert (recovered.write_ahead_log.generation, recovered.replay_stats.rows) == (1, 0)
+    assert system_state(recovered) == state
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_failed_mutations_are_not_logged(make_system, log_file, backend):
+    system = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    patient_id = next(iter(system.hospital.patient_records))
+    system.apply_mutation(patient_removed(patient_id))
+    good_size = system.write_ahead_log.size
+    with pytest.raises(ValueError, match=f"{patient_id}-missing"):
+        system.apply_mutation(note_added(next(iter(system.hospital.patient_records)), f"{patient_id}-missing",
+                                         NoteRecord('missing-note', 'progress note')))
+    with pytest.raises(KeyError):
+        system.apply_mutation(visit_added(patient_id, VisitRecord('gone-visit', 0, 'Radiology', 'fatigue')))
+    assert system.write_ahead_log.size == good_size
+    state = system_state(system)
+    system.close()
+    recovered = make_system(SAMPLE_PATIENT_FILE, backend, log_file=log_file)
+    assert recovered.replay_stats.rows == 1
+    assert system_state(recovered) == state
\ No newline at end of file
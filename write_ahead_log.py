@@ -0,0 +1,281 @@
+# write_ahead_log.py
+import json
+import os
+import struct
+import time
+import zlib
+
+from models import NoteRecord, PatientRecord, VisitRecord
+
+# Payload length and CRC-32 of every entry.
+_FRAME = struct.Struct('<II')
+
+DEFAULT_SYNC_BATCH = 256
+DEFAULT_SYNC_INTERVAL = 0.05
+# Log size at which HealthcareSystem folds the log into a new base file.
+DEFAULT_COMPACT_BYTES = 64 << 20
+
+def patient_added(patient_record):
+    """
+    Builds the log entry for adding a patient with its visits and notes.
+
+    Args:
+        patient_record (PatientRecord): The patient to add.
+    """
+    return {
+        'op': 'add_patient',
+        'patient': [patient_record.patient_id, patient_record.gender, patient_record.race, patient_record.age,
+                    patient_record.ethnicity, patient_record.insurance, patient_record.zip_code],
+        'visits': [_visit_fields(visit_record) for visit_record in patient_record.visit_records],
+    }
+
+def patient_removed(patient_id):
+    """
+    Builds the log entry for removing a patient.
+
+    Args:
+        patient_id (str): The ID of the patient to remove.
+    """
+    return {'op': 'remove_patient', 'patient_id': patient_id}
+
+def patients_added(patient_records):
+    """
+    Builds the single log entry for adding a batch of patients, so the batch is replayed all or nothing.
+
+    Args:
+        patient_records (list): The patients to add, with their visits and notes.
+    """
+    return {'op': 'add_patients', 'patients': [patient_added(patient_record) for patient_record in patient_records]}
+
+def patients_removed(patient_ids):
+    """
+    Builds the single log entry for removing a batch of patients.
+
+    Args:
+        patient_ids (list): The IDs of the patients to remove.
+    """
+    return {'op': 'remove_patients', 'patient_ids': list(patient_ids)}
+
+def visit_added(patient_id, visit_record):
+    """
+    Builds the log entry for adding a visit, with its notes, to a patient.
+
+    Args:
+        patient_id (str): The ID of the patient.
+        visit_record (VisitRecord): The visit to add.
+    """
+    return {'op': 'add_visit', 'patient_id': patient_id, 'visit': _visit_fields(visit_record)}
+
+def note_added(patient_id, visit_id, note_record):
+    """
+    Builds the log entry for adding a note to a patient's visit.
+
+    Args:
+        patient_id (str): The ID of the patient.
+        visit_id (str): The ID of the visit.
+        note_record (NoteRecord): The note to add.
+    """
+    return {'op': 'add_note', 'patient_id': patient_id, 'visit_id': visit_id,
+            'note': [note_record.note_id, note_record.note_type]}
+
+def entry_patient_ids(entry):
+    """
+    Returns the IDs of the patients a log entry adds, removes or changes.
+
+    Args:
+        entry (dict): An entry built by one of the entry functions above.
+    """
+    op = entry['op']
+    if op == 'add_patient':
+        return [entry['patient'][0]]
+    if op == 'add_patients':
+        return [patient['patient'][0] for patient in entry['patients']]
+    if op == 'remove_patients':
+        return list(entry['patient_ids'])
+    return [entry['patient_id']]
+
+def _visit_fields(visit_record):
+    return [visit_record.visit_id, visit_record.visit_day, visit_record.department,
+            visit_record.chief_complaint,
+            [[note_record.note_id, note_record.note_type] for note_record in visit_record.note_records]]
+
+def _visit_record(fields):
+    visit_id, visit_day, department, chief_complaint, notes = fields
+    visit_record = VisitRecord(visit_id, visit_day, department, chief_complaint)
+    for note_id, note_type in notes:
+        visit_record.add_note_record(NoteRecord(note_id, note_type))
+    return visit_record
+
+def _patient_record(entry):
+    patient_record = PatientRecord(*entry['patient'])
+    patient_record.visit_records = [_visit_record(fields) for fields in entry['visits']]
+    return patient_record
+
+def apply_entry(hospital, entry):
+    """
+    Applies one log entry to a hospital.
+
+    Args:
+        hospital (Hospital): The hospital to change.
+        entry (dict): An entry built by patient_added, patient_removed,
+            patients_added, patients_removed, visit_added or note_added.
+
+    Raises:
+        ValueError: If the entry is unknown or names a visit the patient does not have.
+    """
+    op = entry['op']
+    if op == 'add_patient':
+        hospital.add_patient_record(_patient_record(entry))
+    elif op == 'remove_patient':
+        hospital.remove_patient_record(entry['patient_id'])
+    elif op == 'add_patients':
+        hospital.add_patient_records([_patient_record(patient) for patient in entry['patients']])
+    elif op == 'remove_patients':
+        hospital.remove_patient_records(entry['patient_ids'])
+    elif op == 'add_visit':
+        hospital.add_visit_record(hospital.patient_records[entry['patient_id']], _visit_record(entry['visit']))
+    elif op == 'add_note':
+        patient_record = hospital.patient_records[entry['patient_id']]
+        visit_record = next((visit_record for visit_record in patient_record.visit_records
+                             if visit_record.visit_id == entry['visit_id']), None)
+        if visit_record is None:
+            raise ValueError(f"Patient {entry['patient_id']} has no visit {entry['visit_id']}.")
+        hospital.add_note_record(patient_record, visit_record, NoteRecord(*entry['note']))
+    else:
+        raise ValueError(f"Unknown log entry: {op}")
+
+def _frame(entry):
+    payload = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def _fsync_directory(path):
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+class WriteAheadLog:
+    """
+    Append-only log of hospital mutations, synced to disk in batches.
+
+    Every entry is framed with its length and CRC-32, so a torn write at the
+    end of the file is detected and cut off on recovery. The first entry is a
+    header holding the log's generation: 0 means the log applies on top of
+    the source files, n > 0 that it applies on top of the base file written
+    by the n-th compaction.
+
+    Appends are buffered and fsynced once sync_batch entries are pending or
+    sync_interval seconds have passed since the last sync, and on sync() and
+    close(). Entries written since the last sync can be lost in a crash.
+    """
+    def __init__(self, path, sync_batch=DEFAULT_SYNC_BATCH, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.path = path
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self.unsynced = 0
+        self._file = None
+        self._last_sync = time.monotonic()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            self.reset(0)
+        else:
+            with open(path, 'rb') as file:
+                header = self._read_frame(file)
+            if header is None or header.get('op') != 'header':
+                raise ValueError(f"{path} is not a write-ahead log.")
+            self.generation = header['generation']
+            self.size = os.path.getsize(path)
+
+    @staticmethod
+    def _read_frame(file):
+        frame = file.read(_FRAME.size)
+        if len(frame) < _FRAME.size:
+            return None
+        length, checksum = _FRAME.unpack(frame)
+        payload = file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return None
+        return json.loads(payload)
+
+    def read_entries(self):
+        """
+        Reads the logged entries after the header, for replay.
+
+        Call this before the first append: a torn entry at the end of the
+        file is truncated away so new entries follow the last good one.
+
+        Returns:
+            list: The entries, oldest first.
+        """
+        entries = []
+        with open(self.path, 'rb') as file:
+            self._read_frame(file)
+            good_length = file.tell()
+            while True:
+                entry = self._read_frame(file)
+                if entry is None:
+                    break
+                entries.append(entry)
+                good_length = file.tell()
+        if good_length < self.size:
+            with open(self.path, 'r+b') as file:
+                file.truncate(good_length)
+                os.fsync(file.fileno())
+            self.size = good_length
+        return entries
+
+    def append(self, entry):
+        """
+        Appends one entry, syncing if the batch is full or the interval has passed.
+
+        Args:
+            entry (dict): The entry to log.
+        """
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        frame = _frame(entry)
+        self._file.write(frame)
+        self.size += len(frame)
+        self.unsynced += 1
+        if self.unsynced >= self.sync_batch or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Flushes and fsyncs the entries appended since the last sync.
+        """
+        if self._file is not None and self.unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self.unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def reset(self, generation):
+        """
+        Replaces the log with an empty one of the given generation.
+
+        The new file is synced and renamed into place, so a crash leaves
+        either the old log or the new one.
+
+        Args:
+            generation (int): The generation of the base the new log applies to.
+        """
+        self.close()
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, 'wb') as file:
+            file.write(_frame({'op': 'header', 'generation': generation}))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.path)
+        _fsync_directory(self.path)
+        self.generation = generation
+        self.size = os.path.getsize(self.path)
+
+    def close(self):
+        """
+        Syncs pending entries and closes the file.
+        """
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
\ No newline at end of file